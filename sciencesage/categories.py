@@ -0,0 +1,38 @@
+from typing import Iterable, List
+
+from sciencesage.config import EXCLUDED_CATEGORY_PREFIXES
+
+# str.startswith with a tuple checks every prefix in one C call
+EXCLUDED_PREFIXES = tuple(sorted(set(EXCLUDED_CATEGORY_PREFIXES)))
+
+# (topic, keyword, also match the title) in priority order
+TOPIC_KEYWORDS = [
+    ("mars", "mars", True),
+    ("moon", "moon", True),
+    ("space exploration", "space exploration", True),
+    ("animals in space", "animals in space", True),
+    ("planets", "planet", False),
+]
+
+
+def is_excluded(category: str) -> bool:
+    """Maintenance/tracking categories (e.g. 'Category:Articles with ...') that carry no topic signal."""
+    return category.startswith(EXCLUDED_PREFIXES)
+
+
+def filter_categories(categories: Iterable[str]) -> List[str]:
+    """Filter out categories with excluded prefixes."""
+    return [c for c in categories if not c.startswith(EXCLUDED_PREFIXES)]
+
+
+def infer_topic(meta: dict) -> str:
+    """
+    Infer topic from article title and categories.
+    """
+    title = (meta.get("title") or "").lower()
+    # One lowercase blob so each keyword is a single substring search; newlines keep categories apart
+    categories = "\n".join(meta.get("categories", [])).lower()
+    for topic, keyword, match_title in TOPIC_KEYWORDS:
+        if (match_title and keyword in title) or keyword in categories:
+            return topic
+    return "other"
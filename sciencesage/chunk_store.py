@@ -0,0 +1,133 @@
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from sciencesage.config import CHUNKS_FILE, CHUNK_STORE_FILE, logger
+from sciencesage.jsonl import iter_jsonl
+
+# Repeated per-article strings are dictionary-encoded: each row stores a small int index
+_dictionary = pa.dictionary(pa.int32(), pa.string())
+
+CHUNK_STORE_SCHEMA = pa.schema([
+    ("chunk_id", pa.string()),
+    ("text", pa.string()),
+    ("title", _dictionary),
+    ("source_url", _dictionary),
+    ("categories", pa.list_(pa.string())),
+    ("topic", _dictionary),
+    ("images", pa.list_(pa.string())),
+    ("summary", pa.string()),
+    ("chunk_index", pa.int64()),
+    ("char_start", pa.int64()),
+    ("char_end", pa.int64()),
+    ("created_at", pa.string()),
+])
+
+
+class ChunkStoreWriter:
+    """
+    Write chunks to a Parquet chunk store. Rows are buffered per topic and
+    flushed as single-topic row groups, so every row group's topic statistics
+    name one topic and a topic filter skips the other row groups unread.
+    Memory is bounded by row_group_size rows per topic. Rows go to a temp file
+    that replaces `path` on close.
+    """
+
+    def __init__(self, path: str = CHUNK_STORE_FILE, row_group_size: int = 4096):
+        self.path = str(path)
+        self.tmp_path = self.path + ".tmp"
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._buffers: Dict[Optional[str], List[Dict]] = defaultdict(list)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._writer = pq.ParquetWriter(self.tmp_path, CHUNK_STORE_SCHEMA)
+
+    def write(self, chunk: Dict):
+        buffer = self._buffers[chunk.get("topic")]
+        buffer.append(chunk)
+        self.rows += 1
+        if len(buffer) >= self.row_group_size:
+            self._flush(chunk.get("topic"))
+
+    def _flush(self, topic):
+        buffer = self._buffers.pop(topic, None)
+        if buffer:
+            self._writer.write_table(pa.Table.from_pylist(buffer, schema=CHUNK_STORE_SCHEMA))
+
+    def close(self):
+        for topic in sorted(self._buffers, key=lambda t: (t is None, t or "")):
+            self._flush(topic)
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._writer.close()
+            os.remove(self.tmp_path)
+
+
+def write_chunk_store(chunks: Iterable[Dict], path: str = CHUNK_STORE_FILE) -> int:
+    with ChunkStoreWriter(path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.rows
+
+
+def _topic_filter(topics: Optional[Iterable[str]]):
+    return ds.field("topic").isin(list(topics)) if topics is not None else None
+
+
+def read_chunks(
+    path: str = CHUNK_STORE_FILE,
+    columns: Optional[List[str]] = None,
+    topics: Optional[Iterable[str]] = None,
+) -> pa.Table:
+    """
+    Read the chunk store into an Arrow table, decoding only `columns` and only
+    the row groups whose topic is in `topics` (all of them when None).
+    """
+    return ds.dataset(path, format="parquet").to_table(columns=columns, filter=_topic_filter(topics))
+
+
+def store_is_current(path: str = CHUNK_STORE_FILE, jsonl_path: str = CHUNKS_FILE) -> bool:
+    """True when the chunk store exists and is not older than the JSONL chunks it mirrors."""
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(jsonl_path) or os.path.getmtime(path) >= os.path.getmtime(jsonl_path)
+
+
+def iter_chunks(
+    columns: Optional[List[str]] = None,
+    topics: Optional[Iterable[str]] = None,
+    path: str = CHUNK_STORE_FILE,
+    jsonl_path: str = CHUNKS_FILE,
+    batch_size: int = 4096,
+) -> Iterator[Dict]:
+    """
+    Stream chunk dicts with only `columns`, optionally restricted to `topics`.
+    Reads the Parquet store batch by batch; falls back to parsing the JSONL
+    chunks (same projection and filter) when the store is missing or stale.
+    """
+    if store_is_current(path, jsonl_path):
+        scanner = ds.dataset(path, format="parquet").scanner(
+            columns=columns, filter=_topic_filter(topics), batch_size=batch_size
+        )
+        for batch in scanner.to_batches():
+            yield from batch.to_pylist()
+        return
+
+    logger.info(f"Chunk store {path} missing or stale, reading {jsonl_path}")
+    topics = set(topics) if topics is not None else None
+    for chunk in iter_jsonl(jsonl_path):
+        if topics is not None and chunk.get("topic") not in topics:
+            continue
+        yield chunk if columns is None else {c: chunk.get(c) for c in columns}
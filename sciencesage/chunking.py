@@ -0,0 +1,151 @@
+import os
+from typing import List, Optional, Tuple
+
+from loguru import logger
+
+from sciencesage.config import EMBEDDING_MODEL, ONNX_MODEL_DIR
+
+_tokenizer = None
+
+
+def _split_spans(text: str, sep: str) -> List[Tuple[int, int]]:
+    """
+    Non-empty, whitespace-stripped spans of text between occurrences of `sep`.
+    Offsets come from the piece lengths, so this is one C-level split.
+    """
+    spans = []
+    pos = 0
+    for piece in text.split(sep):
+        length = len(piece)
+        if length:
+            span_start = pos + length - len(piece.lstrip()) if piece[0].isspace() else pos
+            span_end = pos + len(piece.rstrip()) if piece[-1].isspace() else pos + length
+            if span_start < span_end:
+                spans.append((span_start, span_end))
+        pos += length + len(sep)
+    return spans
+
+
+def _pack_sentences(text: str, start: int, end: int, max_length: int, spans: List[Tuple[int, int]]):
+    """
+    Cut text[start:end] into spans of whole sentences ('. '-terminated) of at
+    most max_length characters. Each cut is one rfind over the window, so the
+    work is linear in the paragraph and Python only loops once per chunk.
+    A single sentence longer than max_length becomes its own span.
+    """
+    while start < end:
+        if end - start <= max_length:
+            spans.append((start, end))
+            return
+        cut = text.rfind(". ", start, start + max_length + 1)
+        if cut == -1:
+            cut = text.find(". ", start, end)
+            if cut == -1:
+                spans.append((start, end))
+                return
+        spans.append((start, cut + 1))
+        start = cut + 2
+        while start < end and text[start].isspace():
+            start += 1
+
+
+def chunk_spans_by_paragraphs(text: str, min_length: int = 100, max_length: int = 1200) -> List[Tuple[int, int]]:
+    """
+    (char_start, char_end) spans of paragraph chunks, in one linear pass:
+    split on blank lines (or single newlines if there is only one paragraph),
+    merge paragraphs shorter than min_length with the next one, and split
+    paragraphs longer than max_length at sentence ends ('. ').
+    Every chunk is text[char_start:char_end], separators included.
+    """
+    paragraphs = _split_spans(text, "\n\n")
+    if len(paragraphs) <= 1:
+        paragraphs = _split_spans(text, "\n")
+
+    # Merge short paragraphs with the next one
+    merged = []
+    buffer = None
+    for start, end in paragraphs:
+        if buffer is None:
+            buffer = [start, end]
+        elif buffer[1] - buffer[0] < min_length:
+            buffer[1] = end
+        else:
+            merged.append(tuple(buffer))
+            buffer = [start, end]
+    if buffer is not None:
+        merged.append(tuple(buffer))
+
+    # Split long paragraphs
+    spans = []
+    for start, end in merged:
+        _pack_sentences(text, start, end, max_length, spans)
+    return spans
+
+
+def load_tokenizer(model_name: str = EMBEDDING_MODEL, model_dir: str = ONNX_MODEL_DIR):
+    """
+    Load the embedding model's own (fast, Rust) tokenizer, so chunk sizes are
+    counted in the same word pieces the encoder truncates at. Uses the ONNX
+    export's tokenizer.json when present, otherwise the Hugging Face Hub copy.
+    """
+    from tokenizers import Tokenizer
+
+    local_path = os.path.join(model_dir, "tokenizer.json")
+    if os.path.exists(local_path):
+        tokenizer = Tokenizer.from_file(local_path)
+    else:
+        repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        tokenizer = Tokenizer.from_pretrained(repo)
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    logger.info(f"Loaded chunking tokenizer for {model_name}")
+    return tokenizer
+
+
+def get_tokenizer():
+    """Process-wide tokenizer, loaded on first use (once per preprocessing worker)."""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = load_tokenizer()
+    return _tokenizer
+
+
+def chunk_spans_by_tokens(
+    text: str,
+    tokenizer,
+    chunk_size: int,
+    chunk_overlap: int = 0,
+) -> List[Tuple[int, int]]:
+    """
+    Split text into windows of at most `chunk_size` tokens, consecutive windows
+    sharing `chunk_overlap` tokens. The text is tokenized once and the offset
+    mapping turns token windows into exact (char_start, char_end) spans, so
+    every chunk is text[char_start:char_end].
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("chunk_overlap must be >= 0 and smaller than chunk_size")
+    offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+    spans = []
+    step = chunk_size - chunk_overlap
+    for start in range(0, len(offsets), step):
+        window = offsets[start:start + chunk_size]
+        spans.append((window[0][0], window[-1][1]))
+        if start + chunk_size >= len(offsets):
+            break
+    return spans
+
+
+def chunk_text_by_tokens(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int = 0,
+    tokenizer: Optional[object] = None,
+) -> List[Tuple[str, int, int]]:
+    """(chunk text, char_start, char_end) for each token window of the text."""
+    tokenizer = tokenizer or get_tokenizer()
+    return [
+        (text[start:end], start, end)
+        for start, end in chunk_spans_by_tokens(text, tokenizer, chunk_size, chunk_overlap)
+    ]
@@ -0,0 +1,84 @@
+import httpx
+from loguru import logger
+from openai import OpenAI, AsyncOpenAI
+from qdrant_client import QdrantClient
+
+from sciencesage.config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+    OPENAI_MAX_RETRIES,
+    QDRANT_URL,
+    QDRANT_PREFER_GRPC,
+    QDRANT_GRPC_PORT,
+    QDRANT_TIMEOUT,
+)
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def build_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def use_http2(http2: bool = HTTP2_ENABLED) -> bool:
+    if http2 and not http2_available():
+        logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1.")
+        return False
+    return http2
+
+
+def make_http_client(http2: bool = HTTP2_ENABLED, **kwargs) -> httpx.Client:
+    """Pooled keep-alive httpx client with the configured limits and timeouts."""
+    return httpx.Client(http2=use_http2(http2), limits=build_limits(), timeout=build_timeout(), **kwargs)
+
+
+def make_async_http_client(http2: bool = HTTP2_ENABLED, **kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(http2=use_http2(http2), limits=build_limits(), timeout=build_timeout(), **kwargs)
+
+
+def make_openai_client(**kwargs) -> OpenAI:
+    """OpenAI client sharing one pooled connection set across all calls in the process."""
+    return OpenAI(
+        http_client=make_http_client(),
+        timeout=build_timeout(),
+        max_retries=OPENAI_MAX_RETRIES,
+        **kwargs,
+    )
+
+
+def make_async_openai_client(**kwargs) -> AsyncOpenAI:
+    return AsyncOpenAI(
+        http_client=make_async_http_client(),
+        timeout=build_timeout(),
+        max_retries=OPENAI_MAX_RETRIES,
+        **kwargs,
+    )
+
+
+def make_qdrant_client(**kwargs) -> QdrantClient:
+    """Qdrant client using gRPC when QDRANT_PREFER_GRPC is set, with a request timeout."""
+    return QdrantClient(
+        url=QDRANT_URL,
+        grpc_port=QDRANT_GRPC_PORT,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        timeout=QDRANT_TIMEOUT,
+        **kwargs,
+    )
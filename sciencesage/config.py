@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -6,17 +7,31 @@ from loguru import logger
 
 # --- File paths ---
 RAW_DATA_DIR = "data/raw"
+RAW_MANIFEST_FILE = "data/raw/manifest.json"
+RAW_CHANGESET_FILE = "data/raw/changeset.json"
+RAW_SHARD_DIR = "data/raw/shards"
+RAW_STORAGE = os.getenv("RAW_STORAGE", "files") # files (one .txt/.meta.json/.html per article) or shards (gzip JSONL per category)
 CHUNKS_FILE = "data/processed/chunks.jsonl"
+CHUNK_STORE_FILE = "data/processed/chunks.parquet" # Same chunks as CHUNKS_FILE, columnar, one topic per row group
+PREPROCESS_MANIFEST_FILE = "data/processed/preprocess_manifest.json"
+CHUNKS_CHANGESET_FILE = "data/processed/changeset.json"
+NEAR_DUPLICATES_FILE = "data/processed/near_duplicates.jsonl"
 EMBEDDING_FILE = "data/embeddings/embeddings.parquet"
 FEEDBACK_FILE = "data/feedback/feedback.jsonl"
 GROUND_TRUTH_FILE = "data/ground_truth/ground_truth_dataset.jsonl"
+LLM_CACHE_FILE = "data/ground_truth/llm_cache.sqlite" # Q&A generation responses by chunk text hash, prompt version and model
 EVAL_RESULTS_FILE = "data/eval/eval_results.jsonl"
 LLM_EVAL_FILE = "data/eval/llm_eval.jsonl"
 METRICS_SUMMARY_FILE = "data/eval/metrics_summary.csv"
+METRIC_CURVES_FILE = "data/eval/metric_curves.csv" # Mean retrieval metrics at k = 1..TOP_K
 LOGS_DIR = "logs"
 LOG_FILE = os.path.join(LOGS_DIR, "sciencesage.log")
 EXAMPLE_QUERY_SUMMARY_FILE = "data/eval/example_query_summary.jsonl"
 FEEDBACK_SUMMARY_FILE = "data/feedback/feedback_summary.csv"
+QUANTIZATION_BENCHMARK_FILE = "data/eval/quantization_benchmark.csv"
+HNSW_SWEEP_FILE = "data/eval/hnsw_sweep.csv"
+TRANSPORT_BENCHMARK_FILE = "data/eval/transport_benchmark.csv"
+RETRIEVAL_CACHE_FILE = "data/eval/retrieval_cache.sqlite"
 
 # --- Embeddings ---
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
@@ -24,20 +39,67 @@ EMBEDDING_DIM = 384
 MAX_TOKENS = 512
 DISTANCE_METRIC = "Cosine" # Options: Cosine, Euclidean, Dot
 QDRANT_COLLECTION = "scientific_concepts"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch") # Options: torch, onnx, remote
+ONNX_MODEL_DIR = os.path.join("models", "onnx", EMBEDDING_MODEL)
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "false").lower() == "true" # Use the int8 dynamically quantized export
+ONNX_PARITY_THRESHOLD = 0.99 # Minimum cosine similarity to the torch embeddings
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "/tmp/sciencesage_embedding.sock") # Used by EMBEDDING_BACKEND=remote
+
+# --- API deployment ---
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))
+API_WORKER_THREADS = int(os.getenv("API_WORKER_THREADS", "1")) # torch intra-op threads per forked worker
 
 # --- Chunking ---
-CHUNK_SIZE = None
-CHUNK_OVERLAP = 0
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE")) if os.getenv("CHUNK_SIZE") else None # tokens per chunk in the embedder's tokenizer; None keeps paragraph chunking
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "0")) # tokens shared by consecutive chunks
+# all-MiniLM-L6-v2 reads at most 256 word pieces including [CLS]/[SEP], so CHUNK_SIZE=254 fills the window exactly
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85")) # estimated Jaccard over word 5-grams; 0 disables the near-duplicate pass
+NEAR_DUP_NUM_PERM = 128 # MinHash permutations
+NEAR_DUP_SHINGLE_SIZE = 5 # words per shingle
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", os.cpu_count() or 1)) # processes used to chunk articles
 
 # --- Qdrant ---
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 QDRANT_URL = f"http://{QDRANT_HOST}:{QDRANT_PORT}"
 QDRANT_BATCH_SIZE = 64
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10")) # seconds
+
+# --- Quantization ---
+QUANTIZATION = os.getenv("QUANTIZATION", "none") # Options: none, scalar, binary
+QUANTIZATION_QUANTILE = 0.99
+QUANTIZATION_ALWAYS_RAM = True
+QUANTIZATION_RESCORE = True
+QUANTIZATION_OVERSAMPLING = 2.0
+
+# --- HNSW index ---
+# None keeps Qdrant's defaults (m=16, ef_construct=100, search ef derived from limit).
+# scripts/tune_hnsw.py --write-config stores tuned values in HNSW_CONFIG_FILE, which override these.
+HNSW_CONFIG_FILE = "data/qdrant/hnsw_config.json"
+HNSW_M = None
+HNSW_EF_CONSTRUCT = None
+HNSW_EF = None
+if os.path.exists(HNSW_CONFIG_FILE):
+    with open(HNSW_CONFIG_FILE, "r", encoding="utf-8") as f:
+        _hnsw_config = json.load(f)
+    HNSW_M = _hnsw_config.get("m", HNSW_M)
+    HNSW_EF_CONSTRUCT = _hnsw_config.get("ef_construct", HNSW_EF_CONSTRUCT)
+    HNSW_EF = _hnsw_config.get("hnsw_ef", HNSW_EF)
 
 # --- Wikipedia settings ---
 WIKI_URL = "https://en.wikipedia.org"
 WIKI_USER_AGENT = "ScienceSageBot/1.0 (contact: lkonthego@gmail.com)"
+WIKI_MAX_WORKERS = int(os.getenv("WIKI_MAX_WORKERS", "4")) # Concurrent article downloads
+WIKI_REQUESTS_PER_SECOND = float(os.getenv("WIKI_REQUESTS_PER_SECOND", "5")) # Shared across all workers
+WIKI_BURST = 5
+WIKI_MAX_RETRIES = 5 # Retries on 429/5xx and connection errors
+WIKI_BACKOFF_BASE = 1.0 # seconds
+WIKI_TIMEOUT = 20 # seconds
+WIKI_CHECKPOINT_EVERY = 25 # articles between manifest checkpoints
 
 # --- Chunk fields ---
 CHUNK_FIELDS = [
@@ -144,10 +206,34 @@ EXAMPLE_QUERIES = {
 # --- Retrieval settings ---
 TOP_K = 10
 SIMILARITY_THRESHOLD = 0.1
+EVAL_BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", "64")) # questions per encoder batch and per Qdrant batch search
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "4")) # concurrent Qdrant batch searches
+RETRIEVAL_CACHE = os.getenv("RETRIEVAL_CACHE", "true").lower() == "true" # Eval scripts reuse retrievals across runs (RETRIEVAL_CACHE_FILE)
 
 # --- LLM Model ---
 CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")) # account rate limits for batch LLM jobs
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_EVAL_CONCURRENCY = int(os.getenv("LLM_EVAL_CONCURRENCY", "8")) # in-flight chat completions in rag_llm_evaluation.py
+LLM_RATE_LIMIT_RETRIES = 5 # retries after a RateLimitError, on top of the client's own
+GROUND_TRUTH_CONCURRENCY = int(os.getenv("GROUND_TRUTH_CONCURRENCY", "8")) # in-flight chat completions in create_ground_truth_dataset.py
+LLM_RESPONSE_CACHE = os.getenv("LLM_RESPONSE_CACHE", "true").lower() == "true" # Reuse Q&A generations across runs (LLM_CACHE_FILE)
+
+# --- Ground truth sampling ---
+GROUND_TRUTH_SAMPLES = int(os.getenv("GROUND_TRUTH_SAMPLES", "80")) # chunks sampled on top of one per topic
+GROUND_TRUTH_SEED = int(os.getenv("GROUND_TRUTH_SEED", "42")) # same corpus + seed = same ground-truth chunks
+GROUND_TRUTH_LENGTH_BOUNDS = [500, 1500] # characters; chunks are stratified into short / medium / long
+GROUND_TRUTH_MAX_PER_ARTICLE = int(os.getenv("GROUND_TRUTH_MAX_PER_ARTICLE", "2")) # spread questions across articles
+
+# --- HTTP transport (OpenAI client) ---
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true" # Requires the h2 package
 
 # --- Arize ---
 ARIZE_SPACE_ID = os.getenv("ARIZE_SPACE_ID")
@@ -173,8 +259,11 @@ RETRIEVAL_METRIC_KEYS = [
     "precision_at_k",
     "recall_at_k",
     "reciprocal_rank",
-    "ndcg_at_k"
+    "ndcg_at_k",
+    "hit_rate_at_k",
 ]
 LLM_METRIC_KEYS = [
     "exact_match"
-]
\ No newline at end of file
+]
+BOOTSTRAP_SAMPLES = int(os.getenv("BOOTSTRAP_SAMPLES", "1000")) # resamples for the summary's confidence intervals, 0 disables them
+BOOTSTRAP_CONFIDENCE = 0.95
\ No newline at end of file
@@ -0,0 +1,102 @@
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+WORD_RE = re.compile(r"\w+")
+MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+def shingle_hashes(text: str, shingle_size: int = 5) -> np.ndarray:
+    """crc32 of every lowercase word `shingle_size`-gram (the whole text if it is shorter)."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in set(shingles)), dtype=np.uint64)
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bands, rows) with bands * rows <= num_perm whose S-curve midpoint
+    (1 / bands) ** (1 / rows) is closest to the Jaccard threshold.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        error = abs(midpoint - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateIndex:
+    """
+    Online MinHash + LSH index for near-duplicate text.
+
+    Each text is reduced to `num_perm` min-hashes over its word shingles and
+    split into LSH bands; texts that share a band bucket are candidates, and a
+    candidate counts as a duplicate when the estimated Jaccard similarity
+    (fraction of equal min-hashes) reaches `threshold`. Adding a text costs
+    O(shingles * num_perm + bands), so a pass over the corpus is near-linear.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 5, seed: int = 42):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: h(x) = ((a * x + b) mod 2**64) >> 32, with odd a
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(self.bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingle_hashes(text, self.shingle_size)
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(self._a, hashes) + self._b[:, None]) >> np.uint64(32)
+        return permuted.min(axis=1) if hashes.size else np.full(self.num_perm, MAX_HASH)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Most similar indexed key at or above the threshold, with its estimated Jaccard."""
+        best = None
+        seen = set()
+        for band, key in self._band_keys(signature):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (candidate, similarity)
+        return best
+
+    def insert(self, key: str, signature: np.ndarray):
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def add(self, key: str, text: str) -> Optional[Tuple[str, float]]:
+        """
+        Index `text` under `key` unless it near-duplicates an indexed text;
+        returns (kept key, similarity) for duplicates and None otherwise.
+        """
+        signature = self.signature(text)
+        match = self.query(signature)
+        if match is None:
+            self.insert(key, signature)
+        return match
+
+    def __len__(self):
+        return len(self._signatures)
@@ -0,0 +1,95 @@
+import os
+import argparse
+import threading
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+from loguru import logger
+
+from sciencesage.config import EMBEDDING_BACKEND, EMBEDDING_SERVER_SOCKET
+from sciencesage.encoders import get_encoder
+
+
+class EmbeddingServer:
+    """
+    Serve one in-memory encoder to many API worker processes over a Unix socket.
+
+    Each client connection gets a thread; requests are (sentences, encode kwargs)
+    tuples and responses are ("ok", float32 array) or ("error", message).
+    """
+
+    def __init__(self, encoder, address: str = EMBEDDING_SERVER_SOCKET):
+        self.encoder = encoder
+        self.address = address
+        self.listener = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def start(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self.listener = Listener(self.address, family="AF_UNIX")
+        os.chmod(self.address, 0o600)
+        logger.info(f"Embedding server listening on {self.address}")
+
+    def serve_forever(self):
+        if self.listener is None:
+            self.start()
+        while not self._closed.is_set():
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break
+            if self._closed.is_set():
+                conn.close()
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    sentences, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    # One forward pass at a time; torch already parallelizes within a batch
+                    with self._lock:
+                        vectors = self.encoder.encode(sentences, **kwargs)
+                    conn.send(("ok", np.asarray(vectors, dtype=np.float32)))
+                except Exception as e:
+                    logger.error(f"Embedding request failed: {e}")
+                    conn.send(("error", str(e)))
+
+    def close(self):
+        self._closed.set()
+        if self.listener is not None:
+            # Wake up a blocking accept() so serve_forever can return
+            try:
+                Client(self.address, family="AF_UNIX").close()
+            except OSError:
+                pass
+            self.listener.close()
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the embedding model to API workers over a Unix socket.")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default=None, help="Encoder backend to load (default: EMBEDDING_BACKEND).")
+    parser.add_argument("--socket", default=EMBEDDING_SERVER_SOCKET, help="Unix socket path.")
+    args = parser.parse_args()
+
+    # API workers run with EMBEDDING_BACKEND=remote; the server itself loads a local model
+    backend = args.backend or ("torch" if EMBEDDING_BACKEND.lower() == "remote" else EMBEDDING_BACKEND)
+    server = EmbeddingServer(get_encoder(backend), args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Embedding server stopped.")
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
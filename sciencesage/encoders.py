@@ -0,0 +1,141 @@
+import os
+import threading
+from multiprocessing.connection import Client
+from typing import List, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+from sciencesage.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL,
+    ONNX_MODEL_DIR,
+    ONNX_QUANTIZED,
+    EMBEDDING_SERVER_SOCKET,
+)
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+
+
+class OnnxEncoder:
+    """
+    Drop-in replacement for SentenceTransformer.encode backed by ONNX Runtime.
+
+    Runs the exported transformer, mean-pools over the attention mask and
+    L2-normalizes, matching the all-MiniLM-L6-v2 sentence-transformers pipeline
+    without importing torch.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = ONNX_MODEL_DIR,
+        quantized: bool = ONNX_QUANTIZED,
+        max_seq_length: int = 256,
+        num_threads: Optional[int] = None,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = ONNX_QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX model not found at {model_path}. Run scripts/export_onnx.py first."
+            )
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"Loaded ONNX encoder from {model_path}")
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(token_embeddings.dtype)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        normalize_embeddings: bool = True,
+        **kwargs,
+    ) -> np.ndarray:
+        """Encode a string (returns a 1-D vector) or a list of strings (returns a 2-D array)."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batches = [self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(embeddings):
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+class RemoteEncoder:
+    """
+    Client for the shared embedding process (sciencesage.embedding_server).
+
+    API workers use this instead of loading their own copy of the model; each
+    thread keeps one persistent connection to the server's Unix socket.
+    """
+
+    def __init__(self, address: str = EMBEDDING_SERVER_SOCKET):
+        self.address = address
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX")
+            self._local.conn = conn
+        return conn
+
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> np.ndarray:
+        conn = self._connection()
+        try:
+            conn.send((sentences, kwargs))
+            status, payload = conn.recv()
+        except (EOFError, OSError):
+            # Server restarted or connection dropped: reconnect on the next call
+            self._local.conn = None
+            raise
+        if status != "ok":
+            raise RuntimeError(f"Embedding server error: {payload}")
+        return payload
+
+
+def get_encoder(backend: Optional[str] = None):
+    """
+    Return the query/document encoder for the configured backend.
+    All backends expose encode(str | list[str]) -> np.ndarray.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "onnx":
+        return OnnxEncoder()
+    if backend == "remote":
+        return RemoteEncoder()
+    if backend != "torch":
+        logger.warning(f"Unknown embedding backend '{backend}', falling back to torch.")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def cosine_parity(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity between two embedding matrices."""
+    reference = reference / np.clip(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12, None)
+    candidate = candidate / np.clip(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12, None)
+    return (reference * candidate).sum(axis=1)
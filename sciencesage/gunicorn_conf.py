@@ -0,0 +1,36 @@
+"""
+Gunicorn config for running the RAG API with several workers sharing one model.
+
+The app (and the SentenceTransformer inside retrieval_system) is imported once in
+the master with preload_app, then workers are forked. Garbage collection is
+disabled while loading and the loaded objects are frozen before forking, so the
+collector never writes to the model's pages and they stay shared copy-on-write.
+
+    gunicorn -c sciencesage/gunicorn_conf.py sciencesage.rag_api:app
+"""
+import gc
+import sys
+
+from sciencesage.config import API_HOST, API_PORT, API_WORKERS, API_WORKER_THREADS
+
+bind = f"{API_HOST}:{API_PORT}"
+workers = API_WORKERS
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# Avoid collections (and the page writes they cause) while the model is being loaded
+gc.disable()
+
+
+def when_ready(server):
+    # Everything allocated so far (model weights, tokenizer, clients) moves to the
+    # permanent generation and is ignored by the collector in the workers
+    gc.freeze()
+    server.log.info(f"Froze {gc.get_freeze_count()} objects before forking {workers} workers")
+
+
+def post_fork(server, worker):
+    gc.enable()
+    # Each worker gets a slice of the CPU instead of every worker using all cores
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(API_WORKER_THREADS)
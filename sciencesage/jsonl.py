@@ -0,0 +1,93 @@
+import gzip
+import json
+import os
+from typing import Dict, Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib json module is the fallback
+    orjson = None
+
+
+def orjson_available() -> bool:
+    return orjson is not None
+
+
+def dumps(record) -> bytes:
+    """One compact UTF-8 JSON line (without the newline)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass  # e.g. non-str keys or ints wider than 64 bits, which json handles
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(line):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def open_jsonl(path, mode: str = "rb"):
+    """Binary file handle for a .jsonl or gzip-compressed .jsonl.gz file."""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def iter_jsonl(path) -> Iterator[Dict]:
+    """Yield one record per non-blank line, reading the file lazily."""
+    with open_jsonl(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+class JsonlWriter:
+    """
+    Buffered JSONL writer. Records are flushed to disk every `flush_every`
+    writes (and on close), so a crash loses at most the last few records.
+    Opens with mode "ab" when `append` is set; gzip output appends a new member.
+    """
+
+    def __init__(self, path, append: bool = False, flush_every: int = 100):
+        directory = os.path.dirname(str(path))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+        self._pending = 0
+        self._file = open_jsonl(path, "ab" if append else "wb")
+
+    def write(self, record):
+        self._file.write(dumps(record) + b"\n")
+        self.count += 1
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def write_all(self, records: Iterable) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def flush(self):
+        self._file.flush()
+        self._pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_jsonl(records: Iterable, path, append: bool = False) -> int:
+    """Stream records to path, returning how many were written."""
+    with JsonlWriter(path, append=append) as writer:
+        return writer.write_all(records)
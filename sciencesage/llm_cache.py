@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from sciencesage.config import CHAT_MODEL, LLM_CACHE_FILE
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of LLM responses in SQLite, keyed by
+    (hash of the input text, prompt version, model).
+
+    The same chunk sent with the same prompt to the same model is answered
+    from the cache, so reruns and extended datasets only pay for new chunks.
+    Changing the prompt version or model misses every old entry.
+    """
+
+    def __init__(self, prompt_version: str, path: str = LLM_CACHE_FILE, model: str = CHAT_MODEL):
+        self.prompt_version = prompt_version
+        self.model = model
+        self.path = str(path)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, text_hash TEXT, prompt_version TEXT, model TEXT, "
+            "content TEXT, created_at REAL)"
+        )
+        self._conn.commit()
+
+    def key(self, text: str) -> str:
+        parts = [text_hash(text), self.prompt_version, self.model]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (self.key(text),)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, text: str, content: str):
+        row = (self.key(text), text_hash(text), self.prompt_version, self.model, content, time.time())
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)", row)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,4 +1,11 @@
+import hashlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
 import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ["precision_at_k", "recall_at_k", "reciprocal_rank", "ndcg_at_k", "hit_rate_at_k"]
 
 def normalize_text(text):
     """Lowercase and strip extra spaces."""
@@ -41,16 +48,17 @@ def reciprocal_rank(retrieved_texts, relevant_texts):
             return 1.0 / idx
     return 0.0
 
-def dcg(retrieved_texts, relevant_texts, k):
-    retrieved_texts = safe_list(retrieved_texts)
-    relevant_texts = safe_list(relevant_texts)
-    relevant_set = set(relevant_texts)
+def _dcg(retrieved_texts, relevant_set, k):
+    """DCG over already normalized texts."""
     dcg_val = 0.0
     for i, chunk in enumerate(retrieved_texts[:k]):
         rel = 1 if match(chunk, relevant_set) else 0
         dcg_val += rel / np.log2(i + 2)
     return dcg_val
 
+def dcg(retrieved_texts, relevant_texts, k):
+    return _dcg(safe_list(retrieved_texts), set(safe_list(relevant_texts)), k)
+
 def ndcg_at_k(retrieved_texts, relevant_texts, k):
     retrieved_texts = safe_list(retrieved_texts)
     relevant_texts = safe_list(relevant_texts)
@@ -60,8 +68,255 @@ def ndcg_at_k(retrieved_texts, relevant_texts, k):
     ideal_dcg = sum(rel / np.log2(i + 2) for i, rel in enumerate(ideal_rels))
     if ideal_dcg == 0:
         return 0.0
-    return dcg(retrieved_texts, relevant_texts, k) / ideal_dcg
+    return _dcg(retrieved_texts, set(relevant_texts), k) / ideal_dcg
 
 def contextual_recall_and_sufficiency(retrieved_texts, relevant_texts, k):
     """Placeholder for semantic sufficiency — reuse recall for now."""
-    return recall_at_k(retrieved_texts, relevant_texts, k)
\ No newline at end of file
+    return recall_at_k(retrieved_texts, relevant_texts, k)
+
+# -------- Batch evaluation engine --------
+
+@lru_cache(maxsize=65536)
+def text_key(text) -> Optional[bytes]:
+    """
+    Hash of the normalized text, so equal chunks match by one set lookup instead
+    of a scan. Memoized: the same chunks come back for many queries.
+    """
+    text = normalize_text(text)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest() if text else None
+
+def _grades(ids_or_texts, grades):
+    """Grade of each relevant chunk, 1.0 (binary relevance) where none is given."""
+    grades = list(grades or [])
+    return [float(grades[i]) if i < len(grades) and grades[i] is not None else 1.0 for i in range(len(ids_or_texts))]
+
+def _exact_relevance(row, retrieved_ids, retrieved_texts, relevant_ids, relevant_texts, relevant_grades=None):
+    """Fill one row of the relevance matrix by id lookup, hashing texts only for id misses."""
+    ids = {}
+    for chunk_id, grade in zip(relevant_ids, _grades(relevant_ids, relevant_grades)):
+        if chunk_id is not None:
+            ids[str(chunk_id)] = max(grade, ids.get(str(chunk_id), 0.0))
+    text_keys = None
+    for i in range(len(row)):
+        chunk_id = retrieved_ids[i] if i < len(retrieved_ids) else None
+        if chunk_id is not None and str(chunk_id) in ids:
+            row[i] = ids[str(chunk_id)]
+            continue
+        if i >= len(retrieved_texts) or not relevant_texts:
+            continue
+        if text_keys is None:
+            text_keys = {}
+            for text, grade in zip(relevant_texts, _grades(relevant_texts, relevant_grades)):
+                key = text_key(text)
+                if key is not None:
+                    text_keys[key] = max(grade, text_keys.get(key, 0.0))
+        row[i] = text_keys.get(text_key(retrieved_texts[i]), 0.0)
+
+def _substring_relevance(row, retrieved_texts, relevant_texts, relevant_grades=None):
+    """Fill one row by the substring overlap of match(); returns the number of relevant texts."""
+    relevant = {}
+    for text, grade in zip(relevant_texts, _grades(relevant_texts, relevant_grades)):
+        text = normalize_text(text)
+        if text:
+            relevant[text] = max(grade, relevant.get(text, 0.0))
+    for i, chunk in enumerate(safe_list(retrieved_texts)[:len(row)]):
+        row[i] = max((grade for r, grade in relevant.items() if chunk in r or r in chunk), default=0.0)
+    return len(relevant)
+
+def ground_truth_fields(entry: dict) -> Tuple[List, List, Optional[List[float]]]:
+    """
+    (chunk ids, texts, grades) of a ground-truth entry, aligned position by
+    position: its ground_truth_chunks (the chunk it was written from when
+    absent), the entry's text for that source chunk (None for chunks whose
+    text it does not carry) and ground_truth_grades cut to the chunks.
+    """
+    chunk_id = entry.get("chunk_id")
+    chunks = list(entry.get("ground_truth_chunks") or ([chunk_id] if "chunk_id" in entry else []))
+    texts = entry.get("ground_truth_texts")
+    if texts is None:
+        if chunks:
+            texts = [entry.get("text") if c == chunk_id else None for c in chunks]
+        else:
+            texts = [entry["text"]] if "text" in entry else []
+    grades = entry.get("ground_truth_grades")
+    if grades is not None:
+        grades = list(grades)[:max(len(chunks), len(texts))]
+    return chunks, list(texts), grades
+
+def relevance_matrix(
+    retrieved_ids: Sequence[Sequence],
+    retrieved_texts: Sequence[Sequence[str]],
+    relevant_ids: Sequence[Sequence],
+    relevant_texts: Sequence[Sequence[str]],
+    k: int,
+    mode: str = "exact",
+    relevant_grades: Optional[Sequence[Sequence[float]]] = None,
+):
+    """
+    (rel, n_relevant) for a batch of queries: rel[q, i] is the relevance grade
+    of the i-th retrieved chunk of query q (0.0 when not relevant), n_relevant[q]
+    the number of relevant chunks. Grades come from `relevant_grades`, aligned
+    with the relevant chunks, and default to 1.0 (binary relevance).
+    mode="exact" matches by chunk id, then by normalized-text hash, each check
+    one set lookup; mode="substring" uses the substring overlap of match() over
+    normalized texts (slow, for texts that differ).
+    """
+    n = len(retrieved_ids)
+    rel = np.zeros((n, k), dtype=np.float64)
+    n_relevant = np.zeros(n, dtype=np.float64)
+    for q in range(n):
+        grades = relevant_grades[q] if relevant_grades is not None else None
+        if mode == "substring":
+            n_relevant[q] = _substring_relevance(rel[q], retrieved_texts[q], relevant_texts[q], grades)
+        else:
+            # Ground-truth chunks pair ids and texts position by position
+            n_relevant[q] = max(len(relevant_ids[q]), len(safe_list(relevant_texts[q])))
+            if n_relevant[q]:
+                _exact_relevance(rel[q], retrieved_ids[q], retrieved_texts[q], relevant_ids[q], relevant_texts[q], grades)
+    return rel, n_relevant
+
+def ideal_relevance(n_relevant: np.ndarray, k: int, relevant_grades: Optional[Sequence[Sequence[float]]] = None) -> np.ndarray:
+    """
+    Best possible relevance matrix for nDCG: the relevant chunks' grades in
+    descending order, or n_relevant ones per row for binary relevance.
+    """
+    ideal = (np.arange(k)[None, :] < n_relevant[:, None]).astype(np.float64)
+    if relevant_grades is None:
+        return ideal
+    for q, count in enumerate(n_relevant.astype(int)):
+        if relevant_grades[q]:
+            ideal[q] = 0.0
+            grades = sorted(_grades(range(max(count, len(relevant_grades[q]))), relevant_grades[q]), reverse=True)[:k]
+            ideal[q, :len(grades)] = grades
+    return ideal
+
+def metric_curves(rel: np.ndarray, n_relevant: np.ndarray, ideal: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Every metric at every cutoff k = 1..K (K = rel.shape[1]) in one pass:
+    each value is an (n_queries, K) array whose column k-1 is the metric at k,
+    computed from prefix sums over the relevance rows. Precision, recall,
+    reciprocal rank and hit rate count any grade above 0 as relevant; nDCG uses
+    the grades as gains against `ideal` (see ideal_relevance).
+    """
+    n, max_k = rel.shape
+    if ideal is None:
+        ideal = ideal_relevance(n_relevant, max_k)
+    ks = np.arange(1, max_k + 1)
+    hits = np.cumsum(rel > 0, axis=1)
+    has_relevant = (n_relevant > 0)[:, None]
+    discounts = 1.0 / np.log2(ks + 1)
+    dcg_values = np.cumsum(rel * discounts, axis=1)
+    ideal_dcg = np.cumsum(ideal[:, :max_k] * discounts, axis=1)
+    any_hit = hits[:, -1] > 0 if max_k else np.zeros(n, dtype=bool)
+    first_hit = np.argmax(rel > 0, axis=1)
+    reached = any_hit[:, None] & (ks[None, :] > first_hit[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "precision_at_k": np.where(has_relevant, hits / ks, 0.0),
+            "recall_at_k": np.where(has_relevant, hits / np.maximum(n_relevant, 1)[:, None], 0.0),
+            "reciprocal_rank": np.where(reached, 1.0 / (first_hit + 1)[:, None], 0.0),
+            "ndcg_at_k": np.where(ideal_dcg > 0, dcg_values / np.where(ideal_dcg > 0, ideal_dcg, 1.0), 0.0),
+            "hit_rate_at_k": (hits > 0).astype(np.float64),
+        }
+
+def metrics_from_relevance(rel: np.ndarray, n_relevant: np.ndarray, k: int, ideal: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """P@k, R@k, MRR@k, nDCG@k and hit rate@k for every row of a relevance matrix at once."""
+    if k == 0:
+        return {column: np.zeros(len(rel)) for column in METRIC_COLUMNS}
+    curves = metric_curves(rel[:, :k], n_relevant, None if ideal is None else ideal[:, :k])
+    return {column: values[:, k - 1] for column, values in curves.items()}
+
+def _relevance_for(records: List[dict], k: int, mode: str):
+    """Relevance, relevant counts and ideal matrix for a batch of eval records."""
+    grades = [r.get("ground_truth_grades") for r in records]
+    graded = any(grades)
+    rel, n_relevant = relevance_matrix(
+        [r.get("retrieved_chunks") or [] for r in records],
+        [r.get("retrieved_context") or [] for r in records],
+        [r.get("ground_truth_chunks") or [] for r in records],
+        [r.get("ground_truth_texts") or [] for r in records],
+        k,
+        mode,
+        grades if graded else None,
+    )
+    return rel, n_relevant, ideal_relevance(n_relevant, k, grades if graded else None)
+
+def _check_k(k: int, name: str):
+    if k < 1:
+        raise ValueError(f"{name} must be at least 1, got {k}")
+
+def evaluate_retrieval(records: List[dict], k: int, mode: str = "exact") -> pd.DataFrame:
+    """
+    Per-query metrics table for a batch of eval records (the shape written by
+    generate_eval_results.py: retrieved_chunks/retrieved_context and
+    ground_truth_chunks/ground_truth_texts, plus optional ground_truth_grades),
+    one row per record in order.
+    """
+    _check_k(k, "k")
+    rel, n_relevant, ideal = _relevance_for(records, k, mode)
+    columns = {column: [r.get(column) for r in records] for column in ("query", "topic", "level")}
+    return pd.DataFrame({**columns, **metrics_from_relevance(rel, n_relevant, k, ideal)})
+
+def add_retrieval_metrics(records: List[dict], k: int, mode: str = "exact") -> pd.DataFrame:
+    """Score a batch of eval records, write each record's metrics into it, and return the table."""
+    table = evaluate_retrieval(records, k, mode)
+    for record, scores in zip(records, table[METRIC_COLUMNS].to_dict("records")):
+        record.update(scores)
+    return table
+
+def evaluate_curves(records: Iterable[dict], max_k: int, mode: Optional[str] = None, batch_size: int = 1000) -> pd.DataFrame:
+    """
+    Mean of every metric at k = 1..max_k over all records, one row per k.
+    Records may be a lazy iterator; they are scored batch_size at a time, so
+    memory stays bounded, and no retrieval is re-run: the curve comes from the
+    chunks each record already retrieved (k beyond that many is a miss).
+    With mode=None each record is matched the way it was scored, by its
+    match_mode field ("exact" when absent).
+    """
+    _check_k(max_k, "max_k")
+    totals = {column: np.zeros(max_k) for column in METRIC_COLUMNS}
+    count = 0
+    for batch in _batches(records, batch_size):
+        by_mode: Dict[str, List[dict]] = {}
+        for record in batch:
+            by_mode.setdefault(mode or record.get("match_mode") or "exact", []).append(record)
+        for batch_mode, group in by_mode.items():
+            rel, n_relevant, ideal = _relevance_for(group, max_k, batch_mode)
+            for column, values in metric_curves(rel, n_relevant, ideal).items():
+                totals[column] += values.sum(axis=0)
+        count += len(batch)
+    means = {column: total / count if count else total for column, total in totals.items()}
+    return pd.DataFrame({"k": np.arange(1, max_k + 1), **means})
+
+def _batches(records: Iterable[dict], batch_size: int):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def bootstrap_ci(
+    values: Sequence[float],
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: Optional[int] = 0,
+    chunk_size: int = 200,
+) -> Tuple[float, float]:
+    """
+    Percentile bootstrap confidence interval for the mean of `values`.
+    Resamples are drawn chunk_size at a time to bound memory on large runs.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return (float("nan"), float("nan"))
+    rng = np.random.default_rng(seed)
+    means = []
+    for start in range(0, n_resamples, chunk_size):
+        size = min(chunk_size, n_resamples - start)
+        means.append(values[rng.integers(0, len(values), size=(size, len(values)))].mean(axis=1))
+    means = np.concatenate(means)
+    alpha = (1.0 - confidence) / 2
+    return float(np.quantile(means, alpha)), float(np.quantile(means, 1.0 - alpha))
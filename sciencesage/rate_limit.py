@@ -0,0 +1,114 @@
+import time
+import random
+import asyncio
+import threading
+from typing import Awaitable, Callable, Optional, Tuple, Type
+
+from loguru import logger
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all workers of a crawler or evaluation run.
+
+    `rate` tokens are added per second up to `capacity` (the allowed burst).
+    Callers reserve tokens up front, so concurrent callers are served in order
+    and the long-run request rate never exceeds `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float, capacity: Optional[float] = None):
+        with self._lock:
+            self.rate = float(rate)
+            self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens (possibly going into debt) and return how long the caller must wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class MinuteRateLimiter:
+    """
+    Requests-per-minute plus tokens-per-minute limits, the two quotas the
+    OpenAI API enforces. Each call reserves one request and its estimated
+    tokens; either bucket can make the caller wait.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute / 60.0) if tokens_per_minute else None
+
+    def acquire(self, tokens: float = 0):
+        self.requests.acquire()
+        if self.tokens is not None and tokens:
+            self.tokens.acquire(tokens)
+
+    async def acquire_async(self, tokens: float = 0):
+        await self.requests.acquire_async()
+        if self.tokens is not None and tokens:
+            await self.tokens.acquire_async(tokens)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a numeric Retry-After header; HTTP-date values are ignored."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+async def call_with_retries(
+    call: Callable[[], Awaitable],
+    limiter: MinuteRateLimiter,
+    tokens: float = 0,
+    retry_on: Tuple[Type[BaseException], ...] = (),
+    max_retries: int = 5,
+):
+    """
+    Await call() once the limiter admits it. On a `retry_on` exception wait
+    for the response's Retry-After header (or backoff_delay) and try again,
+    re-raising after `max_retries` retries.
+    """
+    for attempt in range(max_retries + 1):
+        await limiter.acquire_async(tokens)
+        try:
+            return await call()
+        except retry_on as e:
+            if attempt == max_retries:
+                raise
+            response = getattr(e, "response", None)
+            delay = retry_after_seconds(response.headers.get("retry-after")) if response is not None else None
+            delay = delay if delay is not None else backoff_delay(attempt)
+            logger.warning(f"Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            await asyncio.sleep(delay)
@@ -0,0 +1,114 @@
+import os
+import gzip
+import json
+import threading
+from pathlib import Path
+
+SHARD_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".index.json"
+
+
+def raw_file_name(title: str, extension: str) -> str:
+    """Loose-file name for an article, e.g. wikipedia_Apollo_11.txt."""
+    return f"wikipedia_{title.replace(' ', '_')}{extension}"
+
+
+def shard_name(name: str) -> str:
+    return name.replace(" ", "_").replace("/", "_") + SHARD_SUFFIX
+
+
+def index_path(shard_path: str) -> str:
+    return str(shard_path)[: -len(SHARD_SUFFIX)] + INDEX_SUFFIX
+
+
+def load_index(shard_path: str) -> dict:
+    path = index_path(shard_path)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_record(shard_path: str, offset: int, length: int) -> dict:
+    with open(shard_path, "rb") as f:
+        f.seek(offset)
+        return json.loads(gzip.decompress(f.read(length)))
+
+
+class ShardWriter:
+    """
+    Append-only gzip JSONL shard holding one record per article:
+    {"title", "text", "meta", "html"}.
+
+    Every record is written as its own gzip member, so the shard is still a
+    valid .jsonl.gz file and any record can be read back from its byte range.
+    The sidecar index maps title -> [offset, length] of the latest copy; older
+    copies left behind by re-downloads are skipped when reading.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.index = load_index(self.path)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "ab")
+
+    def write(self, record: dict):
+        data = gzip.compress(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(data)
+            self.index[record["title"]] = [offset, len(data)]
+
+    def read(self, title: str):
+        with self._lock:
+            location = self.index.get(title)
+            if location is None:
+                return None
+            if not self._file.closed:
+                self._file.flush()
+        return read_record(self.path, *location)
+
+    def flush(self):
+        """Flush the data file, then atomically replace the index."""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            tmp_path = index_path(self.path) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp_path, index_path(self.path))
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def iter_shard(shard_path: str):
+    """Yield the latest record per title, in file order, one record in memory at a time."""
+    index = load_index(shard_path)
+    with open(shard_path, "rb") as f:
+        for offset, length in sorted(index.values()):
+            f.seek(offset)
+            yield json.loads(gzip.decompress(f.read(length)))
+
+
+def iter_raw_articles(raw_dir: str, shard_dir: str = None):
+    """
+    Yield (name, text, meta) for every downloaded article, from loose
+    wikipedia_*.txt/.meta.json pairs and from packed shards. `name` is the
+    loose text file name in both cases; `meta` is None when it is missing.
+    """
+    raw_dir = Path(raw_dir)
+    for txt_path in sorted(raw_dir.glob("*.txt")):
+        meta_path = txt_path.with_suffix(".meta.json")
+        meta = None
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        with open(txt_path, "r", encoding="utf-8") as f:
+            yield txt_path.name, f.read(), meta
+    if shard_dir and Path(shard_dir).exists():
+        for shard_path in sorted(Path(shard_dir).glob(f"*{SHARD_SUFFIX}")):
+            for record in iter_shard(shard_path):
+                yield raw_file_name(record["title"], ".txt"), record["text"], record.get("meta")
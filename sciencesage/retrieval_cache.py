@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sciencesage.config import EMBEDDING_BACKEND, EMBEDDING_MODEL, ONNX_QUANTIZED, RETRIEVAL_CACHE_FILE
+from sciencesage.jsonl import dumps, loads
+
+# (query, top_k, topic)
+RetrievalKey = Tuple[str, int, Optional[str]]
+
+
+def embedder_name(model: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND, quantized: bool = ONNX_QUANTIZED) -> str:
+    """Cache identity of a query encoder: backends and quantization embed queries slightly differently."""
+    return f"{model}:{backend}:{'int8' if quantized else 'fp32'}"
+
+
+EMBEDDER = embedder_name()
+
+
+class RetrievalCache:
+    """
+    Persistent cache of retrieved chunks in SQLite, keyed by
+    (query, top_k, topic, collection fingerprint, embedder), where the
+    embedder is the embedding model, backend and quantization.
+
+    The fingerprint (see retrieval_system.collection_fingerprint) changes when
+    the collection is re-embedded or the search settings change, so stale
+    results are never served; old entries are simply no longer looked up.
+    Safe to share between threads, and between processes through SQLite's locking.
+    """
+
+    def __init__(self, fingerprint: str, path: str = RETRIEVAL_CACHE_FILE, model: str = EMBEDDER):
+        self.fingerprint = fingerprint
+        self.model = model
+        self.path = str(path)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS retrievals ("
+            "key TEXT PRIMARY KEY, query TEXT, top_k INTEGER, topic TEXT, "
+            "fingerprint TEXT, model TEXT, chunks BLOB, created_at REAL)"
+        )
+        self._conn.commit()
+
+    def key(self, query: str, top_k: int, topic: Optional[str] = None) -> str:
+        parts = [query, top_k, topic, self.fingerprint, self.model]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get_many(self, requests: Sequence[RetrievalKey]) -> Dict[RetrievalKey, List[dict]]:
+        """Cached chunks for every request that has them; misses are left out."""
+        keys = {self.key(*request): request for request in requests}
+        found = {}
+        with self._lock:
+            key_list = list(keys)
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, chunks FROM retrievals WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                for key, chunks in rows:
+                    found[keys[key]] = loads(chunks)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, query: str, top_k: int, topic: Optional[str] = None) -> Optional[List[dict]]:
+        return self.get_many([(query, top_k, topic)]).get((query, top_k, topic))
+
+    def put_many(self, items: Sequence[Tuple[RetrievalKey, List[dict]]]):
+        now = time.time()
+        rows = [
+            (self.key(query, top_k, topic), query, top_k, topic, self.fingerprint, self.model, dumps(chunks), now)
+            for (query, top_k, topic), chunks in items
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO retrievals VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def put(self, query: str, top_k: int, topic: Optional[str], chunks: List[dict]):
+        self.put_many([((query, top_k, topic), chunks)])
+
+    def get_or_compute(self, query: str, top_k: int, topic: Optional[str], compute: Callable[[], List[dict]]) -> List[dict]:
+        chunks = self.get(query, top_k, topic)
+        if chunks is None:
+            chunks = compute()
+            self.put(query, top_k, topic, chunks)
+        return chunks
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def cached_retrieve(cache: Optional[RetrievalCache], query: str, top_k: int, topic: Optional[str], retrieve: Callable) -> List[dict]:
+    """retrieve(query, top_k=top_k, topic=topic) through the cache, or directly when cache is None."""
+    if cache is None:
+        return retrieve(query, top_k=top_k, topic=topic)
+    return cache.get_or_compute(query, top_k, topic, lambda: retrieve(query, top_k=top_k, topic=topic))
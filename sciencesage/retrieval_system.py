@@ -1,27 +1,109 @@
-from typing import List, Optional
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
 from loguru import logger
-from openai import OpenAI
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
-from sentence_transformers import SentenceTransformer
+from qdrant_client.models import (
+    Filter,
+    FieldCondition,
+    MatchValue,
+    SearchParams,
+    QuantizationSearchParams,
+    QueryRequest,
+)
 
 from sciencesage.config import (
     CHAT_MODEL,
     TOP_K,
     EMBEDDING_MODEL,
-    QDRANT_URL,
+    EMBEDDING_BACKEND,
+    ONNX_QUANTIZED,
     QDRANT_COLLECTION,
     LEVELS,
     SIMILARITY_THRESHOLD,
+    QUANTIZATION,
+    QUANTIZATION_RESCORE,
+    QUANTIZATION_OVERSAMPLING,
+    HNSW_EF,
+    EVAL_BATCH_SIZE,
+    EMBEDDING_FILE,
+    RETRIEVAL_CACHE,
+    RETRIEVAL_CACHE_FILE,
 )
 from sciencesage.prompts import get_system_prompt, get_user_prompt
+from sciencesage.encoders import get_encoder
+from sciencesage.clients import make_openai_client, make_qdrant_client
+from sciencesage.retrieval_cache import RetrievalCache, embedder_name
 
 
 # -------- Initialization --------
 logger.info("Initializing Retrieval System...")
-client = OpenAI()
-embedder = SentenceTransformer(EMBEDDING_MODEL)
-qdrant = QdrantClient(url=QDRANT_URL)
+client = make_openai_client()
+embedder = get_encoder()
+qdrant = make_qdrant_client()
+
+
+# -------- Search Parameters --------
+def build_search_params(
+    quantization: Optional[str] = QUANTIZATION,
+    rescore: bool = QUANTIZATION_RESCORE,
+    oversampling: float = QUANTIZATION_OVERSAMPLING,
+    hnsw_ef: Optional[int] = HNSW_EF,
+) -> Optional[SearchParams]:
+    """
+    Build Qdrant search params from the quantization and HNSW settings.
+
+    `quantization` is how the searched collection was built (see
+    collection_search_params); None or "none" means unquantized float32.
+    Quantized vectors are used for the candidate search; with rescore=True the
+    top (limit * oversampling) candidates are re-ranked with the original vectors.
+    hnsw_ef sets the size of the HNSW candidate list (higher = better recall, slower).
+    Returns None when everything is left at Qdrant's defaults.
+    """
+    quantization_params = None
+    if (quantization or "none").lower() != "none":
+        quantization_params = QuantizationSearchParams(
+            ignore=False,
+            rescore=rescore,
+            oversampling=oversampling,
+        )
+    if quantization_params is None and hnsw_ef is None:
+        return None
+    return SearchParams(hnsw_ef=hnsw_ef, quantization=quantization_params)
+
+
+def quantization_mode(quantization_config) -> str:
+    """Quantization mode of a collection's quantization_config: none, scalar, binary or product."""
+    if quantization_config is None:
+        return "none"
+    for mode in ("scalar", "binary", "product"):
+        if getattr(quantization_config, mode, None) is not None:
+            return mode
+    return "none"
+
+
+_collection_search_params = {}
+
+
+def collection_search_params(collection_name: Optional[str] = None) -> Optional[SearchParams]:
+    """
+    Default search params for a collection, matching how it was actually built
+    (its quantization_config, read once per collection) rather than the
+    QUANTIZATION setting, which may differ from the --quantization embed.py used.
+    Falls back to QUANTIZATION when the collection cannot be read.
+    """
+    collection_name = collection_name or QDRANT_COLLECTION
+    if collection_name not in _collection_search_params:
+        try:
+            mode = quantization_mode(qdrant.get_collection(collection_name).config.quantization_config)
+        except Exception as e:
+            logger.warning(f"Could not read collection '{collection_name}' ({e}); assuming quantization={QUANTIZATION}")
+            return build_search_params(QUANTIZATION)
+        _collection_search_params[collection_name] = build_search_params(mode)
+    return _collection_search_params[collection_name]
 
 
 # -------- Retrieval Function --------
@@ -29,10 +111,12 @@ def retrieve_context(
     query: str,
     top_k: int = TOP_K,
     topic: Optional[str] = None,
+    search_params: Optional[SearchParams] = None,
 ) -> List[dict]:
     """
     Retrieve top_k most relevant chunks from Qdrant for a given query.
 
+    search_params overrides the defaults from collection_search_params.
     Returns list of dicts with keys: text, source_url, chunk_id, score
     """
     query_embedding = embedder.encode(query).tolist()
@@ -49,28 +133,122 @@ def retrieve_context(
         query=query_embedding,
         limit=top_k,
         query_filter=qdrant_filter,
+        search_params=search_params or collection_search_params(),
         with_payload=True,
         score_threshold=SIMILARITY_THRESHOLD,
     )
 
-    chunks = []
-    for i, hit in enumerate(search_result.points):
-        chunks.append({
+    chunks = hits_to_chunks(search_result.points)
+    logger.debug(f"Retrieved {len(chunks)} chunks (top_k={top_k}, topic={topic})")
+    return chunks
+
+
+def hits_to_chunks(points) -> List[dict]:
+    return [
+        {
             "text": hit.payload["text"],
             "source_url": hit.payload.get("source_url", "unknown"),
             "chunk_id": hit.payload.get("chunk_id", i),
             "score": hit.score,
-        })
+        }
+        for i, hit in enumerate(points)
+    ]
 
-    logger.debug(f"Retrieved {len(chunks)} chunks (top_k={top_k}, topic={topic})")
-    return chunks
 
+# -------- Batched Retrieval --------
+def encode_queries(queries: Sequence[str], batch_size: int = EVAL_BATCH_SIZE) -> np.ndarray:
+    """Embed many queries in one encoder pass (batch_size texts per forward pass)."""
+    return np.asarray(embedder.encode(list(queries), batch_size=batch_size))
 
-# -------- Generation Function --------
-def generate_answer(query: str, context_chunks: List[dict], level: str, topic: str) -> str:
+
+def search_batch(
+    query_vectors: np.ndarray,
+    top_k: int = TOP_K,
+    search_params: Optional[SearchParams] = None,
+    batch_size: int = EVAL_BATCH_SIZE,
+    workers: int = 1,
+) -> List[List[dict]]:
     """
-    Generate an answer from the chat model given a query and retrieved context.
+    Search Qdrant for many query vectors: one query_batch_points request per
+    batch_size vectors, with up to `workers` requests in flight. Returns the
+    chunks for each vector in input order, as retrieve_context would.
     """
+    requests = [
+        QueryRequest(
+            query=vector.tolist(),
+            limit=top_k,
+            params=search_params or collection_search_params(),
+            with_payload=True,
+            score_threshold=SIMILARITY_THRESHOLD,
+        )
+        for vector in query_vectors
+    ]
+    batches = [requests[i:i + batch_size] for i in range(0, len(requests), batch_size)]
+
+    def run(batch):
+        return qdrant.query_batch_points(collection_name=QDRANT_COLLECTION, requests=batch)
+
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            responses = list(executor.map(run, batches))
+    else:
+        responses = [run(batch) for batch in batches]
+    return [hits_to_chunks(response.points) for batch in responses for response in batch]
+
+
+def retrieve_contexts(
+    queries: Sequence[str],
+    top_k: int = TOP_K,
+    search_params: Optional[SearchParams] = None,
+    batch_size: int = EVAL_BATCH_SIZE,
+    workers: int = 1,
+) -> List[List[dict]]:
+    """retrieve_context for many queries: one encoder pass, then batched searches."""
+    if not queries:
+        return []
+    return search_batch(encode_queries(queries, batch_size), top_k, search_params, batch_size, workers)
+
+
+# -------- Retrieval Cache --------
+def collection_fingerprint(collection_name: Optional[str] = None, search_params: Optional[SearchParams] = None) -> str:
+    """
+    Short hash of everything that decides what a search returns: the collection's
+    size and index/quantization config, the search params and score threshold, and
+    the embeddings file embed.py rewrites on every upload (full or incremental).
+    """
+    collection_name = collection_name or QDRANT_COLLECTION
+    info = qdrant.get_collection(collection_name)
+    search_params = search_params or build_search_params(quantization_mode(info.config.quantization_config))
+    embeddings = os.stat(EMBEDDING_FILE) if os.path.exists(EMBEDDING_FILE) else None
+    parts = {
+        "collection": collection_name,
+        "points": info.points_count,
+        "config": info.config.params.model_dump(mode="json"),
+        "hnsw": info.config.hnsw_config.model_dump(mode="json"),
+        "quantization": info.config.quantization_config.model_dump(mode="json") if info.config.quantization_config else None,
+        "search_params": search_params.model_dump(mode="json") if search_params else None,
+        "score_threshold": SIMILARITY_THRESHOLD,
+        "embeddings": [embeddings.st_mtime_ns, embeddings.st_size] if embeddings else None,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def open_retrieval_cache(enabled: bool = RETRIEVAL_CACHE, path: str = RETRIEVAL_CACHE_FILE) -> Optional[RetrievalCache]:
+    """The shared retrieval cache for the current collection, or None when disabled or Qdrant is unreachable."""
+    if not enabled:
+        return None
+    try:
+        fingerprint = collection_fingerprint()
+    except Exception as e:
+        logger.warning(f"Retrieval cache disabled, could not fingerprint collection '{QDRANT_COLLECTION}': {e}")
+        return None
+    logger.info(f"Using retrieval cache {path} (collection fingerprint {fingerprint})")
+    return RetrievalCache(fingerprint, path=path, model=embedder_name(EMBEDDING_MODEL, EMBEDDING_BACKEND, ONNX_QUANTIZED))
+
+
+# -------- Generation Function --------
+def build_answer_messages(query: str, context_chunks: List[dict], level: str, topic: str) -> List[dict]:
+    """Chat messages asking the model to answer the query from the retrieved context."""
     # Format context with citations
     context_text = "\n\n".join(
         f"[{i+1}] {chunk['text']} (Source: {chunk['source_url']}, Chunk: {chunk['chunk_id']})"
@@ -79,13 +257,19 @@ def generate_answer(query: str, context_chunks: List[dict], level: str, topic: s
 
     system_prompt = get_system_prompt(topic=topic, level=level)
     user_prompt = get_user_prompt(query=query, context_text=context_text, level=level)
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
 
+def generate_answer(query: str, context_chunks: List[dict], level: str, topic: str) -> str:
+    """
+    Generate an answer from the chat model given a query and retrieved context.
+    """
     response = client.chat.completions.create(
         model=CHAT_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
+        messages=build_answer_messages(query, context_chunks, level, topic),
         temperature=0.2,
     )
 
@@ -94,6 +278,23 @@ def generate_answer(query: str, context_chunks: List[dict], level: str, topic: s
     return answer
 
 
+async def generate_answer_async(
+    query: str,
+    context_chunks: List[dict],
+    level: str,
+    topic: str,
+    async_client,
+    messages: Optional[List[dict]] = None,
+) -> str:
+    """generate_answer on an AsyncOpenAI client (see clients.make_async_openai_client)."""
+    response = await async_client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=messages or build_answer_messages(query, context_chunks, level, topic),
+        temperature=0.2,
+    )
+    return response.choices[0].message.content.strip()
+
+
 # -------- High-Level RAG Function --------
 def retrieve_answer(
     query: str,
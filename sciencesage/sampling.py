@@ -0,0 +1,96 @@
+import hashlib
+import heapq
+import itertools
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence
+
+
+def sample_priority(key: str, seed: int = 0) -> int:
+    """Deterministic pseudo-random 64-bit priority of `key` under `seed`."""
+    digest = hashlib.blake2b(f"{seed}\0{key}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def length_bucket(text: str, bounds: Sequence[int]) -> int:
+    """Index of the character-length bucket of `text`: 0 below bounds[0], len(bounds) at or above the last."""
+    return bisect_right(bounds, len(text or ""))
+
+
+class StratifiedReservoir:
+    """
+    Seeded stratified sampling over a stream in one pass.
+
+    Every item gets a hash priority from its key and the seed; each stratum
+    keeps only the `capacity` items with the lowest priorities (a bottom-k
+    sample), so memory is O(strata * capacity) whatever the stream length.
+    The sample is uniform within each stratum and depends only on the keys
+    and the seed, not on the order items arrive in, so the same corpus and
+    seed always give the same sample and a grown corpus keeps most of it.
+    """
+
+    def __init__(self, capacity: int, seed: int = 0):
+        self.capacity = capacity
+        self.seed = seed
+        self.counts: Counter = Counter()
+        self._heaps: Dict[Hashable, List] = defaultdict(list)
+        self._order = itertools.count()
+
+    def add(self, stratum: Hashable, key: str, item: Any, priority: Optional[int] = None):
+        """Offer an item; `priority` can pass in sample_priority(key, seed) when already computed."""
+        self.counts[stratum] += 1
+        if self.capacity <= 0:
+            return
+        if priority is None:
+            priority = sample_priority(key, self.seed)
+        heap = self._heaps[stratum]
+        # Max-heap on priority, so the root is the first item to evict
+        entry = (-priority, next(self._order), key, item)
+        if len(heap) < self.capacity:
+            heapq.heappush(heap, entry)
+        elif priority < -heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def candidates(self, stratum: Hashable) -> List[tuple]:
+        """(key, item) pairs kept for `stratum`, lowest priority first."""
+        return [(key, item) for _, _, key, item in sorted(self._heaps.get(stratum, []), key=lambda e: (-e[0], e[1]))]
+
+    def strata(self) -> List[Hashable]:
+        return sorted(self._heaps, key=repr)
+
+    def sample(
+        self,
+        n: int,
+        exclude: Iterable[str] = (),
+        group: Optional[Callable[[Any], Hashable]] = None,
+        max_per_group: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        Up to `n` items, allocated across strata in proportion to their sizes
+        (D'Hondt: each slot goes to the stratum with the highest size per item
+        taken so far), taking each stratum's items in priority order. Keys in
+        `exclude` are skipped, and at most `max_per_group` items share a
+        `group(item)` value (e.g. at most two chunks per article).
+        """
+        exclude = set(exclude)
+        pending = {stratum: iter(self.candidates(stratum)) for stratum in self.strata()}
+        taken: Counter = Counter()
+        per_group: Counter = Counter()
+        queue = [(-self.counts[stratum], i, stratum) for i, stratum in enumerate(pending)]
+        heapq.heapify(queue)
+        result = []
+        while queue and len(result) < n:
+            _, i, stratum = heapq.heappop(queue)
+            for key, item in pending[stratum]:
+                if key in exclude:
+                    continue
+                if max_per_group is not None and group is not None and per_group[group(item)] >= max_per_group:
+                    continue
+                if group is not None:
+                    per_group[group(item)] += 1
+                result.append(item)
+                taken[stratum] += 1
+                heapq.heappush(queue, (-self.counts[stratum] / (taken[stratum] + 1), i, stratum))
+                break
+            # A stratum with no candidates left drops out of the allocation
+        return result
@@ -0,0 +1,103 @@
+import time
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from qdrant_client.models import PointStruct, SearchParams, CollectionStatus
+
+from sciencesage.config import (
+    GROUND_TRUTH_FILE,
+    EMBEDDING_FILE,
+    QDRANT_BATCH_SIZE,
+    logger,
+)
+from sciencesage.jsonl import iter_jsonl
+
+# -------------------------
+# Shared helpers for the Qdrant benchmark scripts
+# -------------------------
+def load_ground_truth(path: str = GROUND_TRUTH_FILE) -> List[Dict]:
+    return list(iter_jsonl(path))
+
+def load_embedding_records(path: str = EMBEDDING_FILE) -> pd.DataFrame:
+    """Load the vectors written by embed.py so benchmarks don't have to re-encode the corpus."""
+    logger.info(f"Loading embeddings from {path} ...")
+    return pd.read_parquet(path, columns=["chunk_id", "text", "embedding"])
+
+def upload_records(client, collection_name: str, records: pd.DataFrame, batch_size: int = QDRANT_BATCH_SIZE):
+    for start in range(0, len(records), batch_size):
+        batch = records.iloc[start:start + batch_size]
+        points = [
+            PointStruct(
+                id=row.chunk_id,
+                vector=list(map(float, row.embedding)),
+                payload={"chunk_id": row.chunk_id, "text": row.text},
+            )
+            for row in batch.itertuples(index=False)
+        ]
+        client.upsert(collection_name=collection_name, points=points, wait=True)
+    logger.info(f"Uploaded {len(records)} points to '{collection_name}'")
+
+def wait_for_green(client, collection_name: str, timeout: float = 300.0, poll: float = 0.5) -> bool:
+    """Wait until Qdrant has finished building the index (and quantized vectors) for a collection."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(collection_name).status == CollectionStatus.GREEN:
+            return True
+        time.sleep(poll)
+    logger.warning(f"Collection '{collection_name}' not green after {timeout:.0f}s, benchmarking anyway.")
+    return False
+
+def timed_search(
+    client,
+    collection_name: str,
+    query_vectors: List[List[float]],
+    top_k: int,
+    search_params: Optional[SearchParams] = None,
+    repeats: int = 1,
+) -> Tuple[List[List[Dict]], List[float]]:
+    """
+    Run every query vector against a collection.
+    Returns the hits of the last repeat ({chunk_id, text, score} per hit) and all latencies in ms.
+    """
+    results, latencies_ms = [], []
+    for _ in range(repeats):
+        results = []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            response = client.query_points(
+                collection_name=collection_name,
+                query=vector,
+                limit=top_k,
+                search_params=search_params,
+                with_payload=True,
+            )
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+            results.append([
+                {"chunk_id": hit.payload.get("chunk_id"), "text": hit.payload.get("text"), "score": hit.score}
+                for hit in response.points
+            ])
+    return results, latencies_ms
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    if not latencies_ms:
+        return {"latency_mean_ms": 0.0, "latency_p50_ms": 0.0, "latency_p95_ms": 0.0, "latency_p99_ms": 0.0, "qps": 0.0}
+    values = np.asarray(latencies_ms)
+    return {
+        "latency_mean_ms": float(values.mean()),
+        "latency_p50_ms": float(np.percentile(values, 50)),
+        "latency_p95_ms": float(np.percentile(values, 95)),
+        "latency_p99_ms": float(np.percentile(values, 99)),
+        "qps": float(1000.0 / values.mean()) if values.mean() > 0 else 0.0,
+    }
+
+def overlap_at_k(results: List[List[Dict]], reference: List[List[Dict]], k: int) -> float:
+    """Mean fraction of the reference (e.g. exact search) top-k ids that a result list also returned."""
+    scores = []
+    for hits, ref_hits in zip(results, reference):
+        ref_ids = {h["chunk_id"] for h in ref_hits[:k]}
+        if not ref_ids:
+            continue
+        found = {h["chunk_id"] for h in hits[:k]}
+        scores.append(len(found & ref_ids) / len(ref_ids))
+    return float(np.mean(scores)) if scores else 0.0
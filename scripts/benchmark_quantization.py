@@ -0,0 +1,93 @@
+import os
+import argparse
+from statistics import mean
+
+import pandas as pd
+from qdrant_client.models import SearchParams
+
+from sciencesage.config import (
+    EMBEDDING_DIM,
+    QDRANT_COLLECTION,
+    QUANTIZATION_BENCHMARK_FILE,
+    QUANTIZATION_OVERSAMPLING,
+    TOP_K,
+    logger,
+)
+from sciencesage.metrics import precision_at_k, recall_at_k
+from sciencesage.retrieval_system import build_search_params
+from scripts.embed import model, qdrant, ensure_collection, drop_collection
+from scripts.bench_utils import (
+    load_ground_truth,
+    load_embedding_records,
+    upload_records,
+    wait_for_green,
+    timed_search,
+    latency_summary,
+    overlap_at_k,
+)
+
+MODES = ["none", "scalar", "binary"]
+
+def benchmark_mode(mode, records, query_vectors, ground_truth_texts, exact_results, args):
+    collection_name = f"{QDRANT_COLLECTION}_bench_{mode}"
+    drop_collection(collection_name)
+    ensure_collection(EMBEDDING_DIM, collection_name=collection_name, quantization=mode)
+    upload_records(qdrant, collection_name, records)
+    wait_for_green(qdrant, collection_name)
+
+    search_params = build_search_params(mode, rescore=not args.no_rescore, oversampling=args.oversampling)
+    results, latencies = timed_search(
+        qdrant, collection_name, query_vectors, args.top_k, search_params=search_params, repeats=args.repeats
+    )
+    retrieved_texts = [[hit["text"] for hit in hits] for hits in results]
+    row = {
+        "mode": mode,
+        "rescore": mode != "none" and not args.no_rescore,
+        "oversampling": args.oversampling if mode != "none" else None,
+        "precision_at_k": mean(precision_at_k(r, g, args.top_k) for r, g in zip(retrieved_texts, ground_truth_texts)),
+        "recall_at_k": mean(recall_at_k(r, g, args.top_k) for r, g in zip(retrieved_texts, ground_truth_texts)),
+        "recall_vs_exact": overlap_at_k(results, exact_results, args.top_k),
+    }
+    row.update(latency_summary(latencies))
+    if not args.keep:
+        drop_collection(collection_name)
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare recall and latency of quantized Qdrant collections against float32.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES, help="Quantization modes to benchmark.")
+    parser.add_argument("--top-k", type=int, default=TOP_K, help="Number of results per query.")
+    parser.add_argument("--repeats", type=int, default=3, help="Times each query is repeated for latency percentiles.")
+    parser.add_argument("--oversampling", type=float, default=QUANTIZATION_OVERSAMPLING, help="Oversampling factor used when rescoring.")
+    parser.add_argument("--no-rescore", action="store_true", help="Disable rescoring with the original vectors.")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark collections instead of dropping them.")
+    args = parser.parse_args()
+
+    ground_truth = load_ground_truth()
+    if not ground_truth:
+        logger.error("No ground truth entries found. Run create_ground_truth_dataset.py first.")
+        return
+    records = load_embedding_records()
+    questions = [entry["question"] for entry in ground_truth]
+    ground_truth_texts = [[entry["text"]] if "text" in entry else [] for entry in ground_truth]
+    query_vectors = model.encode(questions, batch_size=64).tolist()
+
+    # Exact (brute force) search on the float32 collection is the reference for recall_vs_exact
+    baseline_name = f"{QDRANT_COLLECTION}_bench_exact"
+    drop_collection(baseline_name)
+    ensure_collection(EMBEDDING_DIM, collection_name=baseline_name, quantization="none")
+    upload_records(qdrant, baseline_name, records)
+    exact_results, _ = timed_search(qdrant, baseline_name, query_vectors, args.top_k, search_params=SearchParams(exact=True))
+    drop_collection(baseline_name)
+
+    rows = [benchmark_mode(mode, records, query_vectors, ground_truth_texts, exact_results, args) for mode in args.modes]
+    df = pd.DataFrame(rows)
+    logger.info(f"Quantization benchmark ({len(questions)} queries, {len(records)} points):\n{df.to_string(index=False)}")
+    print(df.to_string(index=False))
+
+    os.makedirs(os.path.dirname(QUANTIZATION_BENCHMARK_FILE), exist_ok=True)
+    df.to_csv(QUANTIZATION_BENCHMARK_FILE, index=False)
+    print(f"Saved quantization benchmark to {QUANTIZATION_BENCHMARK_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pandas as pd
+from openai import OpenAI
+from qdrant_client import QdrantClient
+
+from sciencesage.config import (
+    CHAT_MODEL,
+    QDRANT_URL,
+    QDRANT_GRPC_PORT,
+    TRANSPORT_BENCHMARK_FILE,
+    logger,
+)
+from sciencesage.clients import make_openai_client
+from scripts.bench_utils import latency_summary
+
+CHAT_COMPLETION = {
+    "id": "chatcmpl-standin",
+    "object": "chat.completion",
+    "created": 0,
+    "model": CHAT_MODEL,
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "Stand-in answer."},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13},
+}
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible chat completions endpoint with HTTP/1.1 keep-alive."""
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY keep-alive requests hit the delayed-ACK stall
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        body = json.dumps(CHAT_COMPLETION).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_in_server(delay: float = 0.0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.connections = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run_chat_requests(client: OpenAI, num_requests: int, concurrency: int):
+    def one_request(_):
+        start = time.perf_counter()
+        client.chat.completions.create(model=CHAT_MODEL, messages=[{"role": "user", "content": "ping"}])
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one_request, range(num_requests)))
+    return latencies, time.perf_counter() - start
+
+def benchmark_openai(num_requests: int, concurrency: int, delay: float):
+    rows = []
+    variants = {
+        # Baseline: every request opens (and tears down) its own TCP connection
+        "no-keepalive": lambda url: OpenAI(
+            base_url=url, api_key="stand-in", max_retries=0,
+            http_client=httpx.Client(limits=httpx.Limits(max_keepalive_connections=0)),
+        ),
+        "pooled": lambda url: make_openai_client(base_url=url, api_key="stand-in"),
+    }
+    for name, factory in variants.items():
+        server = start_stand_in_server(delay)
+        url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        client = factory(url)
+        latencies, wall = run_chat_requests(client, num_requests, concurrency)
+        client.close()
+        server.shutdown()
+        row = {"target": "openai-stand-in", "variant": name, "requests": num_requests, "connections_opened": server.connections, "wall_s": wall}
+        row.update(latency_summary(latencies))
+        rows.append(row)
+    return rows
+
+def benchmark_qdrant(num_requests: int):
+    """REST vs gRPC round trips against the running Qdrant (collection listing as a cheap call)."""
+    rows = []
+    for name, prefer_grpc in [("rest", False), ("grpc", True)]:
+        client = QdrantClient(url=QDRANT_URL, grpc_port=QDRANT_GRPC_PORT, prefer_grpc=prefer_grpc)
+        client.get_collections()  # warm up the connection
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(num_requests):
+            t0 = time.perf_counter()
+            client.get_collections()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        row = {"target": "qdrant", "variant": name, "requests": num_requests, "connections_opened": None, "wall_s": time.perf_counter() - start}
+        row.update(latency_summary(latencies))
+        rows.append(row)
+        client.close()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pooled/keep-alive transports against per-request connections.")
+    parser.add_argument("--requests", type=int, default=500, help="Number of requests per variant.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests.")
+    parser.add_argument("--delay", type=float, default=0.0, help="Artificial server latency in seconds.")
+    parser.add_argument("--qdrant", action="store_true", help="Also compare Qdrant REST vs gRPC against the running Qdrant.")
+    args = parser.parse_args()
+
+    rows = benchmark_openai(args.requests, args.concurrency, args.delay)
+    if args.qdrant:
+        rows += benchmark_qdrant(args.requests)
+
+    df = pd.DataFrame(rows)
+    logger.info(f"Transport benchmark:\n{df.to_string(index=False)}")
+    print(df.to_string(index=False))
+    print("Note: the stand-in server is plain HTTP on loopback, so TLS handshake savings in production are larger.")
+    os.makedirs(os.path.dirname(TRANSPORT_BENCHMARK_FILE), exist_ok=True)
+    df.to_csv(TRANSPORT_BENCHMARK_FILE, index=False)
+    print(f"Saved transport benchmark to {TRANSPORT_BENCHMARK_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import os
-import json
 
-from sciencesage.retrieval_system import retrieve_context, generate_answer
+from sciencesage.jsonl import JsonlWriter
+from sciencesage.retrieval_cache import cached_retrieve
+from sciencesage.retrieval_system import retrieve_context, generate_answer, open_retrieval_cache
 from sciencesage.config import (
     LEVELS,
     EXAMPLE_QUERIES,
@@ -19,7 +20,8 @@ def simple_pass_fail(answer: str) -> str:
 
 def main():
     logger.info("Testing Qdrant retrieval for all example queries...")
-    summary_records = []
+    summary = JsonlWriter(EXAMPLE_QUERY_SUMMARY_FILE, flush_every=1)
+    cache = open_retrieval_cache()
     for topic, queries in EXAMPLE_QUERIES.items():
         logger.info(f"Topic: {topic}")
         print(f"Topic: {topic}")
@@ -28,7 +30,7 @@ def main():
             logger.debug(f"Level: {level} | Query: {query}")
             print(f"  Level: {level}")
             print(f"    Query: {query}")
-            chunks = retrieve_context(query, top_k=TOP_K, topic=topic)
+            chunks = cached_retrieve(cache, query, TOP_K, topic, retrieve_context)
             logger.debug(f"Retrieved chunks: {len(chunks)}")
             print(f"    Retrieved chunks: {len(chunks)}")
             if chunks:
@@ -39,7 +41,7 @@ def main():
                 answer = ""
                 pass_fail = "FAIL"
                 print("    No chunks retrieved.\n")
-            summary_records.append({
+            summary.write({
                 "topic": topic,
                 "level": level,
                 "query": query,
@@ -47,10 +49,9 @@ def main():
                 "pass_fail": pass_fail
             })
         print("-" * 60)
-    # Save summary as JSONL
-    with open(EXAMPLE_QUERY_SUMMARY_FILE, "w") as f:
-        for rec in summary_records:
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    summary.close()
+    if cache is not None:
+        cache.close()
     print(f"Summary written to {EXAMPLE_QUERY_SUMMARY_FILE}")
 
 if __name__ == "__main__":
@@ -1,24 +1,44 @@
+import os
 import json
-import random
+import asyncio
+import hashlib
 from pathlib import Path
 
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
-from openai import OpenAI, RateLimitError
+from openai import RateLimitError
 
 from sciencesage.config import (
     CHUNKS_FILE,
+    CHUNK_STORE_FILE,
     GROUND_TRUTH_FILE,
+    LLM_CACHE_FILE,
     TOPICS,
-    EMBEDDING_MODEL,
     LEVELS,
     CHAT_MODEL,
     MAX_TOKENS,
+    GROUND_TRUTH_CONCURRENCY,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_RATE_LIMIT_RETRIES,
+    LLM_RESPONSE_CACHE,
+    GROUND_TRUTH_SAMPLES,
+    GROUND_TRUTH_SEED,
+    GROUND_TRUTH_LENGTH_BOUNDS,
+    GROUND_TRUTH_MAX_PER_ARTICLE,
     logger,
 )
-
-NUM_EXAMPLES = 80
+from sciencesage.clients import make_openai_client, make_async_openai_client
+from sciencesage.chunk_store import iter_chunks as iter_store_chunks
+from sciencesage.jsonl import JsonlWriter, iter_jsonl, write_jsonl
+from sciencesage.llm_cache import LLMResponseCache
+from sciencesage.rate_limit import MinuteRateLimiter, call_with_retries
+from sciencesage.sampling import StratifiedReservoir, length_bucket, sample_priority
+
+NUM_EXAMPLES = GROUND_TRUTH_SAMPLES
 TEMPERATURE = 0.3
+# Relevance grade of the chunk a question was written from; chunks added to
+# ground_truth_chunks later can carry their own (usually lower) grades
+SOURCE_CHUNK_GRADE = 1.0
 
 SYSTEM_PROMPT = """You are a helpful assistant creating a ground truth evaluation dataset for a RAG LLM system.
 Given a chunk, generate up to 3 diverse Q&A pairs that can be answered using that chunk.
@@ -30,15 +50,22 @@ Given a chunk, generate up to 3 diverse Q&A pairs that can be answered using tha
 - Return as a JSON list with fields: query, expected_answer, difficulty_level.
 """
 
-client = OpenAI()
+# Cached responses are reused only for the exact prompt and sampling settings that produced them
+PROMPT_VERSION = hashlib.sha256(json.dumps([SYSTEM_PROMPT, TEMPERATURE, MAX_TOKENS]).encode("utf-8")).hexdigest()[:12]
+
+client = make_openai_client()
+
+
+# Ground truth only needs these, so the chunk store decodes nothing else
+CHUNK_COLUMNS = ["chunk_id", "topic", "title", "text"]
+
+
+def iter_chunks():
+    return iter_store_chunks(columns=CHUNK_COLUMNS, path=CHUNK_STORE_FILE, jsonl_path=CHUNKS_FILE)
 
 
 def load_chunks():
-    chunks = []
-    with open(CHUNKS_FILE, "r") as f:
-        for line in f:
-            chunks.append(json.loads(line))
-    return chunks
+    return list(iter_chunks())
 
 
 def extract_json_from_codeblock(content):
@@ -51,133 +78,239 @@ def extract_json_from_codeblock(content):
     return content.strip()
 
 
+def build_messages(chunk: str):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": chunk},
+    ]
+
+
+def estimate_tokens(messages):
+    """Prompt tokens (about 4 characters per token) plus the completion limit, for the TPM limiter."""
+    return sum(len(m["content"]) for m in messages) // 4 + MAX_TOKENS
+
+
+def parse_questions(content: str) -> dict:
+    """
+    Parse the model's JSON list of Q&A pairs into a dictionary keyed by level:
+    {"Middle School": {...}, "College": {...}, "Advanced": {...}}
+    """
+    logger.debug(f"Raw OpenAI response: {content}")
+    qa_list = json.loads(extract_json_from_codeblock(content))
+
+    result = {}
+    # Map lowercased level to canonical casing
+    level_map = {lvl.lower(): lvl for lvl in LEVELS}
+    for qa in qa_list:
+        logger.debug(f"Returned difficulty_level: {qa.get('difficulty_level')}")
+        level = qa.get("difficulty_level", "").lower()
+        if level not in level_map:
+            logger.warning(f"Skipping QA with invalid difficulty_level: {level}")
+            continue
+        canonical_level = level_map[level]
+        result[canonical_level] = {
+            "query": qa.get("query"),
+            "expected_answer": qa.get("expected_answer"),
+            "difficulty_level": canonical_level,
+        }
+    return result
+
+
 def generate_questions_by_level(chunk: str) -> dict:
     """
     Calls GPT to generate up to 3 diverse Q&A pairs from the chunk.
     Returns a dictionary keyed by level: {"Middle School": {...}, "College": {...}, "Advanced": {...}}
     """
-    from sciencesage.config import LEVELS
-
-    prompt = SYSTEM_PROMPT + f"\nChunk:\n{chunk}\n\nGenerate questions now."
-
     try:
         response = client.chat.completions.create(
-            model=CHAT_MODEL,  #
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": chunk},
-            ],
+            model=CHAT_MODEL,
+            messages=build_messages(chunk),
             temperature=TEMPERATURE,
             max_tokens=MAX_TOKENS,
         )
-
-        content = response.choices[0].message.content
-        logger.debug(f"Raw OpenAI response: {content}")
-        json_str = extract_json_from_codeblock(content)
-
-        qa_list = json.loads(json_str)
-
-        result = {}
-        # Map lowercased level to canonical casing
-        level_map = {lvl.lower(): lvl for lvl in LEVELS}
-        for qa in qa_list:
-            logger.debug(f"Returned difficulty_level: {qa.get('difficulty_level')}")
-            level = qa.get("difficulty_level", "").lower()
-            if level not in level_map:
-                logger.warning(f"Skipping QA with invalid difficulty_level: {level}")
-                continue
-            canonical_level = level_map[level]
-            result[canonical_level] = {
-                "query": qa.get("query"),
-                "expected_answer": qa.get("expected_answer"),
-                "difficulty_level": canonical_level,
-            }
-        return result
-
-    except RateLimitError as e:
-        logger.error(f"OpenAI rate limit error: {e}")
-        return {}
+        return parse_questions(response.choices[0].message.content)
     except Exception as e:
         logger.error(f"Failed to generate Q&A for passage: {e}")
         return {}
 
 
-def group_chunks_by_topic(chunks):
-    from collections import defaultdict
+async def generate_questions_async(chunk: str, async_client, limiter, cache=None) -> dict:
+    """
+    generate_questions_by_level through the response cache, rate limiter and
+    RateLimitError retries. Raises when the call or the parsing fails; only
+    responses that parse into at least one Q&A are cached.
+    """
+    content = cache.get(chunk) if cache is not None else None
+    if content is not None:
+        return parse_questions(content)
+
+    messages = build_messages(chunk)
+    response = await call_with_retries(
+        lambda: async_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=messages,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+        ),
+        limiter,
+        estimate_tokens(messages),
+        retry_on=(RateLimitError,),
+        max_retries=LLM_RATE_LIMIT_RETRIES,
+    )
+    content = response.choices[0].message.content
+    qa_pairs_by_level = parse_questions(content)
+    if cache is not None and qa_pairs_by_level:
+        cache.put(chunk, content)
+    return qa_pairs_by_level
+
+
+def build_records(chunk_id, topic, text, qa_pairs_by_level):
+    records = []
+    for level in LEVELS:
+        qa = qa_pairs_by_level.get(level)
+        if qa:
+            records.append(
+                {
+                    "chunk_id": chunk_id,
+                    "topic": topic,
+                    "text": text,
+                    "level": level,
+                    "question": qa["query"],
+                    "answer": qa["expected_answer"],
+                    "ground_truth_chunks": [chunk_id],
+                    "ground_truth_grades": [SOURCE_CHUNK_GRADE],
+                }
+            )
+    return records
+
+
+async def generate_ground_truth(jobs, writer, async_client, limiter, concurrency=GROUND_TRUTH_CONCURRENCY, cache=None):
+    """
+    Generate Q&A for (chunk_id, topic, text) jobs with up to `concurrency`
+    requests in flight, appending each chunk's records as soon as it is done.
+    Chunks that still fail after the retries are logged and counted, not
+    written. Returns (chunks with Q&A, failed chunks).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"generated": 0, "failed": 0}
+    progress = tqdm(total=len(jobs), desc="Generating ground truth")
+
+    async def generate(chunk_id, topic, text):
+        async with semaphore:
+            try:
+                records = build_records(chunk_id, topic, text, await generate_questions_async(text, async_client, limiter, cache))
+            except Exception as e:
+                counts["failed"] += 1
+                logger.error(f"Failed to generate Q&A for chunk {chunk_id}: {e}")
+                return
+            finally:
+                progress.update(1)
+        writer.write_all(records)
+        if records:
+            counts["generated"] += 1
+
+    await asyncio.gather(*(generate(*job) for job in jobs))
+    progress.close()
+    return counts["generated"], counts["failed"]
+
+
+def write_in_job_order(path, jobs):
+    """
+    Rewrite the ground truth file with each chunk's records in `jobs` order,
+    keeping the level order within a chunk. generate_ground_truth appends in
+    completion order, which varies from run to run.
+    """
+    rank = {}
+    for i, (chunk_id, _, _) in enumerate(jobs):
+        rank.setdefault(chunk_id, i)
+    records = sorted(iter_jsonl(path), key=lambda r: rank.get(r.get("chunk_id"), len(jobs)))
+    tmp_path = f"{path}.tmp"
+    write_jsonl(records, tmp_path)
+    os.replace(tmp_path, path)
 
-    topic_map = defaultdict(list)
-    for c in chunks:
-        topic = c.get("topic", "other")
-        topic_map[topic].append(c)
-    return topic_map
 
+def sample_key(chunk):
+    """Sampling key of a chunk: its id, or a hash of its text when it has none."""
+    return chunk.get("chunk_id") or hashlib.sha256((chunk.get("text") or "").encode("utf-8")).hexdigest()
 
-def main():
-    chunks = load_chunks()
-    logger.info(f"Loaded {len(chunks)} chunks from {CHUNKS_FILE}")
 
-    model = SentenceTransformer(EMBEDDING_MODEL)
-    logger.info(f"Loaded embedding model: {EMBEDDING_MODEL}")
+def sample_chunks(chunks, num_examples=NUM_EXAMPLES, seed=GROUND_TRUTH_SEED, max_per_article=GROUND_TRUTH_MAX_PER_ARTICLE):
+    """
+    One pass over `chunks` (any iterable) that returns (topic_chunks, sampled_chunks):
+    one chunk per topic, then `num_examples` more chunks stratified by topic
+    and length, allocated in proportion to stratum sizes, with at most
+    `max_per_article` per article. Seeded and independent of chunk order;
+    memory holds sample candidates only, never the corpus.
+    """
+    # Same seed, same priorities: each topic's chunk is the one its strata rank first
+    by_topic = StratifiedReservoir(capacity=1, seed=seed)
+    # num_examples + 1 per stratum covers a stratum's topic chunk being excluded
+    by_stratum = StratifiedReservoir(capacity=num_examples + 1, seed=seed)
+    for c in chunks:
+        topic = c.get("topic") or "other"
+        key = sample_key(c)
+        priority = sample_priority(key, seed)
+        by_topic.add(topic, key, c, priority)
+        by_stratum.add((topic, length_bucket(c.get("text"), GROUND_TRUTH_LENGTH_BOUNDS)), key, c, priority)
 
     # Guarantee at least one group of 3 Q&A for each topic
-    topic_map = group_chunks_by_topic(chunks)
-    results = []
-
-    for topic, topic_chunks in topic_map.items():
-        # Sample one chunk per topic (or use all if <1)
-        sampled = random.sample(topic_chunks, 1) if len(topic_chunks) > 0 else []
-        for c in sampled:
-            chunk_id = c.get("chunk_id", "topic_" + topic)
-            text = c["text"]
-            qa_pairs_by_level = generate_questions_by_level(text)
-            for level in LEVELS:
-                qa = qa_pairs_by_level.get(level)
-                if qa:
-                    results.append(
-                        {
-                            "chunk_id": chunk_id,
-                            "topic": topic,
-                            "text": text,
-                            "level": level,
-                            "question": qa["query"],
-                            "answer": qa["expected_answer"],
-                            "ground_truth_chunks": [chunk_id],
-                        }
-                    )
-
-    # Then sample the rest as before, but avoid duplicating the topic chunks already used
-    used_chunk_ids = {r["chunk_id"] for r in results}
-    remaining_chunks = [c for c in chunks if c.get("chunk_id", None) not in used_chunk_ids]
-    sampled_chunks = random.sample(remaining_chunks, min(len(remaining_chunks), NUM_EXAMPLES))
-
-    for idx, c in enumerate(tqdm(sampled_chunks, desc="Generating ground truth")):
-        chunk_id = c.get("chunk_id", str(idx))
+    topic_chunks = [by_topic.candidates(topic)[0] for topic in by_topic.strata()]
+    # Then sample the rest, avoiding the topic chunks already used
+    sampled_chunks = by_stratum.sample(
+        num_examples,
+        exclude={key for key, _ in topic_chunks},
+        group=lambda c: c.get("title") or sample_key(c),
+        max_per_group=max_per_article,
+    )
+    if len(sampled_chunks) < num_examples:
+        logger.info(f"Sampled {len(sampled_chunks)} of {num_examples} chunks (corpus or per-article limit reached)")
+    return [c for _, c in topic_chunks], sampled_chunks
+
+
+def select_jobs(chunks):
+    """(chunk_id, topic, text) for one chunk per topic plus NUM_EXAMPLES more sampled by stratum."""
+    topic_chunks, sampled_chunks = sample_chunks(chunks)
+    jobs = []
+    for c in topic_chunks:
+        topic = c.get("topic") or "other"
+        jobs.append((c.get("chunk_id") or "topic_" + topic, topic, c["text"]))
+
+    for idx, c in enumerate(sampled_chunks):
+        chunk_id = c.get("chunk_id") or str(idx)
         topic = c.get("topic") or c.get("title") or TOPICS[idx % len(TOPICS)]
-        text = c["text"]
-
-        qa_pairs_by_level = generate_questions_by_level(text)
-        for level in LEVELS:
-            qa = qa_pairs_by_level.get(level)
-            if qa:
-                results.append(
-                    {
-                        "chunk_id": chunk_id,
-                        "topic": topic,
-                        "text": text,
-                        "level": level,
-                        "question": qa["query"],
-                        "answer": qa["expected_answer"],
-                        "ground_truth_chunks": [chunk_id],  # <-- add this line
-                    }
-                )
+        jobs.append((chunk_id, topic, c["text"]))
+    return jobs
+
+
+async def run(jobs, ground_truth_path, use_cache=LLM_RESPONSE_CACHE):
+    limiter = MinuteRateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+    cache = LLMResponseCache(PROMPT_VERSION, path=LLM_CACHE_FILE) if use_cache else None
+    async_client = make_async_openai_client()
+    try:
+        # Q&A pairs are appended as they are generated, so a crash keeps the paid-for ones
+        with JsonlWriter(ground_truth_path, flush_every=1) as writer:
+            generated, failed = await generate_ground_truth(jobs, writer, async_client, limiter, GROUND_TRUTH_CONCURRENCY, cache)
+        # Then put them in sampling order, so the same sample gives the same file
+        write_in_job_order(ground_truth_path, jobs)
+        return writer.count, generated, failed
+    finally:
+        await async_client.close()
+        if cache is not None:
+            logger.info(f"LLM response cache: {cache.hits} hits, {cache.misses} misses")
+            cache.close()
+
+
+def main():
+    # Chunks are streamed through the sampler, never loaded all at once
+    jobs = select_jobs(iter_chunks())
+    logger.info(f"Sampled {len(jobs)} chunks from {CHUNKS_FILE} (seed {GROUND_TRUTH_SEED})")
 
     ground_truth_path = Path(GROUND_TRUTH_FILE)
-    ground_truth_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(ground_truth_path, "w") as f:
-        for r in results:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    count, generated, failed = asyncio.run(run(jobs, ground_truth_path))
+    if failed:
+        logger.warning(f"{failed} of {len(jobs)} chunks failed and have no Q&A")
 
-    logger.success(f"Ground truth dataset created with {len(results)} examples at {ground_truth_path}")
+    logger.success(f"Ground truth dataset created with {count} examples from {generated} chunks at {ground_truth_path}")
 
 
 if __name__ == "__main__":
@@ -1,22 +1,193 @@
 import os
+import re
 import json
 import time
+import datetime
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import requests
-import wikipediaapi
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
 from sciencesage.config import (
     RAW_DATA_DIR,
+    RAW_MANIFEST_FILE,
+    RAW_CHANGESET_FILE,
+    RAW_SHARD_DIR,
+    RAW_STORAGE,
     WIKI_USER_AGENT,
     WIKI_URL,
+    WIKI_MAX_WORKERS,
+    WIKI_REQUESTS_PER_SECOND,
+    WIKI_BURST,
+    WIKI_MAX_RETRIES,
+    WIKI_BACKOFF_BASE,
+    WIKI_TIMEOUT,
+    WIKI_CHECKPOINT_EVERY,
     TOPICS,
     logger
 )
+from sciencesage.rate_limit import TokenBucket, backoff_delay, retry_after_seconds
+from sciencesage.raw_store import ShardWriter, load_index, raw_file_name, shard_name
+from sciencesage.categories import filter_categories
 
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MEDIAWIKI_MAX_TITLES = 50 # Titles per action=query request
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".svg")
+# "== Title ==" section headings in a plain-text extract (exsectionformat=wiki)
+SECTION_HEADING = re.compile(r"\n\n *(==+) (.*?) (==+) *\n")
+
+# One bucket shared by every download thread so the crawl as a whole stays polite
+rate_limiter = TokenBucket(WIKI_REQUESTS_PER_SECOND, WIKI_BURST)
+
+class CrawlStats:
+    """Thread-safe counters for the progress/throughput report."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+        self.requests = 0
+        self.retries = 0
+        self.articles = 0
+        self.failed = 0
+
+    def add(self, field: str, amount: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def report(self) -> str:
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        return (
+            f"{self.articles} articles ({self.failed} failed), {self.requests} requests, "
+            f"{self.retries} retries in {elapsed:.1f}s "
+            f"({self.articles / elapsed:.2f} articles/s, {self.requests / elapsed:.2f} requests/s)"
+        )
+
+stats = CrawlStats()
+
+def mount_pool(session: requests.Session, pool_size: int):
+    """Give the session a connection pool with room for every download thread."""
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(pool_size, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+def make_session(pool_size: int = WIKI_MAX_WORKERS) -> requests.Session:
+    """Keep-alive session reused by every MediaWiki/REST call; responses are gzip-compressed."""
+    session = requests.Session()
+    mount_pool(session, pool_size)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+session = make_session()
+# -------------------------
+# Revision manifest: title -> {"revid", "etag", "text_file", "shard", "status"}
+# -------------------------
+manifest = {}
+manifest_lock = threading.Lock()
+changed_titles = set()
+
+def load_manifest(path: str = RAW_MANIFEST_FILE) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(path: str = RAW_MANIFEST_FILE):
+    """Write the manifest atomically, so an interrupted run never leaves a truncated file."""
+    with manifest_lock:
+        snapshot = dict(manifest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def record_download(title: str, revid, etag, shard: str = None):
+    with manifest_lock:
+        manifest[title] = {
+            "revid": revid,
+            "etag": etag,
+            "text_file": raw_file_name(title, ".txt"),
+            "shard": shard,
+            "status": "done",
+        }
+        changed_titles.add(title)
+
+def record_failure(title: str, error: Exception):
+    """Mark a title for retry on the next run, keeping what is known about the stored copy."""
+    with manifest_lock:
+        entry = dict(manifest.get(title, {}))
+        entry.update({"revid": None, "status": "failed", "error": str(error)[:200]})
+        manifest[title] = entry
+
+def is_stored(title: str, entry: dict, indexes: dict = None) -> bool:
+    """
+    Whether the article's text is on disk: its loose file, or an entry in its
+    shard's index (a shard file alone may predate the article). `indexes`
+    caches loaded shard indexes across calls.
+    """
+    if entry.get("shard"):
+        shard_path = os.path.join(RAW_SHARD_DIR, entry["shard"])
+        if not os.path.exists(shard_path):
+            return False
+        if indexes is None:
+            indexes = {}
+        if shard_path not in indexes:
+            indexes[shard_path] = load_index(shard_path)
+        return title in indexes[shard_path]
+    return os.path.exists(os.path.join(RAW_DATA_DIR, raw_file_name(title, ".txt")))
+
+def save_changeset(path: str = RAW_CHANGESET_FILE, refresh: bool = False):
+    """
+    List the text files written by this run so preprocessing can skip the rest.
+    Until preprocess.py marks the changeset consumed, later runs add to it
+    instead of replacing it, so no download is missed.
+    """
+    files = {raw_file_name(title, ".txt") for title in changed_titles}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            pending = json.load(f)
+        if not pending.get("consumed_at"):
+            files |= set(pending.get("files", []))
+            refresh = refresh or bool(pending.get("refresh"))
+    save_json(path, {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "refresh": refresh,
+        "files": sorted(files),
+    })
+
+def wiki_get(url, params=None, headers=None, timeout=WIKI_TIMEOUT, max_retries=WIKI_MAX_RETRIES):
+    """
+    GET through the shared rate limiter, retrying 429/5xx responses and connection
+    errors with exponential backoff (honoring Retry-After when the server sends it).
+    Returns the last response; non-retryable statuses are returned immediately.
+    """
+    for attempt in range(max_retries + 1):
+        rate_limiter.acquire()
+        stats.add("requests")
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt, WIKI_BACKOFF_BASE)
+            logger.warning(f"Request to {url} failed ({e}), retrying in {delay:.1f}s")
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                return response
+            delay = retry_after_seconds(response.headers.get("Retry-After"))
+            if delay is None:
+                delay = backoff_delay(attempt, WIKI_BACKOFF_BASE)
+            logger.warning(f"{url} returned {response.status_code}, retrying in {delay:.1f}s")
+        stats.add("retries")
+        time.sleep(delay)
+
 def save_file(path: str, content: str):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     with open(path, "w", encoding="utf-8") as f:
@@ -27,134 +198,370 @@ def save_json(path: str, data: dict):
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
-def get_image_urls(page_title, user_agent, max_images=10):
+def query_with_continuation(params: dict, user_agent: str):
+    """
+    Run an action=query request and follow the API's `continue` tokens,
+    yielding the `query` block of every response.
+    """
     url = f"{WIKI_URL}/w/api.php"
+    base_params = {"action": "query", "format": "json", "formatversion": "2", **params}
+    continuation = {}
+    while True:
+        response = wiki_get(url, params={**base_params, **continuation}, headers={"User-Agent": user_agent})
+        if response.status_code != 200:
+            logger.warning(f"MediaWiki query failed with status {response.status_code}")
+            return
+        data = response.json()
+        yield data.get("query", {})
+        if "continue" not in data:
+            return
+        continuation = data["continue"]
+
+def fetch_category_members(category: str, user_agent: str) -> list:
+    """Main-namespace article titles in a category, following continuation ([] when it has none)."""
+    params = {"list": "categorymembers", "cmtitle": f"Category:{category}", "cmnamespace": "0", "cmlimit": "max"}
+    titles = []
+    for query in query_with_continuation(params, user_agent):
+        titles.extend(member["title"] for member in query.get("categorymembers", []))
+    return titles
+
+def fetch_image_urls_bulk(file_titles, user_agent: str) -> dict:
+    """Resolve File: titles to URLs, 50 per request. Returns {file title: url}."""
+    urls = {}
+    for start in range(0, len(file_titles), MEDIAWIKI_MAX_TITLES):
+        batch = file_titles[start:start + MEDIAWIKI_MAX_TITLES]
+        params = {"titles": "|".join(batch), "prop": "imageinfo", "iiprop": "url"}
+        for query in query_with_continuation(params, user_agent):
+            for page in query.get("pages", []):
+                if page.get("imageinfo"):
+                    urls[page["title"]] = page["imageinfo"][0]["url"]
+    return urls
+
+def fetch_bulk_metadata(titles, user_agent: str, max_images: int = 10) -> dict:
+    """
+    Fetch URL, categories, images, intro summary and latest revision id for many
+    articles at once: 50 titles per request, following continuation for the
+    per-page lists, then one imageinfo request per 50 images.
+    Returns {requested title: meta} for pages that exist.
+    """
+    pages = {}
+    aliases = {}
+    for start in range(0, len(titles), MEDIAWIKI_MAX_TITLES):
+        batch = titles[start:start + MEDIAWIKI_MAX_TITLES]
+        params = {
+            "titles": "|".join(batch),
+            "prop": "info|categories|images|extracts",
+            "inprop": "url",
+            "cllimit": "max",
+            "imlimit": "max",
+            "exintro": "1",
+            "explaintext": "1",
+            "exlimit": "max",
+            "redirects": "1",
+        }
+        for query in query_with_continuation(params, user_agent):
+            for mapping in query.get("normalized", []) + query.get("redirects", []):
+                aliases[mapping["from"]] = mapping["to"]
+            for page in query.get("pages", []):
+                if page.get("missing") or page.get("invalid"):
+                    continue
+                merged = pages.setdefault(page["title"], {"categories": [], "images": []})
+                merged["categories"] += [c["title"] for c in page.get("categories", [])]
+                merged["images"] += [i["title"] for i in page.get("images", [])]
+                for field in ("fullurl", "lastrevid", "extract"):
+                    if field in page:
+                        merged[field] = page[field]
+
+    image_titles = {
+        title: [t for t in page["images"] if t.lower().endswith(IMAGE_EXTENSIONS)][:max_images]
+        for title, page in pages.items()
+    }
+    all_files = sorted({t for files in image_titles.values() for t in files})
+    image_urls = fetch_image_urls_bulk(all_files, user_agent) if all_files else {}
+
+    metas = {}
+    for requested in titles:
+        title = requested
+        # Follow normalization then redirect (at most a couple of hops)
+        for _ in range(3):
+            title = aliases.get(title, title)
+        page = pages.get(title)
+        if page is None:
+            continue
+        metas[requested] = {
+            "title": title,
+            "fullurl": page.get("fullurl"),
+            "categories": filter_categories(page["categories"]),
+            "summary": page.get("extract", ""),
+            "images": [image_urls[t] for t in image_titles[title] if t in image_urls],
+            "lastrevid": page.get("lastrevid"),
+        }
+    logger.info(f"Fetched metadata for {len(metas)}/{len(titles)} articles in bulk")
+    return metas
+
+def render_extract(extract: str) -> str:
+    """
+    Article text from a plain-text extract, laid out as wikipediaapi's page.text:
+    the intro, then each section title on its own line followed by its body.
+    """
+    matches = list(SECTION_HEADING.finditer(extract))
+    if not matches:
+        return extract.strip()
+    text = extract[:matches[0].start()].strip()
+    if text:
+        text += "\n\n"
+    for i, match in enumerate(matches):
+        # Like wikipediaapi, the last section's body is kept unstripped
+        body = extract[match.end():matches[i + 1].start()].strip() if i + 1 < len(matches) else extract[match.end():]
+        text += match.group(2).strip() + "\n" + body + ("\n\n" if body else "")
+    return text.strip()
+
+def fetch_page_text(title: str, user_agent: str):
+    """
+    Full plain text of one article through wiki_get (rate limited, 429/5xx retried).
+    Returns None when the page does not exist; raises when the request keeps failing.
+    """
     params = {
         "action": "query",
-        "prop": "images",
-        "titles": page_title,
-        "format": "json"
+        "format": "json",
+        "formatversion": "2",
+        "titles": title,
+        "prop": "extracts",
+        "explaintext": "1",
+        "exsectionformat": "wiki",
+        "redirects": "1",
     }
-    headers = {"User-Agent": user_agent}
-    response = requests.get(url, params=params, headers=headers)
+    response = wiki_get(f"{WIKI_URL}/w/api.php", params=params, headers={"User-Agent": user_agent})
     if response.status_code != 200:
-        return []
-    data = response.json()
-    pages = data.get("query", {}).get("pages", {})
-    image_titles = []
-    for p in pages.values():
-        for img in p.get("images", []):
-            if img["title"].lower().endswith((".jpg", ".jpeg", ".png", ".svg")):
-                image_titles.append(img["title"])
-    if not image_titles:
-        return []
-    image_urls = []
-    for chunk_start in range(0, min(len(image_titles), max_images), 50):
-        chunk = image_titles[chunk_start:chunk_start+50]
-        params = {
-            "action": "query",
-            "titles": "|".join(chunk),
-            "prop": "imageinfo",
-            "iiprop": "url",
-            "format": "json"
-        }
-        resp = requests.get(url, params=params, headers=headers)
-        if resp.status_code != 200:
-            continue
-        img_data = resp.json()
-        for img_page in img_data.get("query", {}).get("pages", {}).values():
-            if "imageinfo" in img_page:
-                image_urls.append(img_page["imageinfo"][0]["url"])
-        if len(image_urls) >= max_images:
-            break
-    return image_urls[:max_images]
-
-# Add this constant for excluded category prefixes
-EXCLUDED_CATEGORY_PREFIXES = [
-    "Category:Articles",
-    "Category:CS1",
-    "Category:Wikipedia",
-    "Category:Pages",
-    "Category:Vague",
-    "Category:Use",
-    "Category:Short",
-    "Category:Webarchive",
-    "Category:All",
-    "Category:Commons",
-]
-
-def filter_categories(categories):
-    """Filter out categories with excluded prefixes."""
-    return [
-        cat for cat in categories
-        if not any(cat.startswith(prefix) for prefix in EXCLUDED_CATEGORY_PREFIXES)
-    ]
-
-def download_wikipedia_raw(topic: str, user_agent: str):
-    wiki = wikipediaapi.Wikipedia(language='en', user_agent=user_agent)
-    page = wiki.page(topic)
-    if not page.exists():
+        raise RuntimeError(f"Text query for {title} failed with status {response.status_code}")
+    for page in response.json().get("query", {}).get("pages", []):
+        if page.get("missing") or page.get("invalid"):
+            return None
+        if "extract" in page:
+            return render_extract(page["extract"])
+    return None
+
+def fetch_revision_ids(titles, user_agent: str) -> dict:
+    """Current revision id per requested title, 50 titles per request. Missing pages are omitted."""
+    revids = {}
+    for start in range(0, len(titles), MEDIAWIKI_MAX_TITLES):
+        batch = titles[start:start + MEDIAWIKI_MAX_TITLES]
+        aliases = {}
+        by_title = {}
+        for query in query_with_continuation({"titles": "|".join(batch), "prop": "info", "redirects": "1"}, user_agent):
+            for mapping in query.get("normalized", []) + query.get("redirects", []):
+                aliases[mapping["from"]] = mapping["to"]
+            for page in query.get("pages", []):
+                if "lastrevid" in page:
+                    by_title[page["title"]] = page["lastrevid"]
+        for requested in batch:
+            title = requested
+            for _ in range(3):
+                title = aliases.get(title, title)
+            if title in by_title:
+                revids[requested] = by_title[title]
+    return revids
+
+def select_changed_titles(titles, revids: dict = None) -> list:
+    """
+    Titles still to download: new, failed last time, or whose stored text has gone
+    missing. With `revids` (a refresh), titles with a newer revision are included too.
+    """
+    changed = []
+    indexes = {}
+    for title in titles:
+        entry = manifest.get(title)
+        if (
+            entry is None
+            or entry.get("status") == "failed"
+            or (revids is not None and entry.get("revid") != revids.get(title))
+            or not is_stored(title, entry, indexes)
+        ):
+            changed.append(title)
+    return changed
+
+def download_wikipedia_raw(topic: str, user_agent: str, meta: dict = None, store: ShardWriter = None):
+    """
+    Download text, metadata and HTML for one article. When `meta` was already
+    fetched in bulk (see fetch_bulk_metadata), only the text and HTML are requested;
+    otherwise the metadata is fetched the same way for this one title.
+    With a `store` the article is appended to that shard instead of written as loose files.
+    """
+    # Every request goes through wiki_get, so 429/5xx responses are retried, not fatal
+    if meta is None:
+        meta = fetch_bulk_metadata([topic], user_agent).get(topic)
+    text = fetch_page_text(topic, user_agent) if meta is not None else None
+    if text is None:
         logger.warning(f"Wikipedia page does not exist: {topic}")
         return
-    # Save raw text
-    text_fname = f"wikipedia_{topic.replace(' ', '_')}.txt"
-    save_file(os.path.join(RAW_DATA_DIR, text_fname), page.text)
-    # Get image URLs
-    image_urls = get_image_urls(topic, user_agent)
-    # Filter categories
-    filtered_categories = filter_categories(list(page.categories.keys()))
-    # Save meta data
-    meta = {
-        "title": page.title,
-        "fullurl": page.fullurl,
-        "categories": filtered_categories,
-        "summary": page.summary,
-        "images": image_urls,
-    }
-    meta_fname = f"wikipedia_{topic.replace(' ', '_')}.meta.json"
-    save_json(os.path.join(RAW_DATA_DIR, meta_fname), meta)
-    # Save HTML (optional, but often useful)
+    if store is None:
+        save_file(os.path.join(RAW_DATA_DIR, raw_file_name(topic, ".txt")), text)
+        save_json(os.path.join(RAW_DATA_DIR, raw_file_name(topic, ".meta.json")), meta)
+    # Save HTML (optional, but often useful); a matching ETag means the stored copy is current
     html_url = f"{WIKI_URL}/api/rest_v1/page/html/{topic.replace(' ', '_')}"
-    resp = requests.get(html_url, headers={"User-Agent": user_agent}, timeout=20)
+    html_path = os.path.join(RAW_DATA_DIR, raw_file_name(topic, ".html"))
+    previous = store.read(topic) if store is not None else None
+    html = previous.get("html") if previous else None
+    headers = {"User-Agent": user_agent}
+    etag = manifest.get(topic, {}).get("etag")
+    if etag and (html is not None if store is not None else os.path.exists(html_path)):
+        headers["If-None-Match"] = etag
+    resp = wiki_get(html_url, headers=headers)
     if resp.status_code == 200:
-        html_fname = f"wikipedia_{topic.replace(' ', '_')}.html"
-        save_file(os.path.join(RAW_DATA_DIR, html_fname), resp.text)
+        html = resp.text
+        if store is None:
+            save_file(html_path, html)
+        etag = resp.headers.get("ETag")
         logger.info(f"Saved HTML, text, and meta for {topic}")
+    elif resp.status_code == 304:
+        logger.info(f"HTML unchanged for {topic}, saved text and meta")
     else:
         logger.warning(f"Failed to fetch HTML for {topic}: {resp.status_code}")
+    if store is not None:
+        store.write({"title": topic, "text": text, "meta": meta, "html": html})
+    record_download(topic, meta.get("lastrevid"), etag, os.path.basename(store.path) if store is not None else None)
 
-def download_category_articles(category: str, user_agent: str):
-    wiki = wikipediaapi.Wikipedia(language='en', user_agent=user_agent)
-    cat_page = wiki.page(f"Category:{category}")
-    if not cat_page.exists():
-        logger.warning(f"Wikipedia category does not exist: {category}")
-        return 0
+def download_articles_concurrently(titles, user_agent: str, max_workers: int = WIKI_MAX_WORKERS, desc: str = "Downloading articles", metas: dict = None, store: ShardWriter = None):
+    """
+    Download articles on a bounded thread pool. Every HTTP call goes through the
+    shared rate limiter, so max_workers bounds concurrency, not request rate.
+    `metas` holds metadata prefetched with fetch_bulk_metadata; `store` is the
+    shard to append to when packed storage is enabled.
+    Returns the number of articles downloaded without error.
+    """
     count = 0
-    articles = [
-        (title, page)
-        for title, page in cat_page.categorymembers.items()
-        if page.ns == wikipediaapi.Namespace.MAIN
-    ]
-    for title, page in tqdm(articles, desc=f"Downloading {category} articles"):
-        logger.info(f"Downloading article: {title}")
-        download_wikipedia_raw(title, user_agent)
-        count += 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for title in titles:
+            task_kwargs = {}
+            if metas is not None:
+                task_kwargs["meta"] = metas[title]
+            if store is not None:
+                task_kwargs["store"] = store
+            futures[executor.submit(download_wikipedia_raw, title, user_agent, **task_kwargs)] = title
+        progress = tqdm(as_completed(futures), total=len(futures), desc=desc)
+        for finished, future in enumerate(progress, start=1):
+            title = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                stats.add("failed")
+                record_failure(title, e)
+                logger.error(f"Failed to download {title}: {e}")
+            else:
+                stats.add("articles")
+                count += 1
+            progress.set_postfix_str(f"{stats.requests} req, {stats.retries} retries")
+            if finished % WIKI_CHECKPOINT_EVERY == 0:
+                checkpoint(store)
     return count
 
-if __name__ == "__main__":
+def checkpoint(store: ShardWriter = None):
+    """Persist shard data before the manifest that claims it is stored."""
+    if store is not None:
+        store.flush()
+    save_manifest()
+
+def download_category_articles(category: str, user_agent: str, max_workers: int = WIKI_MAX_WORKERS, refresh: bool = False, storage: str = "files", force: bool = False, limit: int = None):
+    """
+    Download the main-namespace articles of a category. Titles completed by an
+    earlier run are skipped unless `force`; `refresh` also re-downloads titles with
+    a newer revision. At most `limit` articles are fetched (None for no limit).
+    """
+    titles = fetch_category_members(category, user_agent)
+    if not titles:
+        logger.warning(f"Wikipedia category does not exist or has no articles: {category}")
+        return 0
+    if not force:
+        revids = fetch_revision_ids(titles, user_agent) if refresh else None
+        pending = select_changed_titles(titles, revids)
+        logger.info(f"{category}: {len(pending)}/{len(titles)} articles still to download")
+        titles = pending
+    if limit is not None:
+        titles = titles[:limit]
+    if not titles:
+        return 0
+    metas = fetch_bulk_metadata(titles, user_agent)
+    missing = [t for t in titles if t not in metas]
+    if missing:
+        logger.warning(f"Skipping {len(missing)} articles without metadata: {missing[:5]}")
+    titles = [t for t in titles if t in metas]
+    logger.info(f"Downloading {len(titles)} articles from {category} with {max_workers} workers")
+    if storage != "shards":
+        return download_articles_concurrently(titles, user_agent, max_workers, desc=f"Downloading {category} articles", metas=metas)
+    store = ShardWriter(os.path.join(RAW_SHARD_DIR, shard_name(category)))
+    try:
+        return download_articles_concurrently(titles, user_agent, max_workers, desc=f"Downloading {category} articles", metas=metas, store=store)
+    finally:
+        store.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Download Wikipedia articles for the configured topics.")
+    parser.add_argument("--workers", type=int, default=WIKI_MAX_WORKERS, help="Concurrent article downloads.")
+    parser.add_argument("--rate", type=float, default=WIKI_REQUESTS_PER_SECOND, help="Maximum requests per second across all workers.")
+    parser.add_argument("--refresh", action="store_true", help="Also re-download articles whose revision changed since the last run.")
+    parser.add_argument("--storage", choices=["files", "shards"], default=RAW_STORAGE, help="Loose files per article, or one gzip JSONL shard per category.")
+    parser.add_argument("--force", action="store_true", help="Re-download articles already completed by an earlier run.")
+    parser.add_argument("--max-articles", type=int, default=None, help="Stop after this many articles; the next run resumes where this one stopped.")
+    args = parser.parse_args()
+    rate_limiter.set_rate(args.rate, WIKI_BURST)
+    mount_pool(session, args.workers)
+    manifest.update(load_manifest())
+
     start_time = time.time()
     total_articles = 0
-    for topic in tqdm(TOPICS, desc="Topics"):
-        # If topic is a category, download all articles in the category
-        if topic.lower().startswith("category:"):
-            category = topic.split(":", 1)[1]
-            logger.info(f"Downloading all articles in category: {category}")
-            count = download_category_articles(category, WIKI_USER_AGENT)
-            total_articles += count
-        else:
-            logger.info(f"Downloading Wikipedia data for: {topic}")
-            download_wikipedia_raw(topic, WIKI_USER_AGENT)
-            total_articles += 1
+    remaining = args.max_articles
+    # Individual topics share one shard
+    topic_store = ShardWriter(os.path.join(RAW_SHARD_DIR, shard_name("topics"))) if args.storage == "shards" else None
+    try:
+        for topic in tqdm(TOPICS, desc="Topics"):
+            if remaining is not None and remaining <= 0:
+                logger.info(f"Reached --max-articles {args.max_articles}; rerun to continue the crawl")
+                break
+            # If topic is a category, download all articles in the category
+            if topic.lower().startswith("category:"):
+                category = topic.split(":", 1)[1]
+                logger.info(f"Downloading all articles in category: {category}")
+                count = download_category_articles(
+                    category, WIKI_USER_AGENT, args.workers,
+                    refresh=args.refresh, storage=args.storage, force=args.force, limit=remaining,
+                )
+                total_articles += count
+                if remaining is not None:
+                    remaining -= count
+            else:
+                if not args.force:
+                    revids = fetch_revision_ids([topic], WIKI_USER_AGENT) if args.refresh else None
+                    if not select_changed_titles([topic], revids):
+                        logger.info(f"Already downloaded: {topic}")
+                        continue
+                logger.info(f"Downloading Wikipedia data for: {topic}")
+                try:
+                    download_wikipedia_raw(topic, WIKI_USER_AGENT, store=topic_store)
+                except Exception as e:
+                    stats.add("failed")
+                    record_failure(topic, e)
+                    logger.error(f"Failed to download {topic}: {e}")
+                else:
+                    total_articles += 1
+                    if remaining is not None:
+                        remaining -= 1
+            checkpoint(topic_store)
+            logger.info(f"Crawl progress: {stats.report()}")
+    finally:
+        # Also runs on Ctrl-C, so the next run resumes from the last completed article
+        if topic_store is not None:
+            topic_store.close()
+        save_manifest()
+        save_changeset(refresh=args.refresh)
+    failed = [title for title, entry in manifest.items() if entry.get("status") == "failed"]
+    if failed:
+        logger.warning(f"{len(failed)} articles failed and will be retried on the next run: {failed[:5]}")
     elapsed = time.time() - start_time
+    logger.info(f"Changed articles handed to preprocessing: {len(changed_titles)} (see {RAW_CHANGESET_FILE})")
     logger.info(f"Total number of articles downloaded: {total_articles}")
+    logger.info(f"Throughput: {stats.report()}")
     logger.info(f"Total elapsed time: {elapsed:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,53 @@
+import os
 import json
 import uuid
+import datetime
+from itertools import chain
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterable, Iterator, List, Dict, Optional
 import argparse
 from tqdm import tqdm
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sciencesage.config import logger
 
 from sciencesage.config import (
     EMBEDDING_MODEL,
     EMBEDDING_DIM,
     CHUNKS_FILE,
+    CHUNKS_CHANGESET_FILE,
     CHUNK_FIELDS,
     QDRANT_HOST,
     QDRANT_PORT,
     QDRANT_COLLECTION,
     QDRANT_BATCH_SIZE,
     EMBEDDING_FILE,
-    DISTANCE_METRIC
+    DISTANCE_METRIC,
+    EMBEDDING_BACKEND,
+    QUANTIZATION,
+    QUANTIZATION_QUANTILE,
+    QUANTIZATION_ALWAYS_RAM,
+    HNSW_M,
+    HNSW_EF_CONSTRUCT,
+)
+from sciencesage.encoders import get_encoder
+from sciencesage.clients import make_qdrant_client
+from sciencesage.jsonl import iter_jsonl
+from qdrant_client.models import (
+    PointStruct,
+    VectorParams,
+    Distance,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    HnswConfigDiff,
+    Filter,
+    FieldCondition,
+    MatchAny,
+    FilterSelector,
 )
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance
 
 # -------------------------
 # Distance metric mapping
@@ -36,42 +62,179 @@ chosen_distance = distance_map.get(DISTANCE_METRIC, Distance.COSINE)
 # -------------------------
 # Model and Qdrant setup
 # -------------------------
-logger.info(f"Loading embedding model: {EMBEDDING_MODEL}")
-model = SentenceTransformer(EMBEDDING_MODEL)
+logger.info(f"Loading embedding model: {EMBEDDING_MODEL} (backend={EMBEDDING_BACKEND})")
+model = get_encoder()
 logger.info(f"Connecting to Qdrant at {QDRANT_HOST}:{QDRANT_PORT}")
-qdrant = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+qdrant = make_qdrant_client()
 
 # -------------------------
 # Helpers
 # -------------------------
+# Column types of the embeddings parquet (CHUNK_FIELDS plus the vector)
+EMBEDDING_SCHEMA = pa.schema([
+    ("chunk_id", pa.string()),
+    ("text", pa.string()),
+    ("title", pa.string()),
+    ("source_url", pa.string()),
+    ("categories", pa.list_(pa.string())),
+    ("topic", pa.string()),
+    ("images", pa.list_(pa.string())),
+    ("summary", pa.string()),
+    ("chunk_index", pa.int64()),
+    ("char_start", pa.int64()),
+    ("char_end", pa.int64()),
+    ("created_at", pa.string()),
+    ("embedding", pa.list_(pa.float64())),
+])
+
+def iter_chunks(path: Path) -> Iterator[Dict]:
+    logger.info(f"Streaming chunks from {path} ...")
+    return iter_jsonl(path)
+
 def load_chunks(path: Path) -> List[Dict]:
-    logger.info(f"Loading chunks from {path} ...")
+    return list(iter_chunks(path))
+
+class EmbeddingParquetWriter:
+    """
+    Write embedding records to parquet in row groups of `row_group_size`, so
+    memory stays at one row group however large the corpus is. Rows go to a
+    temp file that replaces `path` on close, leaving the old file intact on a crash.
+    """
+
+    def __init__(self, path, schema: pa.Schema = EMBEDDING_SCHEMA, row_group_size: int = 4096):
+        self.path = str(path)
+        self.tmp_path = self.path + ".tmp"
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._buffer = []
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._writer = pq.ParquetWriter(self.tmp_path, schema)
+
+    def write(self, records: List[Dict]):
+        self._buffer.extend(records)
+        self.rows += len(records)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._writer.write_table(pa.Table.from_pylist(self._buffer, schema=self.schema))
+            self._buffer = []
+
+    def copy_from(self, path, exclude_titles: Iterable[str] = ()):
+        """Carry over rows of an existing parquet file, minus the given articles."""
+        exclude_titles = set(exclude_titles)
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=self.row_group_size):
+            self.write([r for r in batch.to_pylist() if r.get("title") not in exclude_titles])
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+def load_changeset(path: Path) -> Dict:
     with open(path, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f]
+        return json.load(f)
+
+def mark_changeset_consumed(path: Path):
+    """
+    Stamp the changeset as applied, so the next preprocess.py run starts a new
+    one instead of merging into it.
+    """
+    changeset = load_changeset(path)
+    changeset["consumed_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    tmp_path = Path(str(path) + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(changeset, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def delete_title_points(titles: List[str], collection_name: Optional[str] = None, batch_size: int = 100):
+    """Delete every point whose payload title is in `titles` (stale chunks of changed/removed articles)."""
+    collection_name = collection_name or QDRANT_COLLECTION
+    for start in range(0, len(titles), batch_size):
+        batch = titles[start:start + batch_size]
+        qdrant.delete(
+            collection_name=collection_name,
+            points_selector=FilterSelector(
+                filter=Filter(must=[FieldCondition(key="title", match=MatchAny(any=batch))])
+            ),
+        )
 
 def get_embedding(text: str) -> List[float]:
     return model.encode(text).tolist()
 
-def ensure_collection(vector_size: int):
+def build_quantization_config(mode: Optional[str] = None):
+    """
+    Build the Qdrant quantization config for a mode: none, scalar (int8) or binary.
+    Returns None for unquantized float32 collections.
+    """
+    mode = (mode or QUANTIZATION).lower()
+    if mode == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=QUANTIZATION_QUANTILE,
+                always_ram=QUANTIZATION_ALWAYS_RAM,
+            )
+        )
+    if mode == "binary":
+        return BinaryQuantization(
+            binary=BinaryQuantizationConfig(always_ram=QUANTIZATION_ALWAYS_RAM)
+        )
+    if mode != "none":
+        logger.warning(f"Unknown quantization mode '{mode}', creating unquantized collection.")
+    return None
+
+def build_hnsw_config(m: Optional[int] = None, ef_construct: Optional[int] = None):
+    """
+    Build the HNSW index config from explicit values or the (tuned) config defaults.
+    Returns None when neither is set so Qdrant's defaults apply.
+    """
+    m = m if m is not None else HNSW_M
+    ef_construct = ef_construct if ef_construct is not None else HNSW_EF_CONSTRUCT
+    if m is None and ef_construct is None:
+        return None
+    return HnswConfigDiff(m=m, ef_construct=ef_construct)
+
+def ensure_collection(
+    vector_size: int,
+    collection_name: Optional[str] = None,
+    quantization: Optional[str] = None,
+    hnsw_m: Optional[int] = None,
+    hnsw_ef_construct: Optional[int] = None,
+):
+    collection_name = collection_name or QDRANT_COLLECTION
     collections = qdrant.get_collections().collections
     existing = [c.name for c in collections]
-    if QDRANT_COLLECTION not in existing:
-        logger.info(f"Creating collection '{QDRANT_COLLECTION}' ...")
+    if collection_name not in existing:
+        logger.info(f"Creating collection '{collection_name}' ...")
+        collection_kwargs = {}
+        quantization_config = build_quantization_config(quantization)
+        if quantization_config is not None:
+            logger.info(f"Using quantization: {quantization or QUANTIZATION}")
+            collection_kwargs["quantization_config"] = quantization_config
+        hnsw_config = build_hnsw_config(hnsw_m, hnsw_ef_construct)
+        if hnsw_config is not None:
+            logger.info(f"Using HNSW config: m={hnsw_config.m}, ef_construct={hnsw_config.ef_construct}")
+            collection_kwargs["hnsw_config"] = hnsw_config
         qdrant.create_collection(
-            collection_name=QDRANT_COLLECTION,
-            vectors_config=VectorParams(size=vector_size, distance=chosen_distance)
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=vector_size, distance=chosen_distance),
+            **collection_kwargs
         )
     else:
-        logger.info(f"Collection '{QDRANT_COLLECTION}' already exists.")
+        logger.info(f"Collection '{collection_name}' already exists.")
 
-def drop_collection():
+def drop_collection(collection_name: Optional[str] = None):
+    collection_name = collection_name or QDRANT_COLLECTION
     collections = qdrant.get_collections().collections
     existing = [c.name for c in collections]
-    if QDRANT_COLLECTION in existing:
-        logger.info(f"Dropping collection '{QDRANT_COLLECTION}' ...")
-        qdrant.delete_collection(collection_name=QDRANT_COLLECTION)
+    if collection_name in existing:
+        logger.info(f"Dropping collection '{collection_name}' ...")
+        qdrant.delete_collection(collection_name=collection_name)
     else:
-        logger.info(f"Collection '{QDRANT_COLLECTION}' does not exist, skipping drop.")
+        logger.info(f"Collection '{collection_name}' does not exist, skipping drop.")
 
 # -------------------------
 # Main
@@ -83,23 +246,57 @@ def main():
         action="store_true",
         help="Append to existing collection instead of dropping and recreating."
     )
+    parser.add_argument(
+        "--quantization",
+        choices=["none", "scalar", "binary"],
+        default=None,
+        help=f"Vector quantization for a newly created collection (default: {QUANTIZATION})."
+    )
+    parser.add_argument(
+        "--changeset",
+        nargs="?",
+        const=CHUNKS_CHANGESET_FILE,
+        default=None,
+        help=f"Only re-embed articles listed in preprocess.py's changeset (default path: {CHUNKS_CHANGESET_FILE})."
+    )
     args = parser.parse_args()
 
-    if not args.append:
+    changeset = load_changeset(Path(args.changeset)) if args.changeset else None
+    if changeset is not None and changeset.get("consumed_at"):
+        logger.warning(f"Changeset {args.changeset} was already applied at {changeset['consumed_at']}; re-applying it.")
+    if changeset is not None and changeset.get("full"):
+        logger.info("Changeset is from a full preprocessing run, re-embedding everything.")
+        changeset = None
+    if not args.append and changeset is None:
         drop_collection()
 
-    chunks = load_chunks(Path(CHUNKS_FILE))
-    if not chunks:
+    chunks = iter_chunks(Path(CHUNKS_FILE))
+    first = next(chunks, None)
+    if first is None:
         logger.error("No chunks found. Run preprocess.py first.")
         return
+    chunks = chain([first], chunks)
 
-    ensure_collection(EMBEDDING_DIM)
+    ensure_collection(EMBEDDING_DIM, quantization=args.quantization)
+
+    stale_titles = set()
+    if changeset is not None:
+        changed_titles = set(changeset.get("changed_titles", []))
+        stale_titles = changed_titles | set(changeset.get("removed_titles", []))
+        logger.info(f"Incremental run: {len(changed_titles)} changed and {len(changeset.get('removed_titles', []))} removed articles")
+        delete_title_points(sorted(stale_titles))
+        chunks = (c for c in chunks if c.get("title") in changed_titles)
+
+    # Embeddings stream to parquet batch by batch; an incremental run first carries over the unchanged rows
+    parquet = EmbeddingParquetWriter(EMBEDDING_FILE)
+    if changeset is not None and Path(EMBEDDING_FILE).exists():
+        parquet.copy_from(EMBEDDING_FILE, exclude_titles=stale_titles)
 
     points = []
     embeddings_records = []
     for i, chunk in enumerate(tqdm(chunks, desc="Embedding and uploading chunks")):
         vector = get_embedding(chunk["text"])
-        point_id = chunk.get("uuid") or str(uuid.uuid5(uuid.NAMESPACE_DNS, str(chunk)))
+        point_id = chunk.get("uuid") or chunk.get("chunk_id") or str(uuid.uuid5(uuid.NAMESPACE_DNS, str(chunk)))
         payload = {k: chunk.get(k) for k in CHUNK_FIELDS if k != "embedding"}
         payload["embedding"] = vector
         payload["chunk_id"] = point_id
@@ -120,7 +317,9 @@ def main():
                     logger.warning(f"Point with id {p.id} has chunk_id=None in payload!")
             logger.info(f"Uploading batch of {len(points)} points to Qdrant ...")
             qdrant.upsert(collection_name=QDRANT_COLLECTION, points=points)
+            parquet.write(embeddings_records)
             points = []
+            embeddings_records = []
 
     if points:
         # --- Sanity check before final upload ---
@@ -129,16 +328,21 @@ def main():
                 logger.warning(f"Point with id {p.id} has chunk_id=None in payload!")
         logger.info(f"Uploading final batch of {len(points)} points to Qdrant ...")
         qdrant.upsert(collection_name=QDRANT_COLLECTION, points=points)
+        parquet.write(embeddings_records)
+
+    parquet.close()
+    logger.info(f"Saved {parquet.rows} embeddings to parquet: {EMBEDDING_FILE}")
 
-    # Save embeddings to parquet
-    df = pd.DataFrame(embeddings_records)
-    df.to_parquet(EMBEDDING_FILE, index=False)
-    logger.info(f"Saved embeddings to parquet: {EMBEDDING_FILE}")
+    # A changeset applied, or a full re-embed, leaves nothing pending for preprocess.py to merge into
+    consumed = Path(args.changeset) if args.changeset else (None if args.append else Path(CHUNKS_CHANGESET_FILE))
+    if consumed is not None and consumed.exists():
+        mark_changeset_consumed(consumed)
 
     # --- Parquet sanity check: show first few records ---
     logger.info("Parquet file sample (first 5 rows):")
-    df_check = pd.read_parquet(EMBEDDING_FILE)
-    logger.info(f"\n{df_check.head()}")
+    sample = next(pq.ParquetFile(EMBEDDING_FILE).iter_batches(batch_size=5), None)
+    if sample is not None:
+        logger.info(f"\n{sample.to_pandas()}")
 
 if __name__ == "__main__":
     main()
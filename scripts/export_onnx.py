@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import argparse
+from itertools import islice
+from typing import List
+
+import torch
+from sentence_transformers import SentenceTransformer
+
+from sciencesage.config import (
+    EMBEDDING_MODEL,
+    ONNX_MODEL_DIR,
+    ONNX_PARITY_THRESHOLD,
+    CHUNKS_FILE,
+    EXAMPLE_QUERIES,
+    logger,
+)
+from sciencesage.encoders import (
+    OnnxEncoder,
+    ONNX_MODEL_FILE,
+    ONNX_QUANTIZED_MODEL_FILE,
+    cosine_parity,
+)
+from sciencesage.chunk_store import iter_chunks
+
+class TransformerOutput(torch.nn.Module):
+    """Expose only last_hidden_state so the ONNX graph has a single output; pooling happens in OnnxEncoder."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids,
+        ).last_hidden_state
+
+def export_onnx(st_model, output_dir: str, opset: int = 17) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(output_dir)
+
+    dummy = tokenizer(["ScienceSage export"], return_tensors="pt", padding=True)
+    inputs = (dummy["input_ids"], dummy["attention_mask"], dummy.get("token_type_ids", torch.zeros_like(dummy["input_ids"])))
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            TransformerOutput(transformer),
+            inputs,
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+    with open(os.path.join(output_dir, "export_info.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": EMBEDDING_MODEL, "max_seq_length": st_model.max_seq_length, "opset": opset}, f, indent=2)
+    logger.success(f"Exported ONNX model to {model_path}")
+    return model_path
+
+def quantize_onnx(output_dir: str) -> str:
+    """Dynamic int8 quantization of the weights; activations stay float and are quantized at runtime."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantized_path = os.path.join(output_dir, ONNX_QUANTIZED_MODEL_FILE)
+    quantize_dynamic(
+        os.path.join(output_dir, ONNX_MODEL_FILE),
+        quantized_path,
+        weight_type=QuantType.QInt8,
+    )
+    logger.success(f"Saved int8 quantized ONNX model to {quantized_path}")
+    return quantized_path
+
+def load_parity_texts(num_texts: int) -> List[str]:
+    """Sample chunk texts for the parity check, falling back to the example queries."""
+    if os.path.exists(CHUNKS_FILE):
+        texts = [chunk["text"] for chunk in islice(iter_chunks(columns=["text"]), num_texts)]
+        if texts:
+            return texts
+    return [q for queries in EXAMPLE_QUERIES.values() for q in queries][:num_texts]
+
+def check_parity(reference, candidate, texts: List[str], threshold: float = ONNX_PARITY_THRESHOLD) -> bool:
+    """Compare candidate embeddings to the reference (torch) embeddings; every text must reach the threshold."""
+    similarities = cosine_parity(reference.encode(texts), candidate.encode(texts))
+    logger.info(
+        f"Parity over {len(texts)} texts: min cosine={similarities.min():.5f}, "
+        f"mean cosine={similarities.mean():.5f} (threshold {threshold})"
+    )
+    return bool(similarities.min() >= threshold)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX and check parity with torch.")
+    parser.add_argument("--output-dir", default=ONNX_MODEL_DIR, help="Directory for model.onnx and tokenizer files.")
+    parser.add_argument("--quantize", action="store_true", help="Also write an int8 dynamically quantized model.")
+    parser.add_argument("--threshold", type=float, default=ONNX_PARITY_THRESHOLD, help="Minimum cosine similarity to torch embeddings.")
+    parser.add_argument("--num-texts", type=int, default=200, help="Number of texts used for the parity check.")
+    parser.add_argument("--skip-parity", action="store_true", help="Skip the parity check.")
+    args = parser.parse_args()
+
+    st_model = SentenceTransformer(EMBEDDING_MODEL)
+    export_onnx(st_model, args.output_dir)
+    if args.quantize:
+        quantize_onnx(args.output_dir)
+    if args.skip_parity:
+        return
+
+    texts = load_parity_texts(args.num_texts)
+    variants = [False, True] if args.quantize else [False]
+    passed = True
+    for quantized in variants:
+        encoder = OnnxEncoder(args.output_dir, quantized=quantized, max_seq_length=st_model.max_seq_length)
+        name = "int8" if quantized else "fp32"
+        ok = check_parity(st_model, encoder, texts, args.threshold)
+        print(f"ONNX {name} parity: {'PASS' if ok else 'FAIL'}")
+        passed = passed and ok
+    if not passed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
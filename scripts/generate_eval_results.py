@@ -1,54 +1,61 @@
 import os
-import json
+import time
+import argparse
+from itertools import islice
 from tqdm import tqdm
 
 from sciencesage.config import (
     GROUND_TRUTH_FILE,
     EVAL_RESULTS_FILE,
     TOP_K,
+    EVAL_BATCH_SIZE,
+    EVAL_WORKERS,
     logger,
 )
-from sciencesage.retrieval_system import retrieve_context
-from sciencesage.metrics import (
-    precision_at_k,
-    recall_at_k,
-    reciprocal_rank,
-    ndcg_at_k,
-)
+from sciencesage.jsonl import iter_jsonl, write_jsonl, JsonlWriter
+from sciencesage.retrieval_cache import cached_retrieve
+from sciencesage.retrieval_system import retrieve_context, encode_queries, search_batch, open_retrieval_cache
+from sciencesage.metrics import add_retrieval_metrics, ground_truth_fields
 
 def load_jsonl(path):
-    with open(path, "r") as f:
-        return [json.loads(line) for line in f if line.strip()]
+    return list(iter_jsonl(path))
 
 def save_jsonl(records, path):
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w") as f:
-        for rec in records:
-            f.write(json.dumps(rec) + "\n")
+    write_jsonl(records, path)
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def generate_eval_for_entry(entry, cache=None, match_mode="exact"):
+    # Retrieve top-k context chunks
+    context_chunks = cached_retrieve(cache, entry.get("question"), TOP_K, entry.get("topic", None), retrieve_context)
+    return build_eval_result(entry, context_chunks, match_mode)
+
+def build_eval_result(entry, context_chunks, match_mode="exact"):
+    """Retrieval metrics for one ground-truth entry given the chunks retrieved for its question."""
+    record = build_eval_record(entry, context_chunks, match_mode)
+    add_retrieval_metrics([record], TOP_K, match_mode)
+    return record
 
-def generate_eval_for_entry(entry):
+def build_eval_record(entry, context_chunks, match_mode="exact"):
+    """
+    Eval record for one entry; the metric fields are filled in by add_retrieval_metrics.
+    match_mode is kept so later scoring (e.g. metric curves) matches chunks the same way.
+    """
     query = entry.get("question")
     expected_answer = entry.get("answer")
     topic = entry.get("topic", None)
     level = entry.get("level", None)
-    # Always a list, even if only one chunk
-    ground_truth_chunks = [entry["chunk_id"]] if "chunk_id" in entry else []
-    ground_truth_texts = [entry["text"]] if "text" in entry else []
+    # Always lists, aligned position by position; grades None means binary relevance
+    ground_truth_chunks, ground_truth_texts, ground_truth_grades = ground_truth_fields(entry)
 
-    # Retrieve top-k context chunks
-    context_chunks = retrieve_context(query, top_k=TOP_K, topic=topic)
     retrieved_chunks = [chunk.get("chunk_id") for chunk in context_chunks]
     retrieved_context = [chunk.get("text") for chunk in context_chunks]
 
     logger.debug(f"GT text: {ground_truth_texts}")
     logger.debug(f"Retrieved texts: {retrieved_context}")
-    logger.debug(f"Overlap: {set(map(str.strip, ground_truth_texts)) & set(map(str.strip, retrieved_context))}")
-
-    # Compute retrieval metrics using chunk TEXTS
-    p_at_k = precision_at_k(retrieved_context, ground_truth_texts, TOP_K)
-    r_at_k = recall_at_k(retrieved_context, ground_truth_texts, TOP_K)
-    rr = reciprocal_rank(retrieved_context, ground_truth_texts)
-    ndcg = ndcg_at_k(retrieved_context, ground_truth_texts, TOP_K)
 
     return {
         "query": query,
@@ -57,10 +64,13 @@ def generate_eval_for_entry(entry):
         "retrieved_context": retrieved_context,       # list of texts
         "ground_truth_chunks": ground_truth_chunks,   # always a list
         "ground_truth_texts": ground_truth_texts,     # list of texts
-        "precision_at_k": p_at_k,
-        "recall_at_k": r_at_k,
-        "reciprocal_rank": rr,
-        "ndcg_at_k": ndcg,
+        "ground_truth_grades": ground_truth_grades,   # relevance grade per ground-truth chunk
+        "precision_at_k": None,
+        "recall_at_k": None,
+        "reciprocal_rank": None,
+        "ndcg_at_k": None,
+        "hit_rate_at_k": None,
+        "match_mode": match_mode,
         "topic": topic,
         "level": level,
         "metadata": {
@@ -69,20 +79,84 @@ def generate_eval_for_entry(entry):
         },
     }
 
+def evaluate_batched(entries, writer, batch_size=EVAL_BATCH_SIZE, workers=EVAL_WORKERS, cache=None, match_mode="exact"):
+    """
+    Evaluate entries a window at a time: one encoder pass over the window's
+    questions, then batched Qdrant searches with `workers` in flight. Questions
+    found in the retrieval cache skip both. Metrics are computed for the whole
+    window at once and results written as each window finishes. Returns seconds
+    spent per stage.
+    """
+    timings = {"encode": 0.0, "search": 0.0, "metrics": 0.0}
+    progress = tqdm(desc="Evaluating retrieval", unit="q")
+    for window in batched(entries, batch_size * max(workers, 1)):
+        start = time.perf_counter()
+        requests = [(entry.get("question"), TOP_K, entry.get("topic", None)) for entry in window]
+        contexts = cache.get_many(requests) if cache is not None else {}
+        missing = list(dict.fromkeys(request for request in requests if request not in contexts))
+        vectors = encode_queries([query for query, _, _ in missing], batch_size) if missing else []
+        encoded = time.perf_counter()
+        if missing:
+            found = search_batch(vectors, top_k=TOP_K, batch_size=batch_size, workers=workers)
+            contexts.update(zip(missing, found))
+            if cache is not None:
+                cache.put_many(list(zip(missing, found)))
+        searched = time.perf_counter()
+        records = [build_eval_record(entry, contexts[request], match_mode) for entry, request in zip(window, requests)]
+        add_retrieval_metrics(records, TOP_K, match_mode)
+        for record in records:
+            writer.write(record)
+        timings["encode"] += encoded - start
+        timings["search"] += searched - encoded
+        timings["metrics"] += time.perf_counter() - searched
+        progress.update(len(window))
+    progress.close()
+    return timings
+
+def evaluate_sequential(entries, writer, cache=None, match_mode="exact"):
+    timings = {"retrieve_and_metrics": 0.0}
+    for entry in tqdm(entries, desc="Evaluating retrieval"):
+        start = time.perf_counter()
+        writer.write(generate_eval_for_entry(entry, cache, match_mode))
+        timings["retrieve_and_metrics"] += time.perf_counter() - start
+    return timings
+
 def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval against the ground truth dataset.")
+    parser.add_argument("--workers", type=int, default=EVAL_WORKERS, help="Concurrent Qdrant batch searches.")
+    parser.add_argument("--batch-size", type=int, default=EVAL_BATCH_SIZE, help="Questions per encoder batch and per batch search.")
+    parser.add_argument("--sequential", action="store_true", help="One retrieve_context call per question (the original mode).")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the retrieval cache and search every question.")
+    parser.add_argument(
+        "--match",
+        choices=["exact", "substring"],
+        default="exact",
+        help="Relevance by chunk id / normalized-text hash (exact) or by substring overlap of the texts.",
+    )
+    args = parser.parse_args()
+
     project_root = os.path.dirname(os.path.dirname(__file__))
     ground_truth_path = os.path.join(project_root, GROUND_TRUTH_FILE)
     eval_results_path = os.path.join(project_root, EVAL_RESULTS_FILE)
 
-    ground_truth = load_jsonl(ground_truth_path)
-    eval_results = []
-
-    for entry in tqdm(ground_truth, desc="Evaluating retrieval"):
-        eval_result = generate_eval_for_entry(entry)
-        eval_results.append(eval_result)
+    # Stream entries in and results out, so a crash keeps everything evaluated so far
+    start = time.perf_counter()
+    cache = open_retrieval_cache(enabled=not args.no_cache)
+    with JsonlWriter(eval_results_path) as writer:
+        entries = iter_jsonl(ground_truth_path)
+        if args.sequential:
+            timings = evaluate_sequential(entries, writer, cache, args.match)
+        else:
+            timings = evaluate_batched(entries, writer, args.batch_size, args.workers, cache, args.match)
+    elapsed = time.perf_counter() - start
+    if cache is not None:
+        logger.info(f"Retrieval cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
 
-    save_jsonl(eval_results, eval_results_path)
-    print(f"Saved retrieval evaluation results to {eval_results_path}")
+    stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    rate = writer.count / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Evaluated {writer.count} questions in {elapsed:.2f}s ({rate:.1f} questions/s; {stages})")
+    print(f"Saved {writer.count} retrieval evaluation results to {eval_results_path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,151 +1,407 @@
+import os
 import json
 import uuid
+import hashlib
 import datetime
 import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from tqdm import tqdm
 
 from sciencesage.config import (
     RAW_DATA_DIR,
+    RAW_CHANGESET_FILE,
+    RAW_SHARD_DIR,
     CHUNKS_FILE,
+    CHUNK_STORE_FILE,
     CHUNK_FIELDS,
-    EXCLUDED_CATEGORY_PREFIXES,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    EMBEDDING_MODEL,
+    PREPROCESS_MANIFEST_FILE,
+    CHUNKS_CHANGESET_FILE,
+    NEAR_DUPLICATES_FILE,
+    NEAR_DUP_THRESHOLD,
+    NEAR_DUP_NUM_PERM,
+    NEAR_DUP_SHINGLE_SIZE,
+    PREPROCESS_WORKERS,
     logger,
 )
+from sciencesage.raw_store import iter_raw_articles
+from sciencesage.dedup import NearDuplicateIndex
+from sciencesage.chunk_store import ChunkStoreWriter
+from sciencesage.categories import EXCLUDED_PREFIXES, filter_categories, infer_topic
+from sciencesage.chunking import chunk_spans_by_paragraphs, chunk_text_by_tokens
 
 logger.info("Started preprocess.py script.")
 
+# Bump when chunking or chunk metadata logic changes, so every article is re-chunked
+CHUNKER_VERSION = 3
+
 def chunk_text_by_paragraphs(text, min_length=100, max_length=1200):
     """
     Split text into paragraphs, merge short ones, and split long ones.
     - min_length: minimum number of characters for a chunk
     - max_length: maximum number of characters for a chunk
+    Chunks are slices of the source; see chunk_spans_by_paragraphs for their offsets.
     """
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    if len(paragraphs) <= 1:
-        paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
-
-    # Merge short paragraphs with the next one
-    merged = []
-    buffer = ""
-    for para in paragraphs:
-        if len(buffer) == 0:
-            buffer = para
-        else:
-            if len(buffer) < min_length:
-                buffer += " " + para
-            else:
-                merged.append(buffer)
-                buffer = para
-    if buffer:
-        merged.append(buffer)
-
-    # Split long paragraphs
-    final_chunks = []
-    for para in merged:
-        if len(para) > max_length:
-            # Split by sentences if possible
-            sentences = para.split('. ')
-            chunk = ""
-            for sentence in sentences:
-                if len(chunk) + len(sentence) < max_length:
-                    chunk += sentence + '. '
-                else:
-                    final_chunks.append(chunk.strip())
-                    chunk = sentence + '. '
-            if chunk.strip():
-                final_chunks.append(chunk.strip())
-        else:
-            final_chunks.append(para)
-    # Remove empty chunks
-    return [c for c in final_chunks if c.strip()]
-
-def filter_categories(categories):
-    return [
-        c for c in categories
-        if not any(c.startswith(prefix) for prefix in EXCLUDED_CATEGORY_PREFIXES)
-    ]
-
-def infer_topic(meta):
-    """
-    Infer topic from article title and categories.
-    """
-    title = meta.get("title", "").lower()
-    categories = [c.lower() for c in meta.get("categories", [])]
-
-    # Example mappings
-    if "mars" in title or any("mars" in c for c in categories):
-        return "mars"
-    if "moon" in title or any("moon" in c for c in categories):
-        return "moon"
-    if "space exploration" in title or any("space exploration" in c for c in categories):
-        return "space exploration"
-    if "animals in space" in title or any("animals in space" in c for c in categories):
-        return "animals in space"
-    if any("planet" in c for c in categories):
-        return "planets"
-    # Add more mappings as needed
+    return [text[start:end] for start, end in chunk_spans_by_paragraphs(text, min_length, max_length)]
 
-    return "other"
-
-def make_standard_chunk(text, meta, chunk_index, char_start, char_end):
-    chunk_uuid = str(uuid.uuid5(uuid.NAMESPACE_DNS, meta.get("title", "") + text))
-    filtered_categories = filter_categories(meta.get("categories", []))
-    chunk = {
-        "chunk_id": chunk_uuid,
-        "text": text,
+def article_fields(meta):
+    """Chunk fields shared by every chunk of an article, computed once per article."""
+    return {
         "title": meta.get("title"),
         "source_url": meta.get("fullurl"),
-        "categories": filtered_categories,
+        "categories": filter_categories(meta.get("categories", [])),
         "topic": infer_topic(meta),
         "images": meta.get("images", []),
         "summary": meta.get("summary"),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+def make_standard_chunk(text, meta, chunk_index, char_start, char_end, article=None):
+    """Build one chunk; pass `article` (from article_fields) to reuse the per-article fields."""
+    article = article or article_fields(meta)
+    chunk = {
+        "chunk_id": str(uuid.uuid5(uuid.NAMESPACE_DNS, (article["title"] or "") + text)),
+        "text": text,
+        **article,
         "chunk_index": chunk_index,
         "char_start": char_start,
         "char_end": char_end,
-        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
     }
-    return {k: chunk.get(k) for k in CHUNK_FIELDS if k in chunk}
+    return {k: chunk[k] for k in CHUNK_FIELDS if k in chunk}
+
+def load_changed_files(changeset_path=RAW_CHANGESET_FILE):
+    """Text file names listed in the downloader's changeset."""
+    with open(changeset_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("files", [])
+
+def iter_unchanged_lines(chunks_path, stale_titles):
+    """
+    Stream (line, chunk) for existing chunks whose article is not in `stale_titles`.
+    The raw line is kept so unchanged chunks are rewritten byte-for-byte.
+    """
+    if not Path(chunks_path).exists():
+        return
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                chunk = json.loads(line)
+                if chunk.get("title") not in stale_titles:
+                    yield line if line.endswith("\n") else line + "\n", chunk
+
+def load_unchanged_chunks(chunks_path, changed_titles):
+    return [chunk for _, chunk in iter_unchanged_lines(chunks_path, changed_titles)]
+
+def chunker_params(near_dup_threshold=NEAR_DUP_THRESHOLD):
+    return {
+        "version": CHUNKER_VERSION,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "tokenizer": EMBEDDING_MODEL if CHUNK_SIZE else None,
+        "near_dup": [near_dup_threshold, NEAR_DUP_NUM_PERM, NEAR_DUP_SHINGLE_SIZE],
+        "fields": CHUNK_FIELDS,
+        "excluded_category_prefixes": EXCLUDED_PREFIXES,
+    }
+
+def article_fingerprint(text, meta, params):
+    """Hash of the raw article (text + metadata) and the chunker parameters."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    digest.update(json.dumps(meta, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+def load_manifest(path=PREPROCESS_MANIFEST_FILE):
+    if not Path(path).exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_json_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def plan_changes(articles, old_manifest, params, full=False, assume_unchanged=None):
+    """
+    Compare every article's fingerprint with the previous run.
+
+    Returns (manifest, changed names, stale titles): the new manifest
+    {name: {"fingerprint", "title"}}, the names to re-chunk, and the titles whose
+    old chunks must go (changed or removed articles). With `assume_unchanged`
+    (a predicate on names) matching articles are not read and keep their entry.
+    """
+    manifest = {}
+    changed = set()
+    for name, text, meta in articles:
+        if meta is None:
+            logger.warning(f"Missing meta.json for {name}")
+            continue
+        entry = {"fingerprint": article_fingerprint(text, meta, params), "title": meta.get("title")}
+        manifest[name] = entry
+        previous = old_manifest.get(name)
+        if full or previous is None or previous != entry:
+            changed.add(name)
+    if assume_unchanged is not None:
+        for name, entry in old_manifest.items():
+            if name not in manifest and assume_unchanged(name):
+                manifest[name] = entry
+    stale_titles = {entry["title"] for name, entry in old_manifest.items() if name not in manifest or name in changed}
+    stale_titles |= {manifest[name]["title"] for name in changed}
+    return manifest, changed, stale_titles
+
+def chunk_article(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, tokenizer=None):
+    """
+    (chunk text, char_start, char_end) for an article: token windows when
+    chunk_size is set, paragraph chunks otherwise.
+    """
+    if chunk_size:
+        return chunk_text_by_tokens(text, chunk_size, chunk_overlap, tokenizer)
+    return [(text[start:end], start, end) for start, end in chunk_spans_by_paragraphs(text)]
+
+def process_article(article):
+    """Chunk one (name, text, meta) article. Runs in a worker process."""
+    name, text, meta = article
+    if meta is None:
+        return name, None, None
+    article = article_fields(meta)
+    chunks = [
+        make_standard_chunk(piece, meta, i, char_start, char_end, article)
+        for i, (piece, char_start, char_end) in enumerate(chunk_article(text))
+    ]
+    return name, meta.get("title"), chunks
+
+def imap_ordered(executor, fn, items, window):
+    """
+    Like executor.map, but keeps at most `window` tasks in flight, so only
+    that many articles are held in memory, and yields results in input order.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def text_digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def duplicate_entry(chunk, duplicate_of, titles, similarity, kind):
+    """Report entry for a dropped chunk; duplicate_of_title lets a later run resurrect it."""
+    return {
+        "chunk_id": chunk.get("chunk_id"),
+        "title": chunk.get("title"),
+        "duplicate_of": duplicate_of,
+        "duplicate_of_title": titles.get(duplicate_of) if titles is not None else None,
+        "match": kind,
+        "similarity": round(similarity, 3),
+        "text": chunk["text"][:200],
+    }
+
+def write_unique_chunks(chunks, f, seen_digests, near_duplicates=None, report=None, store=None, titles=None):
+    """
+    Append chunks whose text has not been written yet; returns the number written.
+    `seen_digests` maps the text digest of every written chunk to its chunk id,
+    and `titles` (optional) maps written chunk ids to their article title.
+    With a NearDuplicateIndex, chunks that near-duplicate an earlier chunk are
+    skipped too. Every dropped chunk, exact or near duplicate, is described in
+    `report` (a list). Written chunks also go to `store` (a ChunkStoreWriter)
+    when given.
+    """
+    written = 0
+    for chunk in chunks:
+        digest = text_digest(chunk["text"])
+        if digest in seen_digests:
+            if report is not None:
+                report.append(duplicate_entry(chunk, seen_digests[digest], titles, 1.0, "exact"))
+            continue
+        if near_duplicates is not None:
+            match = near_duplicates.add(chunk["chunk_id"], chunk["text"])
+            if match is not None:
+                if report is not None:
+                    report.append(duplicate_entry(chunk, match[0], titles, match[1], "near"))
+                continue
+        seen_digests[digest] = chunk.get("chunk_id")
+        if titles is not None:
+            titles[chunk.get("chunk_id")] = chunk.get("title")
+        f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        if store is not None:
+            store.write(chunk)
+        written += 1
+    return written
+
+def load_duplicate_report(path=NEAR_DUPLICATES_FILE):
+    """Entries of the previous run's duplicate report, [] when there is none."""
+    if not Path(path).exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def resurrected_titles(report, stale_titles):
+    """
+    Titles of unchanged articles to re-chunk: one of their chunks was dropped
+    as a duplicate of a chunk whose article is stale, so that chunk is about to
+    be deleted and the dropped one would otherwise be lost. Followed to a
+    fixpoint, since a resurrected article's chunks are deleted too.
+    """
+    stale = set(stale_titles)
+    while True:
+        more = {
+            entry["title"] for entry in report
+            if entry.get("duplicate_of_title") in stale and entry.get("title") not in stale
+        }
+        if not more:
+            return stale - set(stale_titles)
+        stale |= more
+
+def load_changeset(path=CHUNKS_CHANGESET_FILE):
+    if not Path(path).exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def mark_consumed(path):
+    """Stamp a changeset as applied, so the next producer run starts a new one instead of merging into it."""
+    with open(path, "r", encoding="utf-8") as f:
+        changeset = json.load(f)
+    changeset["consumed_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    save_json_atomic(path, changeset)
+
+def merge_changeset(pending, changeset):
+    """
+    Fold this run's changeset into one embed.py has not consumed yet, so no
+    changed or removed article is lost when preprocessing runs twice in a row.
+    """
+    if pending is None or pending.get("consumed_at"):
+        return changeset
+    merged = dict(changeset)
+    merged["full"] = bool(pending.get("full")) or changeset["full"]
+    for key in ("changed_titles", "removed_titles"):
+        merged[key] = sorted(set(pending.get(key, [])) | set(changeset[key]))
+    for key in ("new_chunks", "exact_duplicates", "near_duplicates"):
+        merged[key] = pending.get(key, 0) + changeset[key]
+    return merged
 
 def main():
+    parser = argparse.ArgumentParser(description="Chunk raw Wikipedia articles into JSONL.")
+    parser.add_argument("--full", action="store_true", help="Re-chunk every article instead of only new/changed ones.")
+    parser.add_argument("--changed-only", action="store_true", help="Only look at articles listed in the download changeset.")
+    parser.add_argument("--workers", type=int, default=PREPROCESS_WORKERS, help="Worker processes for chunking.")
+    parser.add_argument("--near-dup-threshold", type=float, default=NEAR_DUP_THRESHOLD, help="Jaccard threshold for dropping near-duplicate chunks (0 disables).")
+    args = parser.parse_args()
+
     start_time = time.time()
-    raw_dir = Path(RAW_DATA_DIR)
-    txt_files = list(raw_dir.glob("*.txt"))
-    all_chunks = []
-    for txt_path in tqdm(txt_files, desc="Preprocessing articles"):
-        meta_path = txt_path.with_suffix(".meta.json")
-        if not meta_path.exists():
-            logger.warning(f"Missing meta.json for {txt_path.name}")
-            continue
-        with open(txt_path, "r", encoding="utf-8") as f:
-            text = f.read()
-        with open(meta_path, "r", encoding="utf-8") as f:
-            meta = json.load(f)
-        paragraphs = chunk_text_by_paragraphs(text)
-        char_offset = 0
-        for i, para in enumerate(paragraphs):
-            char_start = char_offset
-            char_end = char_offset + len(para)
-            char_offset = char_end
-            chunk_dict = make_standard_chunk(para, meta, i, char_start, char_end)
-            all_chunks.append(chunk_dict)
-        logger.info(f"Processed {len(paragraphs)} paragraph chunks from {txt_path.name}")
-
-    # After all_chunks is populated
-    seen_texts = set()
-    deduped_chunks = []
-    for chunk in all_chunks:
-        if chunk["text"] not in seen_texts:
-            deduped_chunks.append(chunk)
-            seen_texts.add(chunk["text"])
-    # Save deduped_chunks instead of all_chunks
-    with open(CHUNKS_FILE, "w", encoding="utf-8") as f:
-        for entry in deduped_chunks:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-    logger.success(f"Saved {len(deduped_chunks)} unique paragraph chunks to {CHUNKS_FILE}")
+    # --near-dup-threshold changes which chunks survive, so it is part of every fingerprint
+    params = chunker_params(args.near_dup_threshold)
+    full = args.full or not Path(CHUNKS_FILE).exists()
+    old_manifest = {} if full else load_manifest(PREPROCESS_MANIFEST_FILE)
+    downloaded = set(load_changed_files(RAW_CHANGESET_FILE)) if args.changed_only else None
+
+    def articles():
+        for article in iter_raw_articles(RAW_DATA_DIR, RAW_SHARD_DIR):
+            if downloaded is None or article[0] in downloaded:
+                yield article
+
+    assume_unchanged = (lambda name: name not in downloaded) if downloaded is not None else None
+    manifest, changed, stale_titles = plan_changes(articles(), old_manifest, params, full, assume_unchanged)
+    removed_titles = sorted(
+        entry["title"] for name, entry in old_manifest.items() if name not in manifest
+    )
+    # Chunks dropped as duplicates of stale chunks get another chance: re-chunk their articles too
+    previous_report = [] if full else load_duplicate_report(NEAR_DUPLICATES_FILE)
+    resurrected = resurrected_titles(previous_report, stale_titles)
+    if resurrected:
+        names = {name for name, entry in manifest.items() if entry["title"] in resurrected}
+        changed |= names
+        stale_titles |= resurrected
+        if downloaded is not None:
+            downloaded |= names
+        logger.info(f"Re-chunking {len(names)} unchanged articles whose duplicates were dropped in favor of stale chunks")
+    logger.info(f"{len(changed)}/{len(manifest)} articles new or changed, {len(removed_titles)} removed")
+
+    seen_digests = {}
+    titles = {}
+    near_duplicates = None
+    if args.near_dup_threshold > 0:
+        near_duplicates = NearDuplicateIndex(args.near_dup_threshold, NEAR_DUP_NUM_PERM, NEAR_DUP_SHINGLE_SIZE)
+    report = []
+    kept = written = dropped = near_dropped = 0
+    # Write next to CHUNKS_FILE and swap at the end: unchanged chunks are copied from the old file
+    tmp_path = CHUNKS_FILE + ".tmp"
+    report_tmp_path = NEAR_DUPLICATES_FILE + ".tmp"
+    os.makedirs(os.path.dirname(CHUNKS_FILE), exist_ok=True)
+    os.makedirs(os.path.dirname(NEAR_DUPLICATES_FILE), exist_ok=True)
+    # The store goes to a temp file too; on an error it is discarded and the old store is kept
+    with ChunkStoreWriter(CHUNK_STORE_FILE) as store:
+        with open(tmp_path, "w", encoding="utf-8") as out, open(report_tmp_path, "w", encoding="utf-8") as report_file:
+            if not full:
+                for line, chunk in iter_unchanged_lines(CHUNKS_FILE, stale_titles):
+                    seen_digests[text_digest(chunk["text"])] = chunk["chunk_id"]
+                    titles[chunk["chunk_id"]] = chunk.get("title")
+                    if near_duplicates is not None:
+                        # Already survived deduplication; index it without checking
+                        near_duplicates.insert(chunk["chunk_id"], near_duplicates.signature(chunk["text"]))
+                    out.write(line)
+                    store.write(chunk)
+                    kept += 1
+                # The report is regenerated: drops from articles that are not re-chunked still hold
+                for entry in previous_report:
+                    if entry.get("title") not in stale_titles:
+                        report_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            to_chunk = (article for article in articles() if article[0] in changed)
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                results = imap_ordered(executor, process_article, to_chunk, window=args.workers * 4)
+                for name, title, chunks in tqdm(results, total=len(changed), desc="Preprocessing articles"):
+                    written += write_unique_chunks(chunks, out, seen_digests, near_duplicates, report, store, titles)
+                    for entry in report:
+                        if entry["match"] == "near":
+                            near_dropped += 1
+                        else:
+                            dropped += 1
+                        report_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    report.clear()
+                    logger.info(f"Processed {len(chunks)} paragraph chunks from {name}")
+        # Swapped before the store is closed, so the store is never older than the file it mirrors
+        os.replace(tmp_path, CHUNKS_FILE)
+        os.replace(report_tmp_path, NEAR_DUPLICATES_FILE)
+
+    changeset = merge_changeset(load_changeset(CHUNKS_CHANGESET_FILE), {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "full": full,
+        "changed_titles": sorted({manifest[name]["title"] for name in changed}),
+        "removed_titles": removed_titles,
+        "new_chunks": written,
+        "kept_chunks": kept,
+        "exact_duplicates": dropped,
+        "near_duplicates": near_dropped,
+    })
+    save_json_atomic(CHUNKS_CHANGESET_FILE, changeset)
+    save_json_atomic(PREPROCESS_MANIFEST_FILE, manifest)
+    # Every downloaded article has now been compared with its fingerprint
+    if Path(RAW_CHANGESET_FILE).exists():
+        mark_consumed(RAW_CHANGESET_FILE)
+
     elapsed = time.time() - start_time
-    logger.success(f"Saved {len(deduped_chunks)} paragraph chunks to {CHUNKS_FILE}")
+    logger.success(
+        f"Saved {kept + written} unique paragraph chunks to {CHUNKS_FILE} "
+        f"({kept} unchanged, {written} new, {dropped} exact and {near_dropped} near duplicates dropped)"
+    )
+    candidates = written + dropped + near_dropped
+    if candidates:
+        logger.info(
+            f"Deduplication shrank this run's chunks by {100 * (dropped + near_dropped) / candidates:.1f}% "
+            f"({100 * near_dropped / candidates:.1f}% from near duplicates, see {NEAR_DUPLICATES_FILE})"
+        )
+    logger.info(f"Parquet chunk store: {CHUNK_STORE_FILE}")
+    logger.info(f"Changeset for embed.py --changeset: {CHUNKS_CHANGESET_FILE} ({len(changeset['changed_titles'])} changed articles pending)")
     logger.info(f"Total elapsed time: {elapsed:.2f} seconds")
 
 if __name__ == "__main__":
@@ -1,68 +1,92 @@
 import os
 import sys
 import json
+import time
+import asyncio
+import hashlib
+import argparse
 
+from openai import RateLimitError
 from tqdm import tqdm
 
 from sciencesage.config import (
     GROUND_TRUTH_FILE,
     LLM_EVAL_FILE,
     TOP_K,
+    LLM_EVAL_CONCURRENCY,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_RATE_LIMIT_RETRIES,
     logger,
 )
-from sciencesage.retrieval_system import retrieve_context, generate_answer
-from sciencesage.metrics import (
-    precision_at_k,
-    recall_at_k,
-    reciprocal_rank,
-    ndcg_at_k,
+from sciencesage.clients import make_async_openai_client
+from sciencesage.jsonl import iter_jsonl, write_jsonl, JsonlWriter
+from sciencesage.rate_limit import MinuteRateLimiter, call_with_retries
+from sciencesage.retrieval_cache import cached_retrieve
+from sciencesage.retrieval_system import (
+    retrieve_context,
+    generate_answer,
+    generate_answer_async,
+    build_answer_messages,
+    open_retrieval_cache,
 )
+from sciencesage.metrics import add_retrieval_metrics, ground_truth_fields
+
+# Completion tokens reserved per request when rate limiting (answers are a few paragraphs)
+ANSWER_TOKEN_ESTIMATE = 400
 
 def load_jsonl(path):
-    with open(path, "r") as f:
-        return [json.loads(line) for line in f if line.strip()]
+    return list(iter_jsonl(path))
 
 def save_jsonl(records, path):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w") as f:
-        for rec in records:
-            f.write(json.dumps(rec) + "\n")
+    write_jsonl(records, path)
 
 def simple_exact_match(pred, gold):
     if not pred or not gold:
         return 0.0
     return float(pred.strip().lower() == gold.strip().lower())
 
-def generate_llm_eval_for_entry(entry):
-    query = entry.get("question")
-    expected_answer = entry.get("answer")
-    topic = entry.get("topic", None)
-    level = entry.get("level", "College")
-    ground_truth_chunks = [entry["chunk_id"]] if "chunk_id" in entry else []
-    ground_truth_texts = [entry["text"]] if "text" in entry else []
+def entry_id(entry):
+    """Stable id of a ground-truth entry, used to skip already evaluated entries on resume."""
+    if entry.get("id"):
+        return str(entry["id"])
+    key = json.dumps([entry.get("chunk_id"), entry.get("level"), entry.get("question")], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
 
+def validate_query(entry):
+    query = entry.get("question")
     # Ensure query is not None or empty
     if not query or not isinstance(query, str):
         raise ValueError(f"Invalid query in entry: {entry}")
+    return query
+
+def generate_llm_eval_for_entry(entry, cache=None):
+    query = validate_query(entry)
+    topic = entry.get("topic", None)
+    level = entry.get("level", "College")
 
     # Retrieve top-k context chunks
-    context_chunks = retrieve_context(query, top_k=TOP_K, topic=topic)
-    retrieved_chunks = [chunk.get("chunk_id") for chunk in context_chunks]
-    retrieved_context = [chunk.get("text") for chunk in context_chunks]
+    context_chunks = cached_retrieve(cache, query, TOP_K, topic, retrieve_context)
 
     # Generate answer using the LLM
     llm_answer = generate_answer(query, context_chunks, level, topic)
+    return build_llm_eval_result(entry, context_chunks, llm_answer)
+
+def build_llm_eval_result(entry, context_chunks, llm_answer):
+    query = entry.get("question")
+    expected_answer = entry.get("answer")
+    topic = entry.get("topic", None)
+    level = entry.get("level", "College")
+    # Aligned position by position; grades None means binary relevance
+    ground_truth_chunks, ground_truth_texts, ground_truth_grades = ground_truth_fields(entry)
+    retrieved_chunks = [chunk.get("chunk_id") for chunk in context_chunks]
+    retrieved_context = [chunk.get("text") for chunk in context_chunks]
 
     # Simple exact match metric (replace with F1, ROUGE, etc. as needed)
     exact_match = simple_exact_match(llm_answer, expected_answer)
 
-    # Retrieval metrics using chunk TEXTS
-    p_at_k = precision_at_k(retrieved_context, ground_truth_texts, TOP_K)
-    r_at_k = recall_at_k(retrieved_context, ground_truth_texts, TOP_K)
-    rr = reciprocal_rank(retrieved_context, ground_truth_texts)
-    ndcg = ndcg_at_k(retrieved_context, ground_truth_texts, TOP_K)
-
-    return {
+    record = {
+        "entry_id": entry_id(entry),
         "query": query,
         "expected_answer": expected_answer,
         "retrieved_answer": llm_answer,
@@ -71,28 +95,123 @@ def generate_llm_eval_for_entry(entry):
         "retrieved_context": retrieved_context,
         "ground_truth_chunks": ground_truth_chunks,
         "ground_truth_texts": ground_truth_texts,
-        "precision_at_k": p_at_k,
-        "recall_at_k": r_at_k,
-        "reciprocal_rank": rr,
-        "ndcg_at_k": ndcg,
+        "ground_truth_grades": ground_truth_grades,
+        "precision_at_k": None,
+        "recall_at_k": None,
+        "reciprocal_rank": None,
+        "ndcg_at_k": None,
+        "hit_rate_at_k": None,
+        "match_mode": "exact",
         "topic": topic,
         "level": level,
         "metadata": entry.get("metadata"),
     }
+    # Retrieval metrics by chunk id / text hash
+    add_retrieval_metrics([record], TOP_K)
+    return record
+
+def estimate_tokens(messages):
+    """Rough prompt + completion token count (about 4 characters per token) for the TPM limiter."""
+    return sum(len(m["content"]) for m in messages) // 4 + ANSWER_TOKEN_ESTIMATE
+
+async def answer_with_retries(entry, context_chunks, async_client, limiter, max_retries=LLM_RATE_LIMIT_RETRIES):
+    """Rate-limited generate_answer_async; on RateLimitError waits (Retry-After or backoff) and retries."""
+    query, topic, level = entry.get("question"), entry.get("topic", None), entry.get("level", "College")
+    messages = build_answer_messages(query, context_chunks, level, topic)
+    return await call_with_retries(
+        lambda: generate_answer_async(query, context_chunks, level, topic, async_client, messages=messages),
+        limiter,
+        estimate_tokens(messages),
+        retry_on=(RateLimitError,),
+        max_retries=max_retries,
+    )
+
+async def evaluate_entry_async(entry, async_client, limiter, cache=None):
+    query = validate_query(entry)
+    # Retrieval is blocking (encoder + Qdrant client + cache), so it runs in a worker thread
+    context_chunks = await asyncio.to_thread(cached_retrieve, cache, query, TOP_K, entry.get("topic", None), retrieve_context)
+    llm_answer = await answer_with_retries(entry, context_chunks, async_client, limiter)
+    return build_llm_eval_result(entry, context_chunks, llm_answer)
+
+def completed_entry_ids(path):
+    """Entry ids already written to a previous (possibly interrupted) run's output."""
+    if not os.path.exists(path):
+        return set()
+    return {record["entry_id"] for record in iter_jsonl(path) if record.get("entry_id")}
+
+async def run_llm_eval(entries, writer, async_client, limiter, concurrency=LLM_EVAL_CONCURRENCY, done_ids=frozenset(), cache=None):
+    """
+    Evaluate entries with up to `concurrency` in flight, appending each result
+    as it completes (so results are in completion order). Entries whose id is
+    in `done_ids` are skipped. Returns (evaluated, skipped, failed) counts.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    counts = {"evaluated": 0, "skipped": 0, "failed": 0}
+    progress = tqdm(desc="Evaluating RAG LLM", unit="q")
+
+    async def evaluate(entry):
+        try:
+            writer.write(await evaluate_entry_async(entry, async_client, limiter, cache))
+            counts["evaluated"] += 1
+        except Exception as e:
+            counts["failed"] += 1
+            logger.error(f"LLM evaluation failed for entry {entry_id(entry)}: {e}")
+        finally:
+            progress.update(1)
+            semaphore.release()
+
+    for entry in entries:
+        if entry_id(entry) in done_ids:
+            counts["skipped"] += 1
+            continue
+        # Only `concurrency` entries are read ahead, so memory stays flat for any dataset size
+        await semaphore.acquire()
+        task = asyncio.create_task(evaluate(entry))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    progress.close()
+    return counts["evaluated"], counts["skipped"], counts["failed"]
+
+async def run(ground_truth_path, llm_eval_path, concurrency, requests_per_minute, tokens_per_minute, resume, use_cache=True):
+    done_ids = completed_entry_ids(llm_eval_path) if resume else set()
+    if done_ids:
+        logger.info(f"Resuming: {len(done_ids)} entries already evaluated in {llm_eval_path}")
+    limiter = MinuteRateLimiter(requests_per_minute, tokens_per_minute)
+    cache = open_retrieval_cache(enabled=use_cache)
+    async_client = make_async_openai_client()
+    try:
+        with JsonlWriter(llm_eval_path, append=resume, flush_every=1) as writer:
+            return await run_llm_eval(iter_jsonl(ground_truth_path), writer, async_client, limiter, concurrency, done_ids, cache)
+    finally:
+        await async_client.close()
+        if cache is not None:
+            logger.info(f"Retrieval cache: {cache.hits} hits, {cache.misses} misses")
+            cache.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Evaluate RAG answers for the ground truth dataset.")
+    parser.add_argument("--concurrency", type=int, default=LLM_EVAL_CONCURRENCY, help="Chat completions in flight.")
+    parser.add_argument("--rpm", type=float, default=LLM_REQUESTS_PER_MINUTE, help="Requests per minute limit.")
+    parser.add_argument("--tpm", type=float, default=LLM_TOKENS_PER_MINUTE, help="Tokens per minute limit (0 disables).")
+    parser.add_argument("--resume", action="store_true", help="Append to the existing results, skipping entries already evaluated.")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the retrieval cache and search every question.")
+    args = parser.parse_args()
+
     project_root = os.path.dirname(os.path.dirname(__file__))
     ground_truth_path = os.path.join(project_root, GROUND_TRUTH_FILE)
     llm_eval_path = os.path.join(project_root, LLM_EVAL_FILE)
 
-    ground_truth = load_jsonl(ground_truth_path)
-    llm_eval_results = []
-
-    for entry in tqdm(ground_truth, desc="Evaluating RAG LLM"):
-        eval_result = generate_llm_eval_for_entry(entry)
-        llm_eval_results.append(eval_result)
-
-    save_jsonl(llm_eval_results, llm_eval_path)
+    start = time.perf_counter()
+    evaluated, skipped, failed = asyncio.run(
+        run(ground_truth_path, llm_eval_path, args.concurrency, args.rpm, args.tpm, args.resume, not args.no_cache)
+    )
+    elapsed = time.perf_counter() - start
+    logger.info(f"Evaluated {evaluated} entries in {elapsed:.1f}s ({skipped} already done, {failed} failed)")
+    if failed:
+        logger.warning("Rerun with --resume to retry the failed entries.")
     print(f"Saved RAG LLM evaluation results to {llm_eval_path}")
 
 if __name__ == "__main__":
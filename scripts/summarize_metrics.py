@@ -1,5 +1,4 @@
 import os
-import json
 import csv
 from statistics import mean, stdev
 
@@ -7,26 +6,47 @@ from sciencesage.config import (
     EVAL_RESULTS_FILE,
     LLM_EVAL_FILE,
     METRICS_SUMMARY_FILE,
+    METRIC_CURVES_FILE,
+    BOOTSTRAP_SAMPLES,
+    BOOTSTRAP_CONFIDENCE,
     TOP_K,
     logger,
 )
+from sciencesage.jsonl import iter_jsonl
+from sciencesage.metrics import bootstrap_ci, evaluate_curves
 
 def load_jsonl(path):
-    with open(path, "r") as f:
-        return [json.loads(line) for line in f if line.strip()]
+    return list(iter_jsonl(path))
+
+def summarize_metrics(records, metric_keys, n_resamples=BOOTSTRAP_SAMPLES, confidence=BOOTSTRAP_CONFIDENCE):
+    """
+    Summary stats per metric from one pass over `records`, which may be a lazy
+    iterator, with a bootstrap confidence interval for each mean (skipped when
+    n_resamples is 0).
+    """
+    values = {key: [] for key in metric_keys}
+    count = 0
+    for rec in records:
+        count += 1
+        for key in metric_keys:
+            value = rec.get(key)
+            if value is not None:
+                values[key].append(value)
 
-def summarize_metrics(records, metric_keys):
     summary = {}
     for key in metric_keys:
-        values = [rec.get(key) for rec in records if rec.get(key) is not None]
-        if values:
-            summary[key + "_mean"] = mean(values)
-            summary[key + "_stdev"] = stdev(values) if len(values) > 1 else 0.0
-            summary[key + "_min"] = min(values)
-            summary[key + "_max"] = max(values)
+        if values[key]:
+            summary[key + "_mean"] = mean(values[key])
+            summary[key + "_stdev"] = stdev(values[key]) if len(values[key]) > 1 else 0.0
+            summary[key + "_min"] = min(values[key])
+            summary[key + "_max"] = max(values[key])
+            if n_resamples:
+                summary[key + "_ci_low"], summary[key + "_ci_high"] = bootstrap_ci(values[key], n_resamples, confidence)
         else:
             summary[key + "_mean"] = summary[key + "_stdev"] = summary[key + "_min"] = summary[key + "_max"] = None
-    summary["count"] = len(records)
+            if n_resamples:
+                summary[key + "_ci_low"] = summary[key + "_ci_high"] = None
+    summary["count"] = count
     return summary
 
 def main():
@@ -34,17 +54,19 @@ def main():
     eval_results_path = os.path.join(project_root, EVAL_RESULTS_FILE)
     llm_eval_path = os.path.join(project_root, LLM_EVAL_FILE)
     metrics_summary_path = os.path.join(project_root, METRICS_SUMMARY_FILE)
+    metric_curves_path = os.path.join(project_root, METRIC_CURVES_FILE)
 
     # Load records
-    eval_records = load_jsonl(eval_results_path) if os.path.exists(eval_results_path) else []
-    llm_records = load_jsonl(llm_eval_path) if os.path.exists(llm_eval_path) else []
+    eval_records = iter_jsonl(eval_results_path) if os.path.exists(eval_results_path) else []
+    llm_records = iter_jsonl(llm_eval_path) if os.path.exists(llm_eval_path) else []
 
     # Define metric keys to match JSON files exactly
     retrieval_metric_keys = [
         "precision_at_k",
         "recall_at_k",
         "reciprocal_rank",
-        "ndcg_at_k"
+        "ndcg_at_k",
+        "hit_rate_at_k",
     ]
     llm_metric_keys = ["exact_match"]
 
@@ -64,5 +86,13 @@ def main():
 
     print(f"Metrics summary written to {metrics_summary_path}")
 
+    # Retrieval metrics at every k up to TOP_K, from the chunks already retrieved,
+    # matched the same way (match_mode) as each record's single-k metrics
+    if os.path.exists(eval_results_path):
+        curves = evaluate_curves(iter_jsonl(eval_results_path), TOP_K)
+        os.makedirs(os.path.dirname(metric_curves_path), exist_ok=True)
+        curves.to_csv(metric_curves_path, index=False)
+        logger.info(f"Metric curves for k=1..{TOP_K} written to {metric_curves_path}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
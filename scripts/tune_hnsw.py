@@ -0,0 +1,121 @@
+import os
+import json
+import argparse
+import itertools
+from statistics import mean
+
+import pandas as pd
+from qdrant_client.models import SearchParams, OptimizersConfigDiff
+
+from sciencesage.config import (
+    EMBEDDING_DIM,
+    QDRANT_COLLECTION,
+    HNSW_CONFIG_FILE,
+    HNSW_SWEEP_FILE,
+    TOP_K,
+    logger,
+)
+from sciencesage.metrics import precision_at_k, recall_at_k, ndcg_at_k
+from scripts.embed import model, qdrant, ensure_collection, drop_collection
+from scripts.bench_utils import (
+    load_ground_truth,
+    load_embedding_records,
+    upload_records,
+    wait_for_green,
+    timed_search,
+    latency_summary,
+    overlap_at_k,
+)
+
+def score_results(results, ground_truth_texts, exact_results, k):
+    retrieved_texts = [[hit["text"] for hit in hits] for hits in results]
+    pairs = list(zip(retrieved_texts, ground_truth_texts))
+    return {
+        "precision_at_k": mean(precision_at_k(r, g, k) for r, g in pairs),
+        "recall_at_k": mean(recall_at_k(r, g, k) for r, g in pairs),
+        "ndcg_at_k": mean(ndcg_at_k(r, g, k) for r, g in pairs),
+        "recall_vs_exact": overlap_at_k(results, exact_results, k),
+    }
+
+def choose_config(df: pd.DataFrame, min_recall: float) -> dict:
+    """Pick the lowest p95 latency config whose recall versus exact search reaches min_recall."""
+    candidates = df[df["recall_vs_exact"] >= min_recall]
+    if candidates.empty:
+        logger.warning(f"No config reached recall_vs_exact >= {min_recall}, choosing the most accurate one.")
+        candidates = df[df["recall_vs_exact"] == df["recall_vs_exact"].max()]
+    best = candidates.sort_values(["latency_p95_ms", "m", "ef_construct", "hnsw_ef"]).iloc[0]
+    return {
+        "m": int(best["m"]),
+        "ef_construct": int(best["ef_construct"]),
+        "hnsw_ef": int(best["hnsw_ef"]),
+        "recall_vs_exact": float(best["recall_vs_exact"]),
+        "latency_p95_ms": float(best["latency_p95_ms"]),
+    }
+
+def write_hnsw_config(chosen: dict, path: str = HNSW_CONFIG_FILE):
+    """Write the chosen config where sciencesage.config picks it up for embed.py and retrieve_context."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chosen, f, indent=2)
+    logger.success(f"Wrote HNSW config to {path}: {chosen}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep HNSW m / ef_construct / hnsw_ef and report recall vs. latency.")
+    parser.add_argument("--m", nargs="+", type=int, default=[8, 16, 32], help="HNSW m values (edges per node).")
+    parser.add_argument("--ef-construct", nargs="+", type=int, default=[64, 100, 200], help="HNSW ef_construct values.")
+    parser.add_argument("--hnsw-ef", nargs="+", type=int, default=[16, 32, 64, 128, 256], help="Search-time ef values.")
+    parser.add_argument("--top-k", type=int, default=TOP_K, help="Number of results per query.")
+    parser.add_argument("--repeats", type=int, default=3, help="Times each query is repeated for latency percentiles.")
+    parser.add_argument("--min-recall", type=float, default=0.95, help="Minimum recall versus exact search for the chosen config.")
+    parser.add_argument("--write-config", action="store_true", help=f"Write the chosen config to {HNSW_CONFIG_FILE}.")
+    args = parser.parse_args()
+
+    ground_truth = load_ground_truth()
+    if not ground_truth:
+        logger.error("No ground truth entries found. Run create_ground_truth_dataset.py first.")
+        return
+    records = load_embedding_records()
+    questions = [entry["question"] for entry in ground_truth]
+    ground_truth_texts = [[entry["text"]] if "text" in entry else [] for entry in ground_truth]
+    query_vectors = model.encode(questions, batch_size=64).tolist()
+
+    rows = []
+    exact_results = None
+    for m, ef_construct in itertools.product(args.m, args.ef_construct):
+        collection_name = f"{QDRANT_COLLECTION}_hnsw_m{m}_ef{ef_construct}"
+        drop_collection(collection_name)
+        ensure_collection(EMBEDDING_DIM, collection_name=collection_name, quantization="none", hnsw_m=m, hnsw_ef_construct=ef_construct)
+        # Small corpora stay below Qdrant's indexing threshold and would be brute-forced; force the HNSW build
+        qdrant.update_collection(collection_name=collection_name, optimizers_config=OptimizersConfigDiff(indexing_threshold=1))
+        upload_records(qdrant, collection_name, records)
+        wait_for_green(qdrant, collection_name)
+
+        if exact_results is None:
+            exact_results, _ = timed_search(qdrant, collection_name, query_vectors, args.top_k, search_params=SearchParams(exact=True))
+
+        for hnsw_ef in args.hnsw_ef:
+            results, latencies = timed_search(
+                qdrant, collection_name, query_vectors, args.top_k,
+                search_params=SearchParams(hnsw_ef=hnsw_ef), repeats=args.repeats,
+            )
+            row = {"m": m, "ef_construct": ef_construct, "hnsw_ef": hnsw_ef}
+            row.update(score_results(results, ground_truth_texts, exact_results, args.top_k))
+            row.update(latency_summary(latencies))
+            logger.info(f"HNSW sweep: {row}")
+            rows.append(row)
+        drop_collection(collection_name)
+
+    df = pd.DataFrame(rows)
+    print(df.to_string(index=False))
+    os.makedirs(os.path.dirname(HNSW_SWEEP_FILE), exist_ok=True)
+    df.to_csv(HNSW_SWEEP_FILE, index=False)
+    print(f"Saved HNSW sweep to {HNSW_SWEEP_FILE}")
+
+    chosen = choose_config(df, args.min_recall)
+    print(f"Chosen config: {chosen}")
+    if args.write_config:
+        write_hnsw_config(chosen)
+        print("Re-run embed.py to rebuild the collection with the chosen m / ef_construct.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import pytest
+
+from scripts.bench_utils import latency_summary, overlap_at_k
+
+def test_latency_summary():
+    summary = latency_summary([1.0, 2.0, 3.0, 4.0])
+    assert summary["latency_mean_ms"] == 2.5
+    assert summary["latency_p50_ms"] == 2.5
+    assert summary["latency_p99_ms"] <= 4.0
+    assert summary["qps"] == pytest.approx(400.0)
+
+def test_latency_summary_empty():
+    assert latency_summary([])["qps"] == 0.0
+
+def test_overlap_at_k():
+    reference = [[{"chunk_id": "a"}, {"chunk_id": "b"}], [{"chunk_id": "c"}]]
+    results = [[{"chunk_id": "b"}, {"chunk_id": "x"}], [{"chunk_id": "c"}]]
+    assert overlap_at_k(results, reference, k=2) == pytest.approx(0.75)
+    assert overlap_at_k([[]], [[]], k=2) == 0.0
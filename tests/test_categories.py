@@ -0,0 +1,29 @@
+from sciencesage.categories import EXCLUDED_PREFIXES, filter_categories, infer_topic, is_excluded
+from sciencesage.config import EXCLUDED_CATEGORY_PREFIXES
+
+
+def test_matcher_covers_every_configured_prefix():
+    assert set(EXCLUDED_PREFIXES) == set(EXCLUDED_CATEGORY_PREFIXES)
+    for prefix in EXCLUDED_CATEGORY_PREFIXES:
+        assert is_excluded(prefix + " something")
+
+
+def test_filter_categories_keeps_order_and_topic_categories():
+    cats = [
+        "Category:Moons of Mars",
+        "Category:CS1 maint: archived copy as title",
+        "Category:Articles with short description",
+        "Category:Planets of the Solar System",
+        "Category:Webarchive template wayback links",
+    ]
+    assert filter_categories(cats) == ["Category:Moons of Mars", "Category:Planets of the Solar System"]
+
+
+def test_infer_topic_priority_and_category_boundaries():
+    # Title keywords win in TOPIC_KEYWORDS order; "planet" only matches categories
+    assert infer_topic({"title": "Moon of Mars", "categories": []}) == "mars"
+    assert infer_topic({"title": "Planet Nine", "categories": []}) == "other"
+    assert infer_topic({"title": "Ceres", "categories": ["Dwarf planets"]}) == "planets"
+    # Keywords do not match across two categories
+    assert infer_topic({"title": "X", "categories": ["Animals", "in space"]}) == "other"
+    assert infer_topic({"title": None, "categories": []}) == "other"
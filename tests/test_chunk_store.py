@@ -0,0 +1,89 @@
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from sciencesage.chunk_store import (
+    ChunkStoreWriter,
+    iter_chunks,
+    read_chunks,
+    store_is_current,
+    write_chunk_store,
+)
+from sciencesage.jsonl import write_jsonl
+
+
+def make_chunks():
+    return [
+        {"chunk_id": f"{topic}-{i}", "text": f"{topic} text {i}", "title": f"{topic.title()} {i % 2}",
+         "source_url": f"https://en.wikipedia.org/wiki/{topic}", "categories": ["Category:Space"],
+         "topic": topic, "images": [], "summary": None, "chunk_index": i, "char_start": 0, "char_end": 10,
+         "created_at": "2024-01-01T00:00:00+00:00"}
+        for i in range(5)
+        for topic in ("mars", "moon", "other")
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "chunks.parquet"
+    with ChunkStoreWriter(str(path), row_group_size=2) as writer:
+        for chunk in make_chunks():
+            writer.write(chunk)
+    return str(path)
+
+
+def test_row_groups_hold_one_topic(store):
+    metadata = pq.ParquetFile(store).metadata
+    topic_column = metadata.schema.names.index("topic")
+    assert metadata.num_rows == 15
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(topic_column).statistics
+        assert stats.min == stats.max
+
+
+def test_repeated_strings_are_dictionary_encoded(store):
+    schema = pq.read_schema(store)
+    for column in ("topic", "title", "source_url"):
+        assert pa.types.is_dictionary(schema.field(column).type)
+
+
+def test_read_chunks_projects_and_filters(store):
+    table = read_chunks(store, columns=["chunk_id"], topics=["mars"])
+    assert table.column_names == ["chunk_id"]
+    assert sorted(table.column("chunk_id").to_pylist()) == [f"mars-{i}" for i in range(5)]
+
+
+def test_iter_chunks_reads_store(store, tmp_path):
+    chunks = list(iter_chunks(columns=["text", "topic"], topics=["moon"], path=store, jsonl_path=str(tmp_path / "missing.jsonl")))
+    assert len(chunks) == 5
+    assert all(set(c) == {"text", "topic"} and c["topic"] == "moon" for c in chunks)
+
+
+def test_iter_chunks_falls_back_to_stale_or_missing_store(store, tmp_path):
+    jsonl_path = tmp_path / "chunks.jsonl"
+    write_jsonl([{"chunk_id": "new", "text": "fresh", "topic": "mars"}], jsonl_path)
+    # JSONL newer than the store: the store is stale
+    later = time.time() + 10
+    os.utime(jsonl_path, (later, later))
+    assert not store_is_current(store, str(jsonl_path))
+    assert list(iter_chunks(columns=["chunk_id"], topics=["mars"], path=store, jsonl_path=str(jsonl_path))) == [{"chunk_id": "new"}]
+    assert list(iter_chunks(topics=["moon"], path=str(tmp_path / "none.parquet"), jsonl_path=str(jsonl_path))) == []
+
+
+def test_failed_write_keeps_previous_store(store):
+    before = read_chunks(store).num_rows
+    with pytest.raises(RuntimeError):
+        with ChunkStoreWriter(store) as writer:
+            writer.write(make_chunks()[0])
+            raise RuntimeError("crash")
+    assert read_chunks(store).num_rows == before
+    assert not os.path.exists(store + ".tmp")
+
+
+def test_write_chunk_store_fills_missing_fields(tmp_path):
+    path = str(tmp_path / "chunks.parquet")
+    assert write_chunk_store([{"chunk_id": "a", "text": "t"}], path) == 1
+    assert read_chunks(path).to_pylist()[0]["topic"] is None
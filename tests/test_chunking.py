@@ -0,0 +1,50 @@
+import re
+
+import pytest
+
+from sciencesage.chunking import chunk_spans_by_tokens, chunk_text_by_tokens
+
+
+class Encoding:
+    def __init__(self, offsets):
+        self.offsets = offsets
+
+
+class WhitespaceTokenizer:
+    """Stand-in for a Hugging Face tokenizer: one token per word, with char offsets."""
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text, add_special_tokens=True):
+        self.calls += 1
+        return Encoding([(m.start(), m.end()) for m in re.finditer(r"\S+", text)])
+
+
+TEXT = "one two three\n\nfour five  six seven eight nine"
+
+
+def test_token_windows_respect_size_and_overlap():
+    tokenizer = WhitespaceTokenizer()
+    chunks = chunk_text_by_tokens(TEXT, chunk_size=4, chunk_overlap=1, tokenizer=tokenizer)
+    assert [c[0].split() for c in chunks] == [
+        ["one", "two", "three", "four"],
+        ["four", "five", "six", "seven"],
+        ["seven", "eight", "nine"],
+    ]
+    assert tokenizer.calls == 1
+
+
+def test_token_chunks_are_exact_slices():
+    for text, start, end in chunk_text_by_tokens(TEXT, chunk_size=3, tokenizer=WhitespaceTokenizer()):
+        assert TEXT[start:end] == text
+        assert not text[0].isspace() and not text[-1].isspace()
+
+
+def test_short_and_empty_text():
+    assert chunk_spans_by_tokens("just words", WhitespaceTokenizer(), chunk_size=10) == [(0, 10)]
+    assert chunk_spans_by_tokens("   ", WhitespaceTokenizer(), chunk_size=10) == []
+
+
+def test_invalid_overlap():
+    with pytest.raises(ValueError):
+        chunk_spans_by_tokens(TEXT, WhitespaceTokenizer(), chunk_size=4, chunk_overlap=4)
@@ -0,0 +1,31 @@
+import httpx
+
+from sciencesage import clients
+from sciencesage.config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+)
+
+def test_build_timeout_and_limits():
+    timeout = clients.build_timeout()
+    assert timeout.connect == HTTP_CONNECT_TIMEOUT
+    assert timeout.read == HTTP_READ_TIMEOUT
+    limits = clients.build_limits()
+    assert limits.max_keepalive_connections == HTTP_MAX_KEEPALIVE_CONNECTIONS
+
+def test_use_http2_without_h2(monkeypatch):
+    monkeypatch.setattr(clients, "http2_available", lambda: False)
+    assert clients.use_http2(True) is False
+    assert clients.use_http2(False) is False
+
+def test_make_http_client_is_pooled():
+    client = clients.make_http_client(http2=False)
+    assert isinstance(client, httpx.Client)
+    assert client.timeout.connect == HTTP_CONNECT_TIMEOUT
+    client.close()
+
+def test_make_openai_client_uses_custom_transport():
+    client = clients.make_openai_client(api_key="test")
+    assert client.max_retries == clients.OPENAI_MAX_RETRIES
+    client.close()
@@ -32,10 +32,11 @@ def mock_chunks(tmp_path):
 def patch_config(monkeypatch, tmp_path, mock_chunks):
     # Patch config constants to use temp files and space exploration topic
     monkeypatch.setattr(create_gt, "CHUNKS_FILE", str(mock_chunks[0]))
+    monkeypatch.setattr(create_gt, "CHUNK_STORE_FILE", str(tmp_path / "chunks.parquet"))
     monkeypatch.setattr(create_gt, "GROUND_TRUTH_FILE", str(tmp_path / "ground_truth.jsonl"))
     monkeypatch.setattr(create_gt, "TOPICS", ["Space Exploration"])
     monkeypatch.setattr(create_gt, "LEVELS", ["Middle School", "College", "Advanced"])
-    monkeypatch.setattr(create_gt, "EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    monkeypatch.setattr(create_gt, "LLM_CACHE_FILE", str(tmp_path / "llm_cache.sqlite"))
     monkeypatch.setattr(create_gt, "CHAT_MODEL", "gpt-3.5-turbo")
     monkeypatch.setattr(create_gt, "MAX_TOKENS", 256)
 
@@ -79,9 +80,10 @@ def fake_generate_questions_by_level(chunk):
         }
 
 def test_main_creates_ground_truth(monkeypatch, tmp_path):
-    # Patch out model loading and OpenAI calls
-    monkeypatch.setattr(create_gt, "SentenceTransformer", lambda model: None)
-    monkeypatch.setattr(create_gt, "generate_questions_by_level", fake_generate_questions_by_level)
+    # Patch out OpenAI calls
+    async def fake_generate_questions_async(chunk, async_client, limiter, cache=None):
+        return fake_generate_questions_by_level(chunk)
+    monkeypatch.setattr(create_gt, "generate_questions_async", fake_generate_questions_async)
 
     create_gt.main()
 
@@ -98,4 +100,115 @@ def test_main_creates_ground_truth(monkeypatch, tmp_path):
         assert "text" in obj
         assert "level" in obj
         assert "question" in obj
-        assert "answer" in obj
\ No newline at end of file
+        assert "answer" in obj
+
+class FakeAsyncCompletions:
+    """Chat completions stub returning one Q&A per level; the first `fail_first` calls are rate limited."""
+    def __init__(self, fail_first=0):
+        self.calls = 0
+        self.fail_first = fail_first
+
+    async def create(self, model, messages, temperature, max_tokens):
+        import httpx
+        from openai import RateLimitError
+        from types import SimpleNamespace
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            response = httpx.Response(429, headers={"retry-after": "0"}, request=httpx.Request("POST", "https://api.test"))
+            raise RateLimitError("rate limited", response=response, body=None)
+        qa = [
+            {"query": f"Q about {messages[1]['content'][:10]}", "expected_answer": "A", "difficulty_level": level}
+            for level in ["middle school", "College", "Advanced"]
+        ]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="```json" + json.dumps(qa) + "```"))])
+
+def fake_async_client(fail_first=0):
+    from types import SimpleNamespace
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeAsyncCompletions(fail_first)))
+
+def run_generation(jobs, path, client, cache=None, concurrency=3):
+    import asyncio
+    from sciencesage.jsonl import JsonlWriter
+    from sciencesage.rate_limit import MinuteRateLimiter
+    limiter = MinuteRateLimiter(requests_per_minute=60000, tokens_per_minute=None)
+    with JsonlWriter(path) as writer:
+        return asyncio.run(create_gt.generate_ground_truth(jobs, writer, client, limiter, concurrency, cache))
+
+def test_generate_ground_truth_retries_and_caches(tmp_path):
+    from sciencesage.jsonl import iter_jsonl
+    from sciencesage.llm_cache import LLMResponseCache
+    jobs = [(f"c{i}", "Space Exploration", f"Chunk text number {i}") for i in range(4)]
+    cache = LLMResponseCache(create_gt.PROMPT_VERSION, path=tmp_path / "llm_cache.sqlite", model="test-model")
+    client = fake_async_client(fail_first=2)
+
+    assert run_generation(jobs, tmp_path / "gt.jsonl", client, cache) == (4, 0)
+    assert client.chat.completions.calls == 6
+    records = list(iter_jsonl(tmp_path / "gt.jsonl"))
+    assert len(records) == 12
+    assert {r["level"] for r in records} == {"Middle School", "College", "Advanced"}
+    assert all(r["ground_truth_chunks"] == [r["chunk_id"]] for r in records)
+    assert all(r["ground_truth_grades"] == [create_gt.SOURCE_CHUNK_GRADE] for r in records)
+
+    # A rerun with one new chunk only pays for the new chunk
+    client = fake_async_client()
+    jobs.append(("c4", "Space Exploration", "A brand new chunk"))
+    assert run_generation(jobs, tmp_path / "gt2.jsonl", client, cache) == (5, 0)
+    assert client.chat.completions.calls == 1
+    assert cache.hits == 4
+    cache.close()
+
+    # A different prompt version misses every cached response
+    other = LLMResponseCache("other-version", path=tmp_path / "llm_cache.sqlite", model="test-model")
+    assert other.get("Chunk text number 0") is None
+    other.close()
+
+def test_write_in_job_order(tmp_path):
+    from sciencesage.jsonl import iter_jsonl
+    jobs = [(f"c{i}", "Space Exploration", f"Chunk text number {i}") for i in range(4)]
+    path = tmp_path / "gt.jsonl"
+    # The first two requests are rate limited, so their chunks finish last
+    assert run_generation(jobs, path, fake_async_client(fail_first=2)) == (4, 0)
+    create_gt.write_in_job_order(path, jobs)
+    records = list(iter_jsonl(path))
+    assert [r["chunk_id"] for r in records] == [f"c{i}" for i in range(4) for _ in range(3)]
+    assert [r["level"] for r in records[:3]] == list(create_gt.LEVELS)
+    assert not (tmp_path / "gt.jsonl.tmp").exists()
+
+def test_generate_ground_truth_counts_failures(tmp_path):
+    client = fake_async_client(fail_first=100)
+    jobs = [("c0", "Space Exploration", "Chunk text")]
+    assert run_generation(jobs, tmp_path / "gt.jsonl", client, concurrency=1) == (0, 1)
+    assert client.chat.completions.calls == create_gt.LLM_RATE_LIMIT_RETRIES + 1
+    assert (tmp_path / "gt.jsonl").read_text() == ""
+
+def make_corpus(n_articles=20, per_article=5):
+    return [
+        {
+            "chunk_id": f"{a}-{i}",
+            "title": f"Article {a}",
+            "topic": "Space Exploration" if a % 2 else "Black holes",
+            "text": "word " * (50 if i % 2 else 400),
+        }
+        for a in range(n_articles)
+        for i in range(per_article)
+    ]
+
+def test_sample_chunks_is_seeded_stratified_and_order_independent():
+    import random
+    corpus = make_corpus()
+    topic_chunks, sampled = create_gt.sample_chunks(iter(corpus), num_examples=12, seed=1, max_per_article=1)
+    assert sorted(c["topic"] for c in topic_chunks) == ["Black holes", "Space Exploration"]
+    assert len(sampled) == 12
+    ids = [c["chunk_id"] for c in topic_chunks + sampled]
+    assert len(set(ids)) == len(ids)
+    # At most one chunk per article, and both topics and lengths represented
+    assert len({c["title"] for c in sampled}) == 12
+    assert {c["topic"] for c in sampled} == {"Black holes", "Space Exploration"}
+    assert len({len(c["text"]) for c in sampled}) == 2
+
+    shuffled = corpus[:]
+    random.Random(0).shuffle(shuffled)
+    again = create_gt.sample_chunks(iter(shuffled), num_examples=12, seed=1, max_per_article=1)
+    assert [c["chunk_id"] for c in again[0] + again[1]] == ids
+    other_seed = create_gt.sample_chunks(iter(corpus), num_examples=12, seed=2, max_per_article=1)
+    assert [c["chunk_id"] for c in other_seed[0] + other_seed[1]] != ids
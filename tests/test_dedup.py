@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from sciencesage.dedup import NearDuplicateIndex, lsh_params, shingle_hashes
+
+BASE = (
+    "The Apollo 11 mission was the first crewed landing on the Moon, launched by NASA "
+    "in July 1969 from Kennedy Space Center with Armstrong, Aldrin and Collins aboard."
+)
+
+
+def test_lsh_params_midpoint_near_threshold():
+    bands, rows = lsh_params(0.85, 128)
+    assert bands * rows <= 128
+    assert abs((1 / bands) ** (1 / rows) - 0.85) < 0.03
+
+
+def test_shingles_ignore_case_and_punctuation():
+    assert set(shingle_hashes("Moon landing, 1969!", 2)) == set(shingle_hashes("moon LANDING 1969", 2))
+    assert shingle_hashes("too short", 5).size == 1
+
+
+def test_signature_similarity_tracks_jaccard():
+    index = NearDuplicateIndex(threshold=0.5, num_perm=256)
+    a = " ".join(f"w{i}" for i in range(100))
+    b = " ".join(f"w{i}" for i in range(50, 150))
+    sa, sb = index.signature(a), index.signature(b)
+    # 5-gram Jaccard of the two word ranges: 46 shared of 146 total shingles
+    assert abs(np.mean(sa == sb) - 46 / 146) < 0.1
+
+
+def test_add_keeps_first_and_flags_near_duplicates():
+    index = NearDuplicateIndex(threshold=0.8)
+    assert index.add("a", BASE) is None
+    key, similarity = index.add("b", BASE.rstrip(".") + "!")
+    assert key == "a" and similarity >= 0.8
+    assert index.add("c", "Mars rovers carry spectrometers, drills and cameras to study the surface geology.") is None
+    assert len(index) == 2
+
+
+def test_rejects_invalid_threshold():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(threshold=0)
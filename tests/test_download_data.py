@@ -1,4 +1,7 @@
 import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 from unittest.mock import patch, MagicMock
 
 import pytest
@@ -6,11 +9,55 @@ import pytest
 from scripts.download_data import (
     save_file,
     save_json,
-    get_image_urls,
     filter_categories,
     download_wikipedia_raw,
     download_category_articles,
+    download_articles_concurrently,
+    fetch_bulk_metadata,
+    fetch_revision_ids,
+    select_changed_titles,
+    save_manifest,
+    save_changeset,
+    wiki_get,
 )
+import scripts.download_data as download_data
+from sciencesage.raw_store import ShardWriter, iter_shard
+
+@pytest.fixture(autouse=True)
+def fresh_crawl_state(monkeypatch):
+    monkeypatch.setattr(download_data, "manifest", {})
+    monkeypatch.setattr(download_data, "changed_titles", set())
+
+# --- local stub HTTP server ---
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits += 1
+        if self.server.hits <= self.server.fail_times:
+            self.send_response(self.server.fail_status)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        url = urlparse(self.path)
+        body = self.server.route(url.path, parse_qs(url.query))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.hits = 0
+    server.fail_times = 0
+    server.fail_status = 429
+    server.route = lambda path, query: b'{"ok": true}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
 
 # --- save_file ---
 def test_save_file(tmp_path):
@@ -26,49 +73,6 @@ def test_save_json(tmp_path):
     loaded = json.loads(file_path.read_text(encoding="utf-8"))
     assert loaded == data
 
-# --- get_image_urls ---
-@patch("requests.get")
-def test_get_image_urls_basic(mock_get):
-    # First call: returns images
-    mock_get.return_value.status_code = 200
-    mock_get.return_value.json.side_effect = [
-        {
-            "query": {
-                "pages": {
-                    "1": {
-                        "images": [
-                            {"title": "File:img1.jpg"},
-                            {"title": "File:img2.png"},
-                            {"title": "File:img3.gif"},  # should be ignored
-                        ]
-                    }
-                }
-            }
-        },
-        {
-            "query": {
-                "pages": {
-                    "2": {
-                        "imageinfo": [{"url": "http://img1.jpg"}]
-                    },
-                    "3": {
-                        "imageinfo": [{"url": "http://img2.png"}]
-                    }
-                }
-            }
-        }
-    ]
-    from sciencesage.config import WIKI_URL, WIKI_USER_AGENT
-    urls = get_image_urls("TestPage", WIKI_USER_AGENT, max_images=2)
-    assert urls == ["http://img1.jpg", "http://img2.png"]
-
-@patch("requests.get")
-def test_get_image_urls_status_not_200(mock_get):
-    mock_get.return_value.status_code = 404
-    from sciencesage.config import WIKI_USER_AGENT
-    urls = get_image_urls("TestPage", WIKI_USER_AGENT)
-    assert urls == []
-
 # --- filter_categories ---
 def test_filter_categories_basic():
     cats = [
@@ -86,20 +90,17 @@ def test_filter_categories_basic():
     assert "Category:Commons" not in filtered
 
 # --- download_wikipedia_raw ---
-@patch("wikipediaapi.Wikipedia")
-@patch("requests.get")
+@patch("scripts.download_data.fetch_page_text", return_value="Some text")
+@patch("scripts.download_data.fetch_bulk_metadata")
+@patch("scripts.download_data.session.get")
 @patch("scripts.download_data.save_file")
 @patch("scripts.download_data.save_json")
-def test_download_wikipedia_raw_success(mock_save_json, mock_save_file, mock_requests_get, mock_wikipedia):
-    # Setup mock Wikipedia page
-    mock_page = MagicMock()
-    mock_page.exists.return_value = True
-    mock_page.text = "Some text"
-    mock_page.title = "TestTitle"
-    mock_page.fullurl = "http://testurl"
-    mock_page.summary = "Summary"
-    mock_page.categories = {"Category:Physics": None, "Category:Wikipedia": None}
-    mock_wikipedia.return_value.page.return_value = mock_page
+def test_download_wikipedia_raw_success(mock_save_json, mock_save_file, mock_requests_get, mock_bulk_meta, mock_page_text):
+    # Setup metadata as fetched for the one title
+    mock_bulk_meta.return_value = {
+        "TestTitle": {"title": "TestTitle", "fullurl": "http://testurl", "categories": ["Category:Physics"],
+                      "summary": "Summary", "images": [], "lastrevid": 1},
+    }
 
     # Mock requests.get for HTML
     mock_resp = MagicMock()
@@ -115,38 +116,279 @@ def test_download_wikipedia_raw_success(mock_save_json, mock_save_file, mock_req
     # Check save_json called for meta
     assert mock_save_json.call_count == 1
 
-@patch("wikipediaapi.Wikipedia")
-def test_download_wikipedia_raw_page_not_exists(mock_wikipedia):
-    mock_page = MagicMock()
-    mock_page.exists.return_value = False
-    mock_wikipedia.return_value.page.return_value = mock_page
+@patch("scripts.download_data.fetch_page_text")
+@patch("scripts.download_data.fetch_bulk_metadata", return_value={})
+def test_download_wikipedia_raw_page_not_exists(mock_bulk_meta, mock_page_text):
     from sciencesage.config import WIKI_USER_AGENT
     # Should not raise
     download_wikipedia_raw("NonExistent", WIKI_USER_AGENT)
+    mock_page_text.assert_not_called()
+    assert "NonExistent" not in download_data.manifest
 
 # --- download_category_articles ---
-@patch("wikipediaapi.Wikipedia")
+@patch("scripts.download_data.fetch_category_members", return_value=["Article1", "Article2"])
 @patch("scripts.download_data.download_wikipedia_raw")
-def test_download_category_articles_success(mock_download_raw, mock_wikipedia):
-    mock_cat_page = MagicMock()
-    mock_cat_page.exists.return_value = True
-    # Simulate two articles
-    mock_cat_page.categorymembers = {
-        "Article1": MagicMock(ns=0),
-        "Article2": MagicMock(ns=0),
-        "Category:Subcat": MagicMock(ns=14),
-    }
-    mock_wikipedia.return_value.page.return_value = mock_cat_page
+@patch("scripts.download_data.fetch_bulk_metadata")
+def test_download_category_articles_success(mock_bulk_meta, mock_download_raw, mock_members):
+    mock_bulk_meta.return_value = {"Article1": {"title": "Article1"}, "Article2": {"title": "Article2"}}
     from sciencesage.config import WIKI_USER_AGENT
     count = download_category_articles("Physics", WIKI_USER_AGENT)
     assert count == 2
     assert mock_download_raw.call_count == 2
 
-@patch("wikipediaapi.Wikipedia")
-def test_download_category_articles_cat_not_exists(mock_wikipedia):
-    mock_cat_page = MagicMock()
-    mock_cat_page.exists.return_value = False
-    mock_wikipedia.return_value.page.return_value = mock_cat_page
+@patch("scripts.download_data.fetch_category_members", return_value=[])
+def test_download_category_articles_cat_not_exists(mock_members):
     from sciencesage.config import WIKI_USER_AGENT
     count = download_category_articles("NonExistentCat", WIKI_USER_AGENT)
-    assert count == 0
\ No newline at end of file
+    assert count == 0
+
+def test_fetch_category_members_retries_and_continues(stub_server, monkeypatch):
+    pages = {
+        None: {"query": {"categorymembers": [{"ns": 0, "title": "Mars"}]}, "continue": {"cmcontinue": "next", "continue": "-||"}},
+        "next": {"query": {"categorymembers": [{"ns": 0, "title": "Venus"}]}},
+    }
+    requests_seen = []
+    def route(path, query):
+        requests_seen.append(query)
+        return json.dumps(pages[query.get("cmcontinue", [None])[0]]).encode()
+
+    stub_server.route = route
+    stub_server.fail_times = 1
+    monkeypatch.setattr(download_data, "WIKI_URL", f"http://127.0.0.1:{stub_server.server_address[1]}")
+
+    assert download_data.fetch_category_members("Planets", "agent") == ["Mars", "Venus"]
+    assert stub_server.hits == 3
+    assert requests_seen[0]["list"] == ["categorymembers"]
+    assert requests_seen[0]["cmtitle"] == ["Category:Planets"]
+    assert requests_seen[0]["cmnamespace"] == ["0"]
+
+# --- wiki_get ---
+def test_wiki_get_retries_429(stub_server):
+    stub_server.fail_times = 2
+    url = f"http://127.0.0.1:{stub_server.server_address[1]}/w/api.php"
+    resp = wiki_get(url)
+    assert resp.status_code == 200
+    assert resp.json() == {"ok": True}
+    assert stub_server.hits == 3
+
+def test_wiki_get_gives_up_after_max_retries(stub_server):
+    stub_server.fail_times = 10
+    stub_server.fail_status = 503
+    url = f"http://127.0.0.1:{stub_server.server_address[1]}/w/api.php"
+    resp = wiki_get(url, max_retries=1)
+    assert resp.status_code == 503
+    assert stub_server.hits == 2
+
+def test_download_wikipedia_raw_retries_text_and_metadata(stub_server, tmp_path, monkeypatch):
+    def route(path, query):
+        if path.startswith("/api/rest_v1/page/html/"):
+            return b"<html>mars</html>"
+        if query["prop"] == ["extracts"]:
+            extract = "Mars is a planet.\n\n== Moons ==\nPhobos and Deimos.\n"
+            return json.dumps({"query": {"pages": [{"title": "Mars", "extract": extract}]}}).encode()
+        page = {"title": "Mars", "fullurl": "http://mars", "lastrevid": 7, "extract": "Mars is a planet.",
+                "categories": [{"title": "Category:Planets"}]}
+        return json.dumps({"query": {"pages": [page]}}).encode()
+
+    stub_server.route = route
+    # The metadata request is rate limited twice, then every request succeeds
+    stub_server.fail_times = 2
+    stub_server.fail_status = 503
+    monkeypatch.setattr(download_data, "WIKI_URL", f"http://127.0.0.1:{stub_server.server_address[1]}")
+    monkeypatch.setattr(download_data, "RAW_DATA_DIR", str(tmp_path))
+
+    download_wikipedia_raw("Mars", "agent")
+
+    assert (tmp_path / "wikipedia_Mars.txt").read_text() == "Mars is a planet.\n\nMoons\nPhobos and Deimos."
+    meta = json.loads((tmp_path / "wikipedia_Mars.meta.json").read_text())
+    assert meta["categories"] == ["Category:Planets"]
+    assert meta["lastrevid"] == 7
+    assert download_data.manifest["Mars"]["status"] == "done"
+    # metadata (2 retries + 1), text, html
+    assert stub_server.hits == 5
+
+# --- download_articles_concurrently ---
+@patch("scripts.download_data.download_wikipedia_raw")
+def test_download_articles_concurrently_records_failures(mock_download_raw):
+    def fake_download(title, user_agent):
+        if title == "Bad":
+            raise RuntimeError("boom")
+    mock_download_raw.side_effect = fake_download
+    count = download_articles_concurrently(["A", "Bad", "C"], "agent", max_workers=2)
+    assert count == 2
+    assert mock_download_raw.call_count == 3
+    assert download_data.manifest["Bad"]["status"] == "failed"
+    assert "A" not in download_data.manifest  # recorded by download_wikipedia_raw itself
+
+# --- fetch_bulk_metadata ---
+def make_response(payload):
+    resp = MagicMock()
+    resp.status_code = 200
+    resp.json.return_value = payload
+    return resp
+
+@patch("scripts.download_data.wiki_get")
+def test_fetch_bulk_metadata_merges_continuation(mock_wiki_get):
+    mock_wiki_get.side_effect = [
+        make_response({
+            "continue": {"clcontinue": "1|Next", "continue": "||"},
+            "query": {
+                "normalized": [{"from": "moon", "to": "Moon"}],
+                "pages": [
+                    {"title": "Moon", "fullurl": "http://moon", "lastrevid": 11,
+                     "categories": [{"title": "Category:Moon"}], "images": [{"title": "File:moon.jpg"}],
+                     "extract": "The Moon."},
+                    {"title": "Missing", "missing": True},
+                ],
+            },
+        }),
+        make_response({
+            "query": {
+                "pages": [
+                    {"title": "Moon", "categories": [{"title": "Category:Articles with short description"},
+                                                     {"title": "Category:Natural satellites"}],
+                     "images": [{"title": "File:icon.gif"}]},
+                ],
+            },
+        }),
+        make_response({"query": {"pages": [{"title": "File:moon.jpg", "imageinfo": [{"url": "http://img/moon.jpg"}]}]}}),
+    ]
+    from sciencesage.config import WIKI_USER_AGENT
+    metas = fetch_bulk_metadata(["moon", "Missing"], WIKI_USER_AGENT)
+    assert list(metas) == ["moon"]
+    meta = metas["moon"]
+    assert meta["title"] == "Moon"
+    assert meta["fullurl"] == "http://moon"
+    assert meta["lastrevid"] == 11
+    assert meta["summary"] == "The Moon."
+    assert meta["categories"] == ["Category:Moon", "Category:Natural satellites"]
+    assert meta["images"] == ["http://img/moon.jpg"]
+    # Continuation params are sent on the second request
+    assert mock_wiki_get.call_args_list[1].kwargs["params"]["clcontinue"] == "1|Next"
+    assert mock_wiki_get.call_count == 3
+
+# --- incremental refresh ---
+def test_fetch_revision_ids_follows_redirects():
+    query = {
+        "redirects": [{"from": "Red Planet", "to": "Mars"}],
+        "pages": [{"title": "Mars", "lastrevid": 42}, {"title": "Nowhere", "missing": True}],
+    }
+    with patch("scripts.download_data.query_with_continuation", return_value=iter([query])):
+        revids = fetch_revision_ids(["Red Planet", "Nowhere"], "agent")
+    assert revids == {"Red Planet": 42}
+
+def test_select_changed_titles(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_data, "RAW_DATA_DIR", str(tmp_path))
+    (tmp_path / "wikipedia_Mars.txt").write_text("text")
+    (tmp_path / "wikipedia_Moon.txt").write_text("text")
+    monkeypatch.setattr(download_data, "manifest", {
+        "Mars": {"revid": 1, "etag": None, "text_file": "wikipedia_Mars.txt"},
+        "Moon": {"revid": 5, "etag": None, "text_file": "wikipedia_Moon.txt"},
+        "Venus": {"revid": 7, "etag": None, "text_file": "wikipedia_Venus.txt"},
+    })
+    revids = {"Mars": 1, "Moon": 6, "Venus": 7, "Jupiter": 3}
+    # Moon has a new revision, Venus lost its text file, Jupiter is new
+    assert select_changed_titles(["Mars", "Moon", "Venus", "Jupiter"], revids) == ["Moon", "Venus", "Jupiter"]
+
+@patch("scripts.download_data.fetch_page_text", return_value="Mars text")
+@patch("scripts.download_data.wiki_get")
+@patch("scripts.download_data.save_file")
+@patch("scripts.download_data.save_json")
+def test_download_wikipedia_raw_not_modified_keeps_html(mock_save_json, mock_save_file, mock_wiki_get, mock_page_text, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_data, "RAW_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(download_data, "manifest", {"Mars": {"revid": 1, "etag": '"abc"', "text_file": "wikipedia_Mars.txt"}})
+    monkeypatch.setattr(download_data, "changed_titles", set())
+    (tmp_path / "wikipedia_Mars.html").write_text("<html>old</html>")
+    mock_wiki_get.return_value = MagicMock(status_code=304)
+
+    download_wikipedia_raw("Mars", "agent", meta={"title": "Mars", "categories": [], "lastrevid": 2})
+
+    assert mock_wiki_get.call_args.kwargs["headers"]["If-None-Match"] == '"abc"'
+    saved = [call.args[0] for call in mock_save_file.call_args_list]
+    assert not any(path.endswith(".html") for path in saved)
+    assert download_data.manifest["Mars"] == {"revid": 2, "etag": '"abc"', "text_file": "wikipedia_Mars.txt", "shard": None, "status": "done"}
+    assert download_data.changed_titles == {"Mars"}
+
+@patch("scripts.download_data.fetch_page_text", return_value="Mars text")
+@patch("scripts.download_data.wiki_get")
+@patch("scripts.download_data.save_file")
+@patch("scripts.download_data.save_json")
+def test_download_wikipedia_raw_to_shard(mock_save_json, mock_save_file, mock_wiki_get, mock_page_text, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_data, "manifest", {})
+    monkeypatch.setattr(download_data, "changed_titles", set())
+    mock_wiki_get.return_value = MagicMock(status_code=200, text="<html>mars</html>", headers={"ETag": '"v1"'})
+    store = ShardWriter(str(tmp_path / "Planets.jsonl.gz"))
+
+    download_wikipedia_raw("Mars", "agent", meta={"title": "Mars", "lastrevid": 3}, store=store)
+    store.close()
+
+    mock_save_file.assert_not_called()
+    mock_save_json.assert_not_called()
+    assert list(iter_shard(store.path)) == [
+        {"title": "Mars", "text": "Mars text", "meta": {"title": "Mars", "lastrevid": 3}, "html": "<html>mars</html>"}
+    ]
+    assert download_data.manifest["Mars"]["shard"] == "Planets.jsonl.gz"
+
+def test_select_changed_titles_checks_shard_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_data, "RAW_SHARD_DIR", str(tmp_path))
+    store = ShardWriter(str(tmp_path / "Planets.jsonl.gz"))
+    store.write({"title": "Mars", "text": "Mars text"})
+    store.close()
+    monkeypatch.setattr(download_data, "manifest", {
+        "Mars": {"revid": 1, "shard": "Planets.jsonl.gz", "status": "done"},
+        "Moon": {"revid": 2, "shard": "Planets.jsonl.gz", "status": "done"},
+        "Venus": {"revid": 3, "shard": "Missing.jsonl.gz", "status": "done"},
+    })
+    # Moon's shard exists but never got its record; Venus's shard is gone
+    assert select_changed_titles(["Mars", "Moon", "Venus"]) == ["Moon", "Venus"]
+
+# --- resumable crawl ---
+def test_select_changed_titles_resume_skips_completed(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_data, "RAW_DATA_DIR", str(tmp_path))
+    (tmp_path / "wikipedia_Mars.txt").write_text("text")
+    (tmp_path / "wikipedia_Moon.txt").write_text("text")
+    monkeypatch.setattr(download_data, "manifest", {
+        "Mars": {"revid": 1, "status": "done"},
+        "Moon": {"revid": None, "status": "failed", "error": "timeout"},
+    })
+    assert select_changed_titles(["Mars", "Moon", "Venus"]) == ["Moon", "Venus"]
+
+def test_save_changeset_merges_until_consumed(tmp_path, monkeypatch):
+    path = str(tmp_path / "changeset.json")
+    monkeypatch.setattr(download_data, "changed_titles", {"Mars"})
+    save_changeset(path)
+    monkeypatch.setattr(download_data, "changed_titles", {"Moon"})
+    save_changeset(path, refresh=True)
+    changeset = json.loads(open(path).read())
+    assert changeset["files"] == ["wikipedia_Mars.txt", "wikipedia_Moon.txt"]
+    assert changeset["refresh"] is True
+
+    # Once preprocessing has applied it, the next run starts over
+    with open(path, "w") as f:
+        json.dump({**changeset, "consumed_at": "now"}, f)
+    save_changeset(path)
+    changeset = json.loads(open(path).read())
+    assert changeset["files"] == ["wikipedia_Moon.txt"]
+    assert changeset["refresh"] is False
+    assert "consumed_at" not in changeset
+
+def test_save_manifest_is_atomic(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_data, "manifest", {"Mars": {"revid": 1, "status": "done"}})
+    path = tmp_path / "manifest.json"
+    path.write_text("stale")
+    save_manifest(str(path))
+    assert json.loads(path.read_text()) == {"Mars": {"revid": 1, "status": "done"}}
+    assert list(tmp_path.iterdir()) == [path]
+
+@patch("scripts.download_data.fetch_category_members", return_value=["A", "B", "C"])
+@patch("scripts.download_data.download_articles_concurrently", return_value=1)
+@patch("scripts.download_data.fetch_bulk_metadata")
+def test_download_category_articles_resumes_with_limit(mock_bulk_meta, mock_download, mock_members, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_data, "RAW_DATA_DIR", str(tmp_path))
+    (tmp_path / "wikipedia_A.txt").write_text("text")
+    monkeypatch.setattr(download_data, "manifest", {"A": {"revid": 1, "status": "done"}})
+    mock_bulk_meta.side_effect = lambda titles, user_agent: {t: {"title": t} for t in titles}
+
+    download_category_articles("Physics", "agent", limit=1)
+
+    assert mock_bulk_meta.call_args.args[0] == ["B"]
@@ -51,4 +51,54 @@ def test_drop_collection(monkeypatch):
     monkeypatch.setattr("scripts.embed.qdrant", dummy)
     monkeypatch.setattr("scripts.embed.QDRANT_COLLECTION", "test_collection")
     drop_collection()
-    assert "test_collection" not in dummy.collections
\ No newline at end of file
+    assert "test_collection" not in dummy.collections
+
+def test_build_quantization_config():
+    from qdrant_client.models import ScalarQuantization, BinaryQuantization
+    from scripts.embed import build_quantization_config
+    assert isinstance(build_quantization_config("scalar"), ScalarQuantization)
+    assert isinstance(build_quantization_config("binary"), BinaryQuantization)
+    assert build_quantization_config("none") is None
+
+def test_delete_title_points_only_removes_stale_articles(monkeypatch):
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import PointStruct, VectorParams, Distance
+    from scripts.embed import delete_title_points
+    client = QdrantClient(":memory:")
+    client.create_collection("chunks", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    client.upsert("chunks", points=[
+        PointStruct(id=i, vector=[1.0, float(i)], payload={"title": title})
+        for i, title in enumerate(["Mars", "Mars", "Moon", "Venus"])
+    ])
+    monkeypatch.setattr("scripts.embed.qdrant", client)
+    delete_title_points(["Mars", "Venus"], collection_name="chunks", batch_size=1)
+    remaining = client.scroll("chunks", limit=10)[0]
+    assert [p.payload["title"] for p in remaining] == ["Moon"]
+
+def test_embedding_parquet_writer_streams_and_carries_over_rows(tmp_path):
+    import pandas as pd
+    from scripts.embed import EmbeddingParquetWriter
+    path = tmp_path / "embeddings.parquet"
+    writer = EmbeddingParquetWriter(path, row_group_size=2)
+    writer.write([{"chunk_id": str(i), "title": title, "embedding": [float(i)]} for i, title in enumerate(["Mars", "Moon", "Venus"])])
+    writer.close()
+    assert not (tmp_path / "embeddings.parquet.tmp").exists()
+
+    writer = EmbeddingParquetWriter(path)
+    writer.copy_from(path, exclude_titles={"Mars"})
+    writer.write([{"chunk_id": "9", "title": "Mars", "embedding": [9.0]}])
+    writer.close()
+    df = pd.read_parquet(path)
+    assert list(df["chunk_id"]) == ["1", "2", "9"]
+    assert writer.rows == 3
+
+def test_mark_changeset_consumed(tmp_path):
+    import json
+    from scripts.embed import mark_changeset_consumed
+    path = tmp_path / "changeset.json"
+    path.write_text(json.dumps({"full": False, "changed_titles": ["Mars"]}))
+    mark_changeset_consumed(path)
+    changeset = json.loads(path.read_text())
+    assert changeset["changed_titles"] == ["Mars"]
+    assert changeset["consumed_at"]
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,41 @@
+import threading
+
+import numpy as np
+import pytest
+
+from sciencesage.embedding_server import EmbeddingServer
+from sciencesage.encoders import RemoteEncoder
+
+class DummyEncoder:
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            if sentences == "boom":
+                raise ValueError("bad input")
+            return np.array([len(sentences), 1.0])
+        return np.array([[len(s), 1.0] for s in sentences])
+
+@pytest.fixture
+def server(tmp_path):
+    server = EmbeddingServer(DummyEncoder(), str(tmp_path / "embed.sock"))
+    server.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.close()
+    thread.join(timeout=2)
+
+def test_remote_encoder_single_and_batch(server):
+    encoder = RemoteEncoder(server.address)
+    single = encoder.encode("abc")
+    assert single.shape == (2,)
+    assert single.tolist() == [3.0, 1.0]
+    batch = encoder.encode(["a", "abcd"])
+    assert batch.shape == (2, 2)
+    assert batch.dtype == np.float32
+
+def test_remote_encoder_error(server):
+    encoder = RemoteEncoder(server.address)
+    with pytest.raises(RuntimeError):
+        encoder.encode("boom")
+    # Connection is still usable after a failed request
+    assert encoder.encode("ok").tolist() == [2.0, 1.0]
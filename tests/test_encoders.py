@@ -0,0 +1,15 @@
+import numpy as np
+import pytest
+
+from sciencesage.encoders import OnnxEncoder, cosine_parity
+
+def test_cosine_parity_identical_and_orthogonal():
+    a = np.array([[1.0, 0.0], [0.0, 2.0]])
+    b = np.array([[2.0, 0.0], [1.0, 0.0]])
+    sims = cosine_parity(a, b)
+    assert sims[0] == pytest.approx(1.0)
+    assert sims[1] == pytest.approx(0.0)
+
+def test_onnx_encoder_missing_model(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        OnnxEncoder(model_dir=str(tmp_path))
@@ -61,3 +61,72 @@ def test_generate_llm_eval_for_entry_invalid(monkeypatch):
     monkeypatch.setattr(rag_llm_evaluation, "generate_answer", dummy_generate_answer)
     with pytest.raises(ValueError):
         rag_llm_evaluation.generate_llm_eval_for_entry({"question": None, "answer": "x"})
+
+def test_evaluate_batched_streams_results_in_order(tmp_path, monkeypatch):
+    import numpy as np
+    from scripts import generate_eval_results
+    from sciencesage.jsonl import JsonlWriter, iter_jsonl
+
+    calls = []
+    def fake_search_batch(vectors, top_k, batch_size, workers):
+        calls.append(len(vectors))
+        return [[{"chunk_id": f"c{int(v[0])}", "text": f"text {int(v[0])}"}] for v in vectors]
+    monkeypatch.setattr(generate_eval_results, "encode_queries", lambda qs, bs: np.array([[float(q[1:])] for q in qs]))
+    monkeypatch.setattr(generate_eval_results, "search_batch", fake_search_batch)
+
+    entries = [{"question": f"q{i}", "chunk_id": f"c{i}", "text": f"text {i}"} for i in range(5)]
+    path = tmp_path / "eval.jsonl"
+    with JsonlWriter(path) as writer:
+        timings = generate_eval_results.evaluate_batched(iter(entries), writer, batch_size=2, workers=1, match_mode="substring")
+    results = list(iter_jsonl(path))
+    assert calls == [2, 2, 1]
+    assert [r["query"] for r in results] == [e["question"] for e in entries]
+    assert all(r["reciprocal_rank"] == 1.0 for r in results)
+    assert all(r["match_mode"] == "substring" for r in results)
+    assert set(timings) == {"encode", "search", "metrics"}
+
+def test_evaluate_batched_reuses_cached_retrievals(tmp_path, monkeypatch):
+    import numpy as np
+    from scripts import generate_eval_results
+    from sciencesage.jsonl import JsonlWriter, iter_jsonl
+    from sciencesage.retrieval_cache import RetrievalCache
+
+    searched = []
+    def fake_search_batch(vectors, top_k, batch_size, workers):
+        searched.extend(int(v[0]) for v in vectors)
+        return [[{"chunk_id": f"c{int(v[0])}", "text": f"text {int(v[0])}"}] for v in vectors]
+    monkeypatch.setattr(generate_eval_results, "encode_queries", lambda qs, bs: np.array([[float(q[1:])] for q in qs]))
+    monkeypatch.setattr(generate_eval_results, "search_batch", fake_search_batch)
+
+    cache = RetrievalCache("fp", path=tmp_path / "cache.sqlite")
+    entries = [{"question": f"q{i % 3}", "chunk_id": f"c{i % 3}", "text": f"text {i % 3}"} for i in range(5)]
+    for _ in range(2):
+        with JsonlWriter(tmp_path / "eval.jsonl") as writer:
+            generate_eval_results.evaluate_batched(iter(entries), writer, batch_size=8, workers=1, cache=cache)
+    # Each distinct question is searched once across both runs
+    assert sorted(searched) == [0, 1, 2]
+    assert all(r["reciprocal_rank"] == 1.0 for r in iter_jsonl(tmp_path / "eval.jsonl"))
+
+def test_build_eval_result_carries_ground_truth_grades():
+    from scripts import generate_eval_results
+
+    entry = {"question": "q", "chunk_id": "c1", "text": "text", "ground_truth_grades": [2.0]}
+    chunks = [{"chunk_id": "other", "text": "other"}, {"chunk_id": "c1", "text": "text"}]
+    record = generate_eval_results.build_eval_result(entry, chunks)
+    assert record["ground_truth_grades"] == [2.0]
+    # One graded chunk: nDCG is the same as binary, only the gains scale
+    assert record["ndcg_at_k"] == pytest.approx(1 / 1.5849625007211562)
+
+def test_build_eval_result_aligns_multi_chunk_graded_ground_truth():
+    from scripts import generate_eval_results
+
+    entry = {"question": "q", "chunk_id": "c1", "text": "first", "ground_truth_chunks": ["c1", "c2"], "ground_truth_grades": [1.0, 0.5]}
+    chunks = [{"chunk_id": "c2", "text": "second"}, {"chunk_id": "c1", "text": "first"}]
+    for record in [generate_eval_results.build_eval_result(entry, chunks), rag_llm_evaluation.build_llm_eval_result(entry, chunks, "a")]:
+        assert record["ground_truth_chunks"] == ["c1", "c2"]
+        assert record["ground_truth_texts"] == ["first", None]
+        assert record["ground_truth_grades"] == [1.0, 0.5]
+        discount = 1 / 1.5849625007211562
+        assert record["ndcg_at_k"] == pytest.approx((0.5 + discount) / (1.0 + 0.5 * discount))
+        assert record["precision_at_k"] == pytest.approx(2 / rag_llm_evaluation.TOP_K)
+        assert record["recall_at_k"] == 1.0
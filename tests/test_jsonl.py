@@ -0,0 +1,63 @@
+import gzip
+import json
+
+import pytest
+
+from sciencesage import jsonl
+from sciencesage.jsonl import JsonlWriter, iter_jsonl, write_jsonl
+
+
+@pytest.fixture(params=[True, False], ids=["orjson", "json"])
+def json_backend(request, monkeypatch):
+    if request.param and not jsonl.orjson_available():
+        pytest.skip("orjson not installed")
+    if not request.param:
+        monkeypatch.setattr(jsonl, "orjson", None)
+
+
+@pytest.mark.parametrize("name", ["records.jsonl", "records.jsonl.gz"])
+def test_round_trip(tmp_path, json_backend, name):
+    records = [{"a": 1, "text": "Mars — the red planet"}, {"b": [1.5, None]}]
+    path = tmp_path / "nested" / name
+    assert write_jsonl(records, path) == 2
+    assert list(iter_jsonl(path)) == records
+
+
+def test_iter_jsonl_is_lazy_and_skips_blank_lines(tmp_path):
+    path = tmp_path / "records.jsonl"
+    path.write_text('{"a": 1}\n\n{"a": 2}\n')
+    records = iter_jsonl(path)
+    assert next(records) == {"a": 1}
+    assert list(records) == [{"a": 2}]
+
+
+def test_writer_appends(tmp_path, json_backend):
+    path = tmp_path / "records.jsonl"
+    write_jsonl([{"a": 1}], path)
+    write_jsonl([{"a": 2}], path, append=True)
+    assert [r["a"] for r in iter_jsonl(path)] == [1, 2]
+
+
+def test_gzip_append_adds_readable_member(tmp_path):
+    path = tmp_path / "records.jsonl.gz"
+    write_jsonl([{"a": 1}], path)
+    write_jsonl([{"a": 2}], path, append=True)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["a"] for line in f] == [1, 2]
+
+
+def test_writer_flushes_before_close(tmp_path):
+    path = tmp_path / "records.jsonl"
+    writer = JsonlWriter(path, flush_every=2)
+    writer.write({"a": 1})
+    writer.write({"a": 2})
+    writer.write({"a": 3})
+    # A crash now keeps the flushed records
+    assert [r["a"] for r in iter_jsonl(path)] == [1, 2]
+    writer.close()
+    assert writer.count == 3
+    assert [r["a"] for r in iter_jsonl(path)] == [1, 2, 3]
+
+
+def test_dumps_falls_back_to_json_for_non_str_keys():
+    assert json.loads(jsonl.dumps({1: "x"})) == {"1": "x"}
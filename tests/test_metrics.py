@@ -0,0 +1,113 @@
+import pytest
+
+from sciencesage import metrics
+
+def make_record(retrieved, ground_truth, query="q"):
+    """retrieved / ground_truth are lists of (chunk_id, text) pairs."""
+    return {
+        "query": query,
+        "topic": "Physics",
+        "level": "College",
+        "retrieved_chunks": [c for c, _ in retrieved],
+        "retrieved_context": [t for _, t in retrieved],
+        "ground_truth_chunks": [c for c, _ in ground_truth],
+        "ground_truth_texts": [t for _, t in ground_truth],
+    }
+
+def test_ndcg_perfect_and_miss():
+    assert metrics.ndcg_at_k(["A"], ["a "], 3) == pytest.approx(1.0)
+    assert metrics.ndcg_at_k(["b"], ["a"], 3) == 0.0
+    assert metrics.dcg(["x", " A"], ["a"], 2) == pytest.approx(1 / 1.5849625007211562)
+
+def test_engine_matches_per_query_functions():
+    records = [
+        make_record([("1", "Alpha"), ("2", "beta"), ("3", "gamma")], [("2", "beta")]),
+        make_record([("4", "delta"), ("5", "eps")], [("9", "zeta"), ("5", "eps")]),
+        make_record([("6", "omega")], [("7", "sigma")]),
+        make_record([], [("8", "iota")]),
+    ]
+    k = 3
+    table = metrics.evaluate_retrieval(records, k)
+    for row, record in zip(table.to_dict("records"), records):
+        retrieved, relevant = record["retrieved_context"], record["ground_truth_texts"]
+        assert row["precision_at_k"] == pytest.approx(metrics.precision_at_k(retrieved, relevant, k))
+        assert row["recall_at_k"] == pytest.approx(metrics.recall_at_k(retrieved, relevant, k))
+        assert row["reciprocal_rank"] == pytest.approx(metrics.reciprocal_rank(retrieved, relevant))
+        assert row["ndcg_at_k"] == pytest.approx(metrics.ndcg_at_k(retrieved, relevant, k))
+    assert list(table["hit_rate_at_k"]) == [1.0, 1.0, 0.0, 0.0]
+    assert list(table["query"]) == ["q"] * 4
+
+def test_exact_mode_matches_by_id_then_text_hash():
+    # Same id with different text, then a different id with the same (normalized) text
+    record = make_record([("a", "rewritten"), ("x", "  The Text "), ("y", "other")], [("a", "original"), ("b", "the text")])
+    table = metrics.evaluate_retrieval([record], 3)
+    assert table.loc[0, "recall_at_k"] == 1.0
+    assert table.loc[0, "reciprocal_rank"] == 1.0
+
+def test_substring_mode():
+    record = make_record([("x", "a longer passage about stars"), ("y", "planets")], [("a", "passage about stars")])
+    assert metrics.evaluate_retrieval([record], 2, mode="exact").loc[0, "hit_rate_at_k"] == 0.0
+    table = metrics.evaluate_retrieval([record], 2, mode="substring")
+    assert table.loc[0, "precision_at_k"] == 0.5
+    assert table.loc[0, "recall_at_k"] == 1.0
+
+def test_add_retrieval_metrics_updates_records():
+    records = [make_record([("1", "a"), ("2", "b")], [("2", "b")])]
+    table = metrics.add_retrieval_metrics(records, 2)
+    assert len(table) == 1
+    assert records[0]["reciprocal_rank"] == 0.5
+    assert records[0]["precision_at_k"] == 0.5
+    assert set(metrics.METRIC_COLUMNS) <= set(records[0])
+
+def test_metric_curves_match_single_k():
+    records = [
+        make_record([("1", "a"), ("2", "b"), ("3", "c"), ("4", "d")], [("3", "c"), ("9", "z")]),
+        make_record([("5", "e"), ("6", "f")], [("5", "e")]),
+    ]
+    rel, n_relevant, ideal = metrics._relevance_for(records, 4, "exact")
+    curves = metrics.metric_curves(rel, n_relevant, ideal)
+    for k in range(1, 5):
+        table = metrics.evaluate_retrieval(records, k)
+        for column in metrics.METRIC_COLUMNS:
+            assert curves[column][:, k - 1] == pytest.approx(table[column].to_numpy())
+    assert list(curves["reciprocal_rank"][0]) == [0.0, 0.0, pytest.approx(1 / 3), pytest.approx(1 / 3)]
+
+def test_evaluate_curves_streams_batches():
+    records = [make_record([("1", "a"), ("2", "b")], [("2", "b")]) for _ in range(5)]
+    curves = metrics.evaluate_curves(iter(records), 3, batch_size=2)
+    assert list(curves["k"]) == [1, 2, 3]
+    assert list(curves["hit_rate_at_k"]) == [0.0, 1.0, 1.0]
+    assert list(curves["recall_at_k"]) == [0.0, 1.0, 1.0]
+
+def test_evaluate_curves_uses_each_records_match_mode():
+    record = make_record([("x", "a longer passage about stars")], [("a", "passage about stars")])
+    assert list(metrics.evaluate_curves([record], 1)["hit_rate_at_k"]) == [0.0]
+    substring = {**record, "match_mode": "substring"}
+    assert list(metrics.evaluate_curves([substring, record], 1)["hit_rate_at_k"]) == [0.5]
+    # An explicit mode overrides the records'
+    assert list(metrics.evaluate_curves([substring], 1, mode="exact")["hit_rate_at_k"]) == [0.0]
+
+def test_cutoff_must_be_positive():
+    records = [make_record([("1", "a")], [("1", "a")])]
+    with pytest.raises(ValueError, match="max_k"):
+        metrics.evaluate_curves(records, 0)
+    with pytest.raises(ValueError, match="k must be at least 1"):
+        metrics.evaluate_retrieval(records, 0)
+
+def test_graded_relevance_ndcg():
+    graded = make_record([("low", "x"), ("high", "y")], [("high", "y"), ("low", "x")])
+    graded["ground_truth_grades"] = [3, 1]
+    table = metrics.evaluate_retrieval([graded], 2)
+    discount = 1 / 1.5849625007211562
+    assert table.loc[0, "ndcg_at_k"] == pytest.approx((1 + 3 * discount) / (3 + 1 * discount))
+    # Any grade counts as a hit for the binary metrics
+    assert table.loc[0, "precision_at_k"] == 1.0
+
+    graded["retrieved_chunks"], graded["retrieved_context"] = ["high", "low"], ["y", "x"]
+    assert metrics.evaluate_retrieval([graded], 2).loc[0, "ndcg_at_k"] == pytest.approx(1.0)
+
+def test_bootstrap_ci():
+    low, high = metrics.bootstrap_ci([0.0, 1.0] * 50, n_resamples=500)
+    assert low < 0.5 < high
+    assert (low, high) == metrics.bootstrap_ci([0.0, 1.0] * 50, n_resamples=500)
+    assert metrics.bootstrap_ci([0.4] * 10) == pytest.approx((0.4, 0.4))
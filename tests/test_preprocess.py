@@ -1,5 +1,8 @@
+import io
+import json
 import uuid
 import datetime
+from concurrent.futures import ProcessPoolExecutor
 
 import pytest
 
@@ -8,7 +11,21 @@ from scripts.preprocess import (
     filter_categories,
     infer_topic,
     make_standard_chunk,
+    load_unchanged_chunks,
+    process_article,
+    imap_ordered,
+    write_unique_chunks,
+    article_fingerprint,
+    chunker_params,
+    iter_unchanged_lines,
+    plan_changes,
+    chunk_article,
+    resurrected_titles,
+    merge_changeset,
 )
+import scripts.preprocess as preprocess_module
+from sciencesage.chunking import chunk_spans_by_paragraphs
+from tests.test_chunking import WhitespaceTokenizer
 
 # --- chunk_text_by_paragraphs ---
 def test_chunk_text_by_paragraphs_basic_split():
@@ -134,4 +151,245 @@ def test_make_standard_chunk_category_filtering():
     meta = {"title": "Title", "categories": ["Category:Commons", "Science"]}
     chunk = make_standard_chunk(text, meta, 0, 0, 4)
     assert "Category:Commons" not in chunk["categories"]
-    assert "Science" in chunk["categories"]
\ No newline at end of file
+    assert "Science" in chunk["categories"]
+
+def test_load_unchanged_chunks_drops_changed_titles(tmp_path):
+    path = tmp_path / "chunks.jsonl"
+    path.write_text(
+        '{"chunk_id": "1", "title": "Mars"}\n'
+        '{"chunk_id": "2", "title": "Moon"}\n'
+        '{"chunk_id": "3", "title": "Mars"}\n'
+    )
+    kept = load_unchanged_chunks(path, {"Mars"})
+    assert [c["chunk_id"] for c in kept] == ["2"]
+    assert load_unchanged_chunks(tmp_path / "missing.jsonl", {"Mars"}) == []
+
+def test_process_article_offsets_and_missing_meta():
+    text = "First paragraph. " * 10 + "\n\n" + "Second paragraph. " * 10
+    name, title, chunks = process_article(("wikipedia_Mars.txt", text, {"title": "Mars"}))
+    assert (name, title) == ("wikipedia_Mars.txt", "Mars")
+    assert [c["chunk_index"] for c in chunks] == [0, 1]
+    assert all(text[c["char_start"]:c["char_end"]] == c["text"] for c in chunks)
+    assert process_article(("wikipedia_Orphan.txt", "text", None)) == ("wikipedia_Orphan.txt", None, None)
+
+def test_imap_ordered_keeps_input_order():
+    articles = [(f"a{i}.txt", "Paragraph text here. " * (i + 1), {"title": f"A{i}"}) for i in range(12)]
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        titles = [title for _, title, _ in imap_ordered(executor, process_article, articles, window=3)]
+    assert titles == [f"A{i}" for i in range(12)]
+
+def test_write_unique_chunks_drops_duplicate_texts():
+    out = io.StringIO()
+    seen = {}
+    chunks = [{"text": "same"}, {"text": "other"}, {"text": "same"}]
+    assert write_unique_chunks(chunks, out, seen) == 2
+    assert write_unique_chunks([{"text": "other"}], out, seen) == 0
+    assert [json.loads(line)["text"] for line in out.getvalue().splitlines()] == ["same", "other"]
+
+def test_write_unique_chunks_mirrors_to_chunk_store(tmp_path):
+    from sciencesage.chunk_store import ChunkStoreWriter, read_chunks
+    path = str(tmp_path / "chunks.parquet")
+    store = ChunkStoreWriter(path)
+    chunks = [{"chunk_id": "1", "text": "same", "topic": "mars"}, {"chunk_id": "2", "text": "same", "topic": "mars"}]
+    write_unique_chunks(chunks, io.StringIO(), {}, store=store)
+    store.close()
+    assert read_chunks(path, columns=["chunk_id"]).column("chunk_id").to_pylist() == ["1"]
+
+def test_article_fingerprint_depends_on_chunker_params():
+    params = chunker_params()
+    meta = {"title": "Mars"}
+    assert article_fingerprint("text", meta, params) == article_fingerprint("text", dict(meta), dict(params))
+    assert article_fingerprint("text", meta, params) != article_fingerprint("text!", meta, params)
+    assert article_fingerprint("text", meta, params) != article_fingerprint("text", meta, {**params, "chunk_size": 64})
+
+def test_chunker_params_include_near_dup_threshold():
+    assert chunker_params(0.5) != chunker_params(0.9)
+    assert chunker_params() == chunker_params(preprocess_module.NEAR_DUP_THRESHOLD)
+
+def test_plan_changes_detects_new_changed_and_removed():
+    params = chunker_params()
+    old_articles = [("a.txt", "A", {"title": "A"}), ("b.txt", "B", {"title": "B"}), ("c.txt", "C", {"title": "C"})]
+    old_manifest, changed, _ = plan_changes(old_articles, {}, params)
+    assert changed == {"a.txt", "b.txt", "c.txt"}
+
+    new_articles = [("a.txt", "A", {"title": "A"}), ("b.txt", "B edited", {"title": "B"}), ("d.txt", "D", {"title": "D"})]
+    manifest, changed, stale = plan_changes(new_articles, old_manifest, params)
+    assert changed == {"b.txt", "d.txt"}
+    assert stale == {"B", "C", "D"}
+    assert manifest["a.txt"] == old_manifest["a.txt"]
+
+    _, changed, _ = plan_changes(new_articles, old_manifest, params, full=True)
+    assert changed == {"a.txt", "b.txt", "d.txt"}
+
+def test_plan_changes_keeps_entries_outside_download_changeset():
+    params = chunker_params()
+    old_manifest, _, _ = plan_changes([("a.txt", "A", {"title": "A"}), ("b.txt", "B", {"title": "B"})], {}, params)
+    manifest, changed, stale = plan_changes([("b.txt", "B2", {"title": "B"})], old_manifest, params, assume_unchanged=lambda name: name != "b.txt")
+    assert set(manifest) == {"a.txt", "b.txt"}
+    assert changed == {"b.txt"}
+    assert stale == {"B"}
+
+def test_iter_unchanged_lines_preserves_bytes(tmp_path):
+    path = tmp_path / "chunks.jsonl"
+    lines = ['{"title": "Mars",  "text": "x", "created_at": "2024-01-01"}\n', '{"title": "Moon", "text": "y"}']
+    path.write_text("".join(lines), encoding="utf-8")
+    kept = list(iter_unchanged_lines(path, {"Moon"}))
+    assert [line for line, _ in kept] == [lines[0]]
+
+def test_chunk_article_uses_token_windows_when_chunk_size_set():
+    text = "alpha beta gamma delta epsilon"
+    pieces = chunk_article(text, chunk_size=2, chunk_overlap=0, tokenizer=WhitespaceTokenizer())
+    assert [p[0] for p in pieces] == ["alpha beta", "gamma delta", "epsilon"]
+    assert all(text[start:end] == piece for piece, start, end in pieces)
+
+def test_chunk_spans_by_paragraphs_are_true_offsets():
+    text = "  Intro line that is short.\n\n\nSecond paragraph is here.  \n\nThird. It has two sentences. And a third one."
+    spans = chunk_spans_by_paragraphs(text, min_length=10, max_length=30)
+    chunks = [text[start:end] for start, end in spans]
+    assert chunks == chunk_text_by_paragraphs(text, min_length=10, max_length=30)
+    assert chunks == [
+        "Intro line that is short.",
+        "Second paragraph is here.",
+        "Third. It has two sentences.",
+        "And a third one.",
+    ]
+
+def test_chunk_spans_by_paragraphs_merged_chunk_keeps_separator():
+    text = "Short1.\n\nShort2."
+    assert chunk_spans_by_paragraphs(text, min_length=15, max_length=50) == [(0, len(text))]
+
+def test_chunk_spans_by_paragraphs_long_paragraph_is_linear():
+    text = "Word word word. " * 20000
+    spans = chunk_spans_by_paragraphs(text, max_length=1200)
+    assert all(end - start <= 1200 for start, end in spans)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text.rstrip())
+
+def test_write_unique_chunks_reports_near_duplicates():
+    from sciencesage.dedup import NearDuplicateIndex
+    text = "Lead section reused across many articles about the Apollo program and its crewed lunar missions in detail."
+    chunks = [
+        {"chunk_id": "1", "title": "Apollo 11", "text": text},
+        {"chunk_id": "2", "title": "Apollo 12", "text": text + " See also."},
+        {"chunk_id": "3", "title": "Mars", "text": "Mars is the fourth planet from the Sun and has two small moons."},
+    ]
+    out, report = io.StringIO(), []
+    assert write_unique_chunks(chunks, out, {}, NearDuplicateIndex(threshold=0.8), report) == 2
+    assert [(r["chunk_id"], r["duplicate_of"]) for r in report] == [("2", "1")]
+
+def test_write_unique_chunks_reports_exact_duplicates_with_their_title():
+    chunks = [
+        {"chunk_id": "1", "title": "Luna", "text": "Shared paragraph."},
+        {"chunk_id": "2", "title": "Moon", "text": "Shared paragraph."},
+    ]
+    report, titles = [], {}
+    assert write_unique_chunks(chunks, io.StringIO(), {}, report=report, titles=titles) == 1
+    assert titles == {"1": "Luna"}
+    assert [(r["chunk_id"], r["title"], r["duplicate_of"], r["duplicate_of_title"], r["match"]) for r in report] == [
+        ("2", "Moon", "1", "Luna", "exact")
+    ]
+
+def test_resurrected_titles_follows_chains():
+    report = [
+        {"title": "Moon", "duplicate_of_title": "Luna"},
+        {"title": "Selene", "duplicate_of_title": "Moon"},
+        {"title": "Mars", "duplicate_of_title": "Phobos"},
+    ]
+    assert resurrected_titles(report, {"Luna"}) == {"Moon", "Selene"}
+    assert resurrected_titles(report, {"Venus"}) == set()
+
+def test_merge_changeset_keeps_unconsumed_changes():
+    pending = {"full": False, "changed_titles": ["Mars"], "removed_titles": ["Pluto"],
+               "new_chunks": 3, "exact_duplicates": 1, "near_duplicates": 0}
+    changeset = {"full": False, "changed_titles": ["Moon"], "removed_titles": [],
+                 "new_chunks": 2, "kept_chunks": 9, "exact_duplicates": 0, "near_duplicates": 1}
+    merged = merge_changeset(pending, changeset)
+    assert merged["changed_titles"] == ["Mars", "Moon"]
+    assert merged["removed_titles"] == ["Pluto"]
+    assert (merged["new_chunks"], merged["kept_chunks"], merged["near_duplicates"]) == (5, 9, 1)
+    assert merge_changeset({**pending, "consumed_at": "2024-01-01"}, changeset) == changeset
+    assert merge_changeset(None, changeset) == changeset
+
+def test_incremental_run_restores_chunks_deduped_against_edited_article(tmp_path, monkeypatch):
+    from scripts import preprocess
+
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    shared = "This paragraph about lunar tides appears word for word in both articles, long enough to stand alone."
+    def save_article(title, *paragraphs):
+        (raw / f"wikipedia_{title}.txt").write_text("\n\n".join(paragraphs), encoding="utf-8")
+        (raw / f"wikipedia_{title}.meta.json").write_text(json.dumps({"title": title}), encoding="utf-8")
+    def run():
+        monkeypatch.setattr("sys.argv", ["preprocess.py", "--workers", "1"])
+        preprocess.main()
+        with open(tmp_path / "chunks.jsonl", encoding="utf-8") as f:
+            return [(c["title"], c["text"]) for c in map(json.loads, f)]
+
+    for name in ["CHUNKS_FILE", "CHUNK_STORE_FILE", "PREPROCESS_MANIFEST_FILE", "CHUNKS_CHANGESET_FILE", "NEAR_DUPLICATES_FILE"]:
+        monkeypatch.setattr(preprocess, name, str(tmp_path / getattr(preprocess, name).rsplit("/", 1)[-1]))
+    monkeypatch.setattr(preprocess, "RAW_DATA_DIR", str(raw))
+    monkeypatch.setattr(preprocess, "RAW_CHANGESET_FILE", str(raw / "changeset.json"))
+    monkeypatch.setattr(preprocess, "RAW_SHARD_DIR", str(tmp_path / "shards"))
+    luna_own = "Luna is the Latin name for the Moon and the Roman goddess who personified it in classical myth."
+    moon_own = "The Moon is Earth's only natural satellite, orbiting at an average distance of 384,400 kilometres."
+    save_article("Luna", shared, luna_own)
+    save_article("Moon", shared, moon_own)
+
+    # Luna is processed first, so Moon's copy of the shared paragraph is dropped
+    assert run() == [("Luna", shared), ("Luna", luna_own), ("Moon", moon_own)]
+    report = [json.loads(line) for line in open(tmp_path / "near_duplicates.jsonl", encoding="utf-8")]
+    assert [(r["title"], r["duplicate_of_title"], r["match"]) for r in report] == [("Moon", "Luna", "exact")]
+    changeset_path = tmp_path / "changeset.json"
+    changeset_path.write_text(json.dumps({**json.loads(changeset_path.read_text()), "consumed_at": "now"}))
+
+    # Luna loses the paragraph, so Moon's copy must come back
+    save_article("Luna", luna_own)
+    (raw / "changeset.json").write_text(json.dumps({"files": ["wikipedia_Luna.txt"]}))
+    assert sorted(run()) == [("Luna", luna_own), ("Moon", moon_own), ("Moon", shared)]
+    # The download changeset has been applied, so the downloader starts a new one
+    assert json.loads((raw / "changeset.json").read_text())["consumed_at"]
+    assert (tmp_path / "near_duplicates.jsonl").read_text() == ""
+    changeset = json.loads(changeset_path.read_text())
+    assert changeset["full"] is False
+    assert changeset["changed_titles"] == ["Luna", "Moon"]
+
+    # Not yet embedded: the next run's changeset is merged into this one
+    save_article("Mars", "Mars is the fourth planet from the Sun, a dusty, cold desert world with a thin atmosphere.")
+    run()
+    assert json.loads(changeset_path.read_text())["changed_titles"] == ["Luna", "Mars", "Moon"]
+
+def test_failed_run_keeps_previous_chunk_store(tmp_path, monkeypatch):
+    from scripts import preprocess
+
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    for name in ["CHUNKS_FILE", "CHUNK_STORE_FILE", "PREPROCESS_MANIFEST_FILE", "CHUNKS_CHANGESET_FILE", "NEAR_DUPLICATES_FILE"]:
+        monkeypatch.setattr(preprocess, name, str(tmp_path / getattr(preprocess, name).rsplit("/", 1)[-1]))
+    monkeypatch.setattr(preprocess, "RAW_DATA_DIR", str(raw))
+    monkeypatch.setattr(preprocess, "RAW_SHARD_DIR", str(tmp_path / "shards"))
+    monkeypatch.setattr(preprocess, "RAW_CHANGESET_FILE", str(raw / "changeset.json"))
+    monkeypatch.setattr("sys.argv", ["preprocess.py", "--workers", "1"])
+    (raw / "wikipedia_Mars.meta.json").write_text(json.dumps({"title": "Mars"}), encoding="utf-8")
+    (raw / "wikipedia_Mars.txt").write_text("Mars is the fourth planet from the Sun, a dusty, cold desert world. " * 3, encoding="utf-8")
+    preprocess.main()
+    store_path = tmp_path / "chunks.parquet"
+    before = store_path.read_bytes()
+
+    def fail(chunks, f, seen_digests, near_duplicates=None, report=None, store=None, titles=None):
+        store.write(chunks[0])
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(preprocess, "write_unique_chunks", fail)
+    (raw / "wikipedia_Mars.txt").write_text("Mars has two small moons, Phobos and Deimos, captured asteroids perhaps. " * 3, encoding="utf-8")
+    with pytest.raises(RuntimeError):
+        preprocess.main()
+    assert store_path.read_bytes() == before
+    assert not (tmp_path / "chunks.parquet.tmp").exists()
+
+def test_process_article_shares_article_fields_across_chunks():
+    text = "First paragraph. " * 10 + "\n\n" + "Second paragraph. " * 10
+    meta = {"title": "Mars", "categories": ["Category:Mars", "Category:CS1 errors"], "fullurl": "http://mars"}
+    _, _, chunks = process_article(("wikipedia_Mars.txt", text, meta))
+    assert len(chunks) == 2
+    for field in ("categories", "topic", "source_url", "created_at"):
+        assert chunks[0][field] == chunks[1][field]
+    assert chunks[0]["categories"] == ["Category:Mars"]
+    assert chunks[0]["topic"] == "mars"
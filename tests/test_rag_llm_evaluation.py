@@ -61,3 +61,65 @@ def test_generate_llm_eval_for_entry_invalid(monkeypatch):
     monkeypatch.setattr(rag_llm_evaluation, "generate_answer", dummy_generate_answer)
     with pytest.raises(ValueError):
         rag_llm_evaluation.generate_llm_eval_for_entry({"question": None, "answer": "x"})
+
+class FakeAsyncCompletions:
+    """Chat completions stub that rate-limits the first `fail_first` calls."""
+    def __init__(self, fail_first=0):
+        self.calls = 0
+        self.fail_first = fail_first
+
+    async def create(self, model, messages, temperature):
+        import httpx
+        from openai import RateLimitError
+        from types import SimpleNamespace
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            response = httpx.Response(429, headers={"retry-after": "0"}, request=httpx.Request("POST", "https://api.test"))
+            raise RateLimitError("rate limited", response=response, body=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" Sample Answer "))])
+
+def fake_async_client(fail_first=0):
+    from types import SimpleNamespace
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeAsyncCompletions(fail_first)))
+
+def run_eval(entries, path, client, done_ids=frozenset(), concurrency=3):
+    import asyncio
+    from sciencesage.jsonl import JsonlWriter
+    from sciencesage.rate_limit import MinuteRateLimiter
+    limiter = MinuteRateLimiter(requests_per_minute=60000, tokens_per_minute=None)
+    with JsonlWriter(path, append=True, flush_every=1) as writer:
+        return asyncio.run(rag_llm_evaluation.run_llm_eval(iter(entries), writer, client, limiter, concurrency, done_ids))
+
+def make_entries(n):
+    return [{"question": f"Question {i}?", "answer": "Sample Answer", "chunk_id": f"c{i}", "text": "Sample context text."} for i in range(n)]
+
+def test_run_llm_eval_retries_rate_limits_and_appends(tmp_path, monkeypatch):
+    from sciencesage.jsonl import iter_jsonl
+    monkeypatch.setattr(rag_llm_evaluation, "retrieve_context", lambda q, top_k, topic: [{"chunk_id": "c", "text": "t", "source_url": "u"}])
+    client = fake_async_client(fail_first=2)
+    path = tmp_path / "llm_eval.jsonl"
+    assert run_eval(make_entries(4), path, client) == (4, 0, 0)
+    assert client.chat.completions.calls == 6
+    results = list(iter_jsonl(path))
+    assert sorted(r["query"] for r in results) == [f"Question {i}?" for i in range(4)]
+    assert all(r["exact_match"] == 1.0 for r in results)
+
+def test_run_llm_eval_resumes_from_completed_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_llm_evaluation, "retrieve_context", lambda q, top_k, topic: [])
+    path = tmp_path / "llm_eval.jsonl"
+    entries = make_entries(5)
+    run_eval(entries[:2], path, fake_async_client())
+    done = rag_llm_evaluation.completed_entry_ids(str(path))
+    assert done == {rag_llm_evaluation.entry_id(e) for e in entries[:2]}
+    client = fake_async_client()
+    assert run_eval(entries, path, client, done_ids=done) == (3, 2, 0)
+    assert client.chat.completions.calls == 3
+    assert len(rag_llm_evaluation.completed_entry_ids(str(path))) == 5
+
+def test_run_llm_eval_records_failures_without_writing(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_llm_evaluation, "retrieve_context", lambda q, top_k, topic: [])
+    path = tmp_path / "llm_eval.jsonl"
+    client = fake_async_client(fail_first=100)
+    assert run_eval(make_entries(1) + [{"question": None}], path, client, concurrency=1) == (0, 0, 2)
+    assert client.chat.completions.calls == rag_llm_evaluation.LLM_RATE_LIMIT_RETRIES + 1
+    assert rag_llm_evaluation.completed_entry_ids(str(path)) == set()
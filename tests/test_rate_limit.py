@@ -0,0 +1,39 @@
+import time
+import asyncio
+
+from sciencesage.rate_limit import TokenBucket, backoff_delay, retry_after_seconds
+
+def test_token_bucket_allows_burst_then_throttles():
+    bucket = TokenBucket(rate=20, capacity=2)
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # 2 from the burst, 2 more at 20/s -> roughly 0.1s
+    assert time.monotonic() - start >= 0.08
+
+def test_token_bucket_async():
+    bucket = TokenBucket(rate=50, capacity=1)
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire_async() for _ in range(3)))
+        return time.monotonic() - start
+    assert asyncio.run(run()) >= 0.03
+
+def test_backoff_delay_bounds():
+    for attempt in range(6):
+        assert 0 <= backoff_delay(attempt, base=1.0, cap=8.0) <= min(8.0, 2 ** attempt)
+
+def test_retry_after_seconds():
+    assert retry_after_seconds("3") == 3.0
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") is None
+
+def test_minute_rate_limiter_waits_for_token_budget():
+    from sciencesage.rate_limit import MinuteRateLimiter
+    limiter = MinuteRateLimiter(requests_per_minute=60000, tokens_per_minute=6000)  # 100 tokens/s
+    async def run():
+        start = time.monotonic()
+        await limiter.acquire_async(100)  # burst
+        await limiter.acquire_async(5)  # 5 tokens of debt at 100/s
+        return time.monotonic() - start
+    assert asyncio.run(run()) >= 0.04
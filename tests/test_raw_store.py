@@ -0,0 +1,60 @@
+import gzip
+import json
+
+from sciencesage.raw_store import (
+    ShardWriter,
+    iter_raw_articles,
+    iter_shard,
+    load_index,
+    raw_file_name,
+)
+
+
+def write_records(path, records):
+    store = ShardWriter(str(path))
+    for record in records:
+        store.write(record)
+    store.close()
+    return store
+
+
+def test_shard_round_trip_and_random_access(tmp_path):
+    path = tmp_path / "Planets.jsonl.gz"
+    records = [{"title": f"Planet {i}", "text": "x" * i, "meta": {"title": f"Planet {i}"}, "html": None} for i in range(5)]
+    store = write_records(path, records)
+
+    assert list(iter_shard(str(path))) == records
+    assert store.read("Planet 3") == records[3]
+    assert set(load_index(str(path))) == {r["title"] for r in records}
+
+
+def test_shard_is_plain_gzip_jsonl(tmp_path):
+    path = tmp_path / "Planets.jsonl.gz"
+    write_records(path, [{"title": "A", "text": "a"}, {"title": "B", "text": "b"}])
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["title"] for line in f] == ["A", "B"]
+
+
+def test_rewritten_title_keeps_latest_copy(tmp_path):
+    path = tmp_path / "Planets.jsonl.gz"
+    write_records(path, [{"title": "A", "text": "old"}, {"title": "B", "text": "b"}])
+    # Reopening appends; the index now points at the new copy of A
+    write_records(path, [{"title": "A", "text": "new"}])
+    assert [(r["title"], r["text"]) for r in iter_shard(str(path))] == [("B", "b"), ("A", "new")]
+
+
+def test_iter_raw_articles_reads_files_and_shards(tmp_path):
+    raw_dir = tmp_path / "raw"
+    shard_dir = raw_dir / "shards"
+    raw_dir.mkdir()
+    (raw_dir / "wikipedia_Moon.txt").write_text("Moon text", encoding="utf-8")
+    (raw_dir / "wikipedia_Moon.meta.json").write_text(json.dumps({"title": "Moon"}), encoding="utf-8")
+    (raw_dir / "wikipedia_Orphan.txt").write_text("no meta", encoding="utf-8")
+    write_records(shard_dir / "Planets.jsonl.gz", [{"title": "Red Planet", "text": "Mars text", "meta": {"title": "Red Planet"}}])
+
+    articles = list(iter_raw_articles(str(raw_dir), str(shard_dir)))
+    assert articles == [
+        ("wikipedia_Moon.txt", "Moon text", {"title": "Moon"}),
+        ("wikipedia_Orphan.txt", "no meta", None),
+        (raw_file_name("Red Planet", ".txt"), "Mars text", {"title": "Red Planet"}),
+    ]
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sciencesage.config import EMBEDDING_BACKEND, EMBEDDING_MODEL
+from sciencesage.retrieval_cache import RetrievalCache, cached_retrieve
+
+CHUNKS = [{"chunk_id": "c1", "text": "Mars is red.", "source_url": "u", "score": 0.9}]
+
+
+def test_put_and_get_persist_across_instances(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = RetrievalCache("fp1", path=path, model="m")
+    assert cache.get("What colour is Mars?", 5, "mars") is None
+    cache.put("What colour is Mars?", 5, "mars", CHUNKS)
+    cache.close()
+
+    reopened = RetrievalCache("fp1", path=path, model="m")
+    assert reopened.get("What colour is Mars?", 5, "mars") == CHUNKS
+    assert reopened.get("What colour is Mars?", 10, "mars") is None
+    assert reopened.get("What colour is Mars?", 5, None) is None
+
+
+def test_key_includes_fingerprint_and_model(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    RetrievalCache("fp1", path=path, model="m").put("q", 5, None, CHUNKS)
+    assert RetrievalCache("fp2", path=path, model="m").get("q", 5, None) is None
+    assert RetrievalCache("fp1", path=path, model="other").get("q", 5, None) is None
+    # The default embedder covers the backend and quantization, not just the model name
+    assert RetrievalCache("fp1", path=path).model.startswith(f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}:")
+
+
+def test_get_many_returns_only_hits_and_counts(tmp_path):
+    cache = RetrievalCache("fp", path=tmp_path / "cache.sqlite")
+    cache.put_many([(("a", 5, None), CHUNKS), (("b", 5, None), [])])
+    found = cache.get_many([("a", 5, None), ("b", 5, None), ("c", 5, None)])
+    assert found == {("a", 5, None): CHUNKS, ("b", 5, None): []}
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_cached_retrieve_computes_once(tmp_path):
+    calls = []
+    def retrieve(query, top_k, topic):
+        calls.append(query)
+        return CHUNKS
+    cache = RetrievalCache("fp", path=tmp_path / "cache.sqlite")
+    assert cached_retrieve(cache, "q", 5, None, retrieve) == CHUNKS
+    assert cached_retrieve(cache, "q", 5, None, retrieve) == CHUNKS
+    assert cached_retrieve(None, "q", 5, None, retrieve) == CHUNKS
+    assert calls == ["q", "q"]
+
+
+def test_cache_is_shared_between_threads(tmp_path):
+    cache = RetrievalCache("fp", path=tmp_path / "cache.sqlite")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: cache.put(f"q{i}", 5, None, CHUNKS), range(50)))
+    assert len(cache.get_many([(f"q{i}", 5, None) for i in range(50)])) == 50
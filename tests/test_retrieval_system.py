@@ -43,4 +43,82 @@ def test_retrieve_answer_success():
     assert "sources" in result
     assert isinstance(result["answer"], str)
     assert isinstance(result["sources"], dict)
-    assert len(result["answer"]) > 0
\ No newline at end of file
+    assert len(result["answer"]) > 0
+
+def test_search_batch_matches_single_queries(monkeypatch):
+    import numpy as np
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import PointStruct, VectorParams, Distance
+    from sciencesage import retrieval_system
+    client = QdrantClient(":memory:")
+    client.create_collection("chunks", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    rng = np.random.default_rng(0)
+    client.upsert("chunks", points=[
+        PointStruct(id=i, vector=rng.normal(size=4).tolist(), payload={"text": f"t{i}", "chunk_id": f"c{i}"})
+        for i in range(20)
+    ])
+    monkeypatch.setattr(retrieval_system, "qdrant", client)
+    monkeypatch.setattr(retrieval_system, "QDRANT_COLLECTION", "chunks")
+    monkeypatch.setattr(retrieval_system, "SIMILARITY_THRESHOLD", -1.0)
+    vectors = rng.normal(size=(7, 4))
+    batched = retrieval_system.search_batch(vectors, top_k=3, batch_size=2, workers=3)
+    single = [
+        retrieval_system.hits_to_chunks(client.query_points("chunks", query=v.tolist(), limit=3, with_payload=True).points)
+        for v in vectors
+    ]
+    assert [[c["chunk_id"] for c in hits] for hits in batched] == [[c["chunk_id"] for c in hits] for hits in single]
+
+def test_collection_search_params_follow_collection_quantization(monkeypatch):
+    from types import SimpleNamespace
+    from qdrant_client.models import ScalarQuantization, ScalarQuantizationConfig, ScalarType
+    from sciencesage import retrieval_system
+    # Qdrant's local mode drops quantization_config, so stub the collection info
+    configs = {"plain": None, "scalar": ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8))}
+    calls = []
+    def get_collection(name):
+        calls.append(name)
+        return SimpleNamespace(config=SimpleNamespace(quantization_config=configs[name]))
+    monkeypatch.setattr(retrieval_system, "qdrant", SimpleNamespace(get_collection=get_collection))
+    monkeypatch.setattr(retrieval_system, "_collection_search_params", {})
+
+    # The collection decides, whatever QUANTIZATION says
+    scalar = retrieval_system.collection_search_params("scalar")
+    assert scalar == retrieval_system.build_search_params("scalar")
+    assert scalar.quantization is not None
+    assert retrieval_system.collection_search_params("plain") == retrieval_system.build_search_params("none")
+    retrieval_system.collection_search_params("scalar")
+    assert calls == ["scalar", "plain"]
+    # None is an explicit "off", not a fallback to the config
+    assert retrieval_system.build_search_params(None, hnsw_ef=64).quantization is None
+
+def test_collection_fingerprint_changes_with_collection(monkeypatch, tmp_path):
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import PointStruct, VectorParams, Distance
+    from sciencesage import retrieval_system
+    client = QdrantClient(":memory:")
+    client.create_collection("chunks", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    monkeypatch.setattr(retrieval_system, "qdrant", client)
+    monkeypatch.setattr(retrieval_system, "EMBEDDING_FILE", str(tmp_path / "missing.parquet"))
+    before = retrieval_system.collection_fingerprint("chunks")
+    assert retrieval_system.collection_fingerprint("chunks") == before
+    client.upsert("chunks", points=[PointStruct(id=1, vector=[1.0, 0.0], payload={"text": "t"})])
+    assert retrieval_system.collection_fingerprint("chunks") != before
+    assert retrieval_system.open_retrieval_cache(enabled=False) is None
+
+def test_open_retrieval_cache_keys_on_encoder_backend(monkeypatch, tmp_path):
+    from sciencesage import retrieval_system
+    monkeypatch.setattr(retrieval_system, "collection_fingerprint", lambda: "fp")
+    path = tmp_path / "cache.sqlite"
+    chunks = [{"chunk_id": "c1", "text": "t"}]
+    monkeypatch.setattr(retrieval_system, "EMBEDDING_BACKEND", "torch")
+    retrieval_system.open_retrieval_cache(True, path).put("q", 5, None, chunks)
+    assert retrieval_system.open_retrieval_cache(True, path).get("q", 5, None) == chunks
+    keys = {}
+    for backend, quantized in [("torch", False), ("onnx", False), ("onnx", True)]:
+        monkeypatch.setattr(retrieval_system, "EMBEDDING_BACKEND", backend)
+        monkeypatch.setattr(retrieval_system, "ONNX_QUANTIZED", quantized)
+        cache = retrieval_system.open_retrieval_cache(True, path)
+        keys[(backend, quantized)] = cache.key("q", 5, None)
+        if backend != "torch":
+            assert cache.get("q", 5, None) is None
+    assert len(set(keys.values())) == 3
@@ -0,0 +1,47 @@
+import random
+
+from sciencesage.sampling import StratifiedReservoir, length_bucket, sample_priority
+
+def fill(items, capacity=3, seed=7):
+    reservoir = StratifiedReservoir(capacity=capacity, seed=seed)
+    for stratum, key in items:
+        reservoir.add(stratum, key, {"key": key, "stratum": stratum})
+    return reservoir
+
+def make_items():
+    return [("a", f"a{i}") for i in range(60)] + [("b", f"b{i}") for i in range(30)] + [("c", "c0")]
+
+def test_sample_priority_is_seeded():
+    assert sample_priority("x", 1) == sample_priority("x", 1)
+    assert sample_priority("x", 1) != sample_priority("x", 2)
+
+def test_length_bucket():
+    assert [length_bucket("x" * n, [10, 20]) for n in (0, 9, 10, 19, 25)] == [0, 0, 1, 1, 2]
+    assert length_bucket(None, [10]) == 0
+
+def test_reservoir_keeps_lowest_priorities_regardless_of_order():
+    items = make_items()
+    shuffled = items[:]
+    random.Random(3).shuffle(shuffled)
+    first, second = fill(items), fill(shuffled)
+    for stratum in ("a", "b", "c"):
+        assert first.candidates(stratum) == second.candidates(stratum)
+    expected = sorted((key for s, key in items if s == "a"), key=lambda k: sample_priority(k, 7))[:3]
+    assert [key for key, _ in first.candidates("a")] == expected
+    assert first.counts == {"a": 60, "b": 30, "c": 1}
+
+def test_sample_allocates_in_proportion_to_strata():
+    reservoir = fill(make_items(), capacity=10)
+    sample = reservoir.sample(6)
+    strata = [item["stratum"] for item in sample]
+    assert strata.count("a") == 4 and strata.count("b") == 2
+    # Small strata still fill in once the large ones run out of candidates
+    assert len(reservoir.sample(25)) == 21
+
+def test_sample_exclude_and_group_limit():
+    reservoir = fill(make_items(), capacity=10)
+    first = reservoir.candidates("a")[0][0]
+    sample = reservoir.sample(5, exclude={first})
+    assert first not in {item["key"] for item in sample}
+    grouped = reservoir.sample(10, group=lambda item: item["stratum"], max_per_group=2)
+    assert sorted(item["stratum"] for item in grouped) == ["a", "a", "b", "b", "c"]
@@ -16,11 +16,20 @@ def test_summarize_metrics_basic():
     assert summary["recall_at_k_min"] == 0.5
     assert summary["reciprocal_rank_max"] == 1.0
     assert summary["ndcg_at_k_stdev"] > 0
+    assert 0.6 <= summary["precision_at_k_ci_low"] <= 0.7 <= summary["precision_at_k_ci_high"] <= 0.8
+
+def test_summarize_metrics_without_bootstrap():
+    summary = summarize_metrics.summarize_metrics([{"recall_at_k": 1.0}], ["recall_at_k"], n_resamples=0)
+    assert summary["recall_at_k_mean"] == 1.0
+    assert "recall_at_k_ci_low" not in summary
 
 def test_main_creates_csv(tmp_path, monkeypatch):
     # Create dummy eval and llm eval files
     eval_records = [
-        {"precision_at_k": 0.8, "recall_at_k": 0.7, "reciprocal_rank": 1.0, "ndcg_at_k": 0.9}
+        {
+            "precision_at_k": 0.8, "recall_at_k": 0.7, "reciprocal_rank": 1.0, "ndcg_at_k": 0.9,
+            "retrieved_chunks": ["a", "b"], "ground_truth_chunks": ["b"],
+        }
     ]
     llm_records = [
         {"precision_at_k": 0.6, "recall_at_k": 0.5, "reciprocal_rank": 0.5, "ndcg_at_k": 0.7, "exact_match": 1.0}
@@ -28,6 +37,7 @@ def test_main_creates_csv(tmp_path, monkeypatch):
     eval_path = tmp_path / "eval_results.jsonl"
     llm_path = tmp_path / "llm_eval.jsonl"
     summary_path = tmp_path / "metrics_summary.csv"
+    curves_path = tmp_path / "metric_curves.csv"
 
     for rec, path in [(eval_records, eval_path), (llm_records, llm_path)]:
         with open(path, "w") as f:
@@ -38,6 +48,8 @@ def test_main_creates_csv(tmp_path, monkeypatch):
     monkeypatch.setattr(summarize_metrics, "EVAL_RESULTS_FILE", str(eval_path))
     monkeypatch.setattr(summarize_metrics, "LLM_EVAL_FILE", str(llm_path))
     monkeypatch.setattr(summarize_metrics, "METRICS_SUMMARY_FILE", str(summary_path))
+    monkeypatch.setattr(summarize_metrics, "METRIC_CURVES_FILE", str(curves_path))
+    monkeypatch.setattr(summarize_metrics, "TOP_K", 3)
 
     # Patch __file__ to simulate script location
     monkeypatch.setattr(summarize_metrics, "__file__", str(tmp_path / "summarize_metrics.py"))
@@ -50,4 +62,11 @@ def test_main_creates_csv(tmp_path, monkeypatch):
         reader = csv.reader(f)
         rows = list(reader)
         assert any("retrieval_precision_at_k_mean" in row for row in rows)
-        assert any("llm_exact_match_mean" in row for row in rows)
\ No newline at end of file
+        assert any("llm_exact_match_mean" in row for row in rows)
+
+    # One row per k: the relevant chunk is retrieved second
+    with open(curves_path) as f:
+        curves = list(csv.DictReader(f))
+    assert [row["k"] for row in curves] == ["1", "2", "3"]
+    assert [float(row["hit_rate_at_k"]) for row in curves] == [0.0, 1.0, 1.0]
+    assert float(curves[2]["reciprocal_rank"]) == 0.5
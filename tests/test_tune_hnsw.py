@@ -0,0 +1,27 @@
+import json
+
+import pandas as pd
+
+from scripts.tune_hnsw import choose_config, write_hnsw_config
+
+def make_sweep():
+    return pd.DataFrame([
+        {"m": 16, "ef_construct": 100, "hnsw_ef": 16, "recall_vs_exact": 0.90, "latency_p95_ms": 1.0},
+        {"m": 16, "ef_construct": 100, "hnsw_ef": 64, "recall_vs_exact": 0.97, "latency_p95_ms": 2.0},
+        {"m": 32, "ef_construct": 200, "hnsw_ef": 128, "recall_vs_exact": 1.00, "latency_p95_ms": 4.0},
+    ])
+
+def test_choose_config_fastest_above_min_recall():
+    chosen = choose_config(make_sweep(), min_recall=0.95)
+    assert chosen["m"] == 16
+    assert chosen["hnsw_ef"] == 64
+
+def test_choose_config_falls_back_to_most_accurate():
+    chosen = choose_config(make_sweep(), min_recall=1.01)
+    assert chosen["m"] == 32
+    assert chosen["recall_vs_exact"] == 1.0
+
+def test_write_hnsw_config(tmp_path):
+    path = tmp_path / "qdrant" / "hnsw_config.json"
+    write_hnsw_config({"m": 16, "ef_construct": 100, "hnsw_ef": 64}, str(path))
+    assert json.loads(path.read_text())["hnsw_ef"] == 64